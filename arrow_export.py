@@ -0,0 +1,210 @@
+"""
+EGX EVA Analyzer — Columnar Export
+Snapshots the database into partitioned Parquet or Feather (Arrow IPC) files
+for notebooks, instead of row-by-row pandas read_sql:
+
+    exports/<format>/<table>/<partition column>=<value>/part.<ext>
+
+Tickers, sources and other low-cardinality text columns are dictionary
+encoded. Feather files are written uncompressed so read_table() can memory-map
+them (zero-copy); Parquet trades that for smaller files. Exports are
+incremental: a per-partition fingerprint (row count plus a digest of every
+column of every row) is kept in _manifest.json and only new or changed
+partitions are rewritten.
+"""
+
+import os
+import json
+import zlib
+import time
+import shutil
+import logging
+from typing import Dict, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency — export is unavailable without it
+    pa = None
+
+from config import ARROW_EXPORT_DIR
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"parquet": "parquet", "feather": "arrow"}   # format -> file extension
+
+# Columns stored as dictionary<int32, string>
+DICTIONARY_COLUMNS = {"ticker", "source", "period", "signal", "sector", "industry", "status", "data_class"}
+
+# table -> partition SQL expression and column name, or None for one file
+TABLES = {
+    "companies": None,
+    "market_data": "date",
+    "income_statements": "period_end",
+    "balance_sheets": "period_end",
+    "cash_flows": "period_end",
+    "eva_results": "calculation_date",
+    "eva_simulations": "calculation_date",
+    "price_history": "strftime('%Y', day * 86400, 'unixepoch') AS year",
+}
+
+_SQL_TYPES = {"TEXT": "string", "REAL": "float64", "INTEGER": "int64", "BLOB": "binary"}
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def _partition(spec: Optional[str]):
+    """(SQL expression, column name) of a TABLES partition spec."""
+    if spec is None:
+        return None, None
+    expr, _, name = spec.partition(" AS ")
+    return expr, name or expr
+
+
+class _RowDigest:
+    """SQLite aggregate: order-independent digest of every value of the rows it sees."""
+
+    def __init__(self):
+        self.total = 0
+
+    def step(self, *values):
+        self.total = (self.total + zlib.crc32(repr(values).encode("utf-8"))) & 0xFFFFFFFFFFFFFFFF
+
+    def finalize(self):
+        return f"{self.total:016x}"
+
+
+def _arrow_type(table: str, column: str, decl: str):
+    if table == "price_history" and column == "day":
+        return pa.date32()   # day keys are already days since the epoch
+    return getattr(pa, _SQL_TYPES.get(decl.upper(), "string"))()
+
+
+def _to_arrow(conn, table: str, rows) -> "pa.Table":
+    """Arrow table from sqlite rows, typed from the declared column types."""
+    cols = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    arrays = {}
+    for i, col in enumerate(cols):
+        name = col[1]
+        array = pa.array([r[i] for r in rows], type=_arrow_type(table, name, col[2]))
+        if name in DICTIONARY_COLUMNS and pa.types.is_string(array.type):
+            array = array.dictionary_encode()
+        arrays[name] = array
+    return pa.table(arrays)
+
+
+def _write(arrow_table, path: str, fmt: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    if fmt == "parquet":
+        pq.write_table(arrow_table, tmp, compression="zstd")
+    else:
+        feather.write_feather(arrow_table, tmp, compression="uncompressed")
+    os.replace(tmp, path)
+
+
+def _export_table(conn, table: str, fmt: str, root: str, manifest: Dict) -> int:
+    """Write the new / changed partitions of one table. Returns how many were written."""
+    expr, name = _partition(TABLES[table])
+    columns = ", ".join(col[1] for col in conn.execute(f"PRAGMA table_info({table})").fetchall())
+    marker = f"row_digest({columns})"
+    ext = FORMATS[fmt]
+    seen = manifest.setdefault(table, {})
+
+    values = {}   # partition directory value -> SQL value (NULL partitions get their own directory)
+    if expr is None:
+        fingerprints = {"all": list(conn.execute(f"SELECT COUNT(*), {marker} FROM {table}").fetchone())}
+    else:
+        fingerprints = {}
+        for r in conn.execute(f"SELECT {expr} AS p, COUNT(*), {marker} FROM {table} GROUP BY p").fetchall():
+            part = "__null__" if r[0] is None else str(r[0])
+            values[part] = r[0]
+            fingerprints[part] = [r[1], r[2]]
+    changed = [p for p, fp in fingerprints.items() if seen.get(p) != fp]
+
+    for part in changed:
+        if expr is None:
+            rows = conn.execute(f"SELECT * FROM {table}").fetchall()
+            path = os.path.join(root, table, f"part.{ext}")
+        else:
+            rows = conn.execute(f"SELECT * FROM {table} WHERE {expr} IS ?", (values[part],)).fetchall()
+            path = os.path.join(root, table, f"{name}={part}", f"part.{ext}")
+        _write(_to_arrow(conn, table, rows), path, fmt)
+        seen[part] = fingerprints[part]
+
+    # Partitions whose rows were deleted (e.g. thinned by maintenance)
+    for part in [p for p in seen if p not in fingerprints]:
+        shutil.rmtree(os.path.join(root, table, f"{name}={part}"), ignore_errors=True)
+        del seen[part]
+    return len(changed)
+
+
+def _export_eva_inputs(conn, fmt: str, root: str):
+    """The merged per-ticker EVA input dataset (current state, one file)."""
+    from eva_engine import EVAEngine
+    inputs = EVAEngine(conn).merged_inputs()
+    if not inputs:
+        return
+    table = pa.Table.from_pylist(inputs)
+    table = table.set_column(0, "ticker", table.column("ticker").dictionary_encode())
+    _write(table, os.path.join(root, "eva_inputs", f"part.{FORMATS[fmt]}"), fmt)
+
+
+def export(conn, fmt: str = "parquet", out_dir: str = ARROW_EXPORT_DIR,
+           tables: Optional[List[str]] = None) -> Dict[str, int]:
+    """
+    Export every table (or `tables`) plus eva_inputs to out_dir/<fmt>/.
+    Returns the number of partitions written per table.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed — pip install pyarrow to use the columnar export")
+    start = time.time()
+    root = os.path.join(out_dir, fmt)
+    manifest_path = os.path.join(root, "_manifest.json")
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    conn.create_aggregate("row_digest", -1, _RowDigest)
+    written = {}
+    for table in tables or list(TABLES):
+        written[table] = _export_table(conn, table, fmt, root, manifest)
+        logger.info(f"  [Export] {table}: {written[table]} partitions written")
+    _export_eva_inputs(conn, fmt, root)
+
+    os.makedirs(root, exist_ok=True)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    logger.info(f"Columnar export ({fmt}) to {root}: {sum(written.values())} partitions "
+                f"in {time.time() - start:.1f}s")
+    return written
+
+
+def read_table(table: str, fmt: str = "feather", out_dir: str = ARROW_EXPORT_DIR) -> "pa.Table":
+    """
+    Load an exported table with its partition column. Feather partitions are
+    memory-mapped, so the columns reference the files instead of copies.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed")
+    base = os.path.join(out_dir, fmt, table)
+    pieces = []
+    for dirpath, _, files in sorted(os.walk(base)):
+        for file in sorted(f for f in files if f.endswith(FORMATS[fmt])):
+            path = os.path.join(dirpath, file)
+            if fmt == "feather":
+                piece = pa.ipc.open_file(pa.memory_map(path)).read_all()
+            else:
+                piece = pq.read_table(path)
+            part = os.path.basename(dirpath)
+            if "=" in part and part.split("=", 1)[0] not in piece.column_names:
+                key, value = part.split("=", 1)
+                piece = piece.append_column(key, pa.array([value] * piece.num_rows, pa.string()).dictionary_encode())
+            pieces.append(piece)
+    if not pieces:
+        raise FileNotFoundError(f"No {fmt} export of {table} under {base}")
+    return pa.concat_tables(pieces, promote_options="permissive")
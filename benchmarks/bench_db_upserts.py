@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Write throughput: one database.py upsert call per row (a commit each) vs the
+bulk *_many variants (one executemany per column set, one commit).
+
+Runs against a throwaway SQLite file with the production schema and pragmas,
+so fsync cost per commit is part of the measurement.
+
+Usage:
+    python benchmarks/bench_db_upserts.py [--rows 10000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database as db  # noqa: E402
+
+
+# ═══════════════════════════════════════════════════════════════
+# SYNTHETIC ROWS
+# ═══════════════════════════════════════════════════════════════
+
+def _ticker(i: int) -> str:
+    return f"T{i:05d}"
+
+
+def company_rows(n: int):
+    return [{"ticker": _ticker(i), "name": f"Company {i}", "sector": "Banks", "source": "bench"}
+            for i in range(n)]
+
+
+def market_rows(n: int):
+    return [{"ticker": _ticker(i % 500), "date": f"2024-{1 + i // 500 % 12:02d}-{1 + i // 6000:02d}",
+             "close_price": 10.0 + i % 97, "volume": i * 10, "market_cap": 1e9 + i, "source": "bench"}
+            for i in range(n)]
+
+
+def income_rows(n: int):
+    return [{"ticker": _ticker(i % 500), "period": "annual", "period_end": f"{1900 + i // 500}-12-31",
+             "revenue": 1e6 + i, "ebit": 2e5 + i, "net_income": 1e5 + i, "source": "bench"}
+            for i in range(n)]
+
+
+def balance_rows(n: int):
+    return [{"ticker": _ticker(i % 500), "period": "annual", "period_end": f"{1900 + i // 500}-12-31",
+             "total_assets": 5e6 + i, "current_liabilities": 1e6 + i, "total_equity": 2e6 + i, "source": "bench"}
+            for i in range(n)]
+
+
+def cash_flow_rows(n: int):
+    return [{"ticker": _ticker(i % 500), "period": "annual", "period_end": f"{1900 + i // 500}-12-31",
+             "operating_cash_flow": 3e5 + i, "capex": -1e5 - i, "source": "bench"}
+            for i in range(n)]
+
+
+def eva_rows(n: int):
+    return [{"ticker": _ticker(i % 500), "calculation_date": f"{1900 + i // 500}-01-01",
+             "nopat": 1e5 + i, "wacc": 0.2, "eva": 1e4 + i, "signal": "FAIR"}
+            for i in range(n)]
+
+
+def log_rows(n: int):
+    return [{"ticker": _ticker(i % 500), "source": "bench", "status": "success", "records_collected": 1,
+             "error_message": None, "duration_seconds": 0.1, "data_class": "prices"}
+            for i in range(n)]
+
+
+def _single_log(conn, row):
+    db.log_collection(conn, row["ticker"], row["source"], row["status"], row["records_collected"],
+                      row["error_message"], row["duration_seconds"], data_class=row["data_class"])
+
+
+CASES = [
+    # (table, rows, single-row call, bulk call)
+    ("companies", company_rows,
+     lambda conn, r: db.upsert_company(conn, **r), db.upsert_company_many),
+    ("market_data", market_rows, db.upsert_market_data, db.upsert_market_data_many),
+    ("income_statements", income_rows, db.upsert_income_statement, db.upsert_income_statement_many),
+    ("balance_sheets", balance_rows, db.upsert_balance_sheet, db.upsert_balance_sheet_many),
+    ("cash_flows", cash_flow_rows, db.upsert_cash_flow, db.upsert_cash_flow_many),
+    ("eva_results", eva_rows, db.upsert_eva_result, db.upsert_eva_result_many),
+    ("collection_log", log_rows, _single_log, db.log_collection_many),
+]
+
+
+# ═══════════════════════════════════════════════════════════════
+# RUNNER
+# ═══════════════════════════════════════════════════════════════
+
+def _fresh_connection(directory: str, name: str):
+    db.DB_PATH = os.path.join(directory, f"{name}.db")
+    return db.get_connection()
+
+
+def _count(conn, table: str) -> int:
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark database writes: per-row upserts vs bulk upserts")
+    parser.add_argument("--rows", type=int, default=10000, help="Rows written per table")
+    args = parser.parse_args()
+
+    print(f"{'table':<20}{'rows':>8}{'single rows/s':>15}{'bulk rows/s':>14}{'speedup':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for table, make_rows, single, bulk in CASES:
+            rows = make_rows(args.rows)
+
+            conn = _fresh_connection(tmp, f"{table}_single")
+            start = time.perf_counter()
+            for row in rows:
+                single(conn, dict(row))
+            t_single = time.perf_counter() - start
+            expected = _count(conn, table)
+            conn.close()
+
+            conn = _fresh_connection(tmp, f"{table}_bulk")
+            start = time.perf_counter()
+            bulk(conn, [dict(row) for row in rows])
+            t_bulk = time.perf_counter() - start
+            actual = _count(conn, table)
+            conn.close()
+
+            if expected != actual:
+                raise SystemExit(f"{table}: row counts differ (single {expected}, bulk {actual})")
+            print(f"{table:<20}{len(rows):>8}{len(rows) / t_single:>15,.0f}"
+                  f"{len(rows) / t_bulk:>14,.0f}{t_single / t_bulk:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
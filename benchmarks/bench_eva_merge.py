@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+EVA input merge: EVAEngine._merge_financials per ticker (tables × sources
+queries each) vs merged_frame() (one merged_latest_sql statement per table).
+
+Fills a throwaway SQLite file with several years of annual and quarterly
+statements and daily market data from every source (plus one outside the
+merge priority), with fields randomly missing, checks both merges produce the
+same inputs, then times them.
+
+Usage:
+    python benchmarks/bench_eva_merge.py [--tickers 1000] [--years 4]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database as db  # noqa: E402
+from eva_engine import EVAEngine, MERGE_FIELDS, SOURCE_PRIORITY, input_frame  # noqa: E402
+
+SOURCES = SOURCE_PRIORITY + ["unranked"]
+
+
+def _fields(rng, fields):
+    """Random values with ~30% of the fields missing."""
+    return {f: (None if rng.random() < 0.3 else float(rng.lognormal(15, 2))) for f in fields}
+
+
+def populate(conn, n_tickers: int, years: int):
+    rng = np.random.default_rng(0)
+    statements = {"income_statements": [], "balance_sheets": []}
+    market = []
+    for i in range(n_tickers):
+        ticker = f"T{i:05d}"
+        db.upsert_company(conn, ticker, name=f"Company {i}")
+        for source in SOURCES:
+            if rng.random() < 0.35:
+                continue
+            for year in range(2025 - years, 2025):
+                for period, period_end in [("annual", f"{year}-12-31"), ("quarterly", f"{year}-06-30")]:
+                    for table in statements:
+                        statements[table].append(dict(ticker=ticker, source=source, period=period,
+                                                      period_end=period_end, **_fields(rng, MERGE_FIELDS[table])))
+            for day in range(1, 6):
+                market.append(dict(ticker=ticker, source=source, date=f"2025-01-{day:02d}",
+                                   **_fields(rng, MERGE_FIELDS["market_data"])))
+    db.upsert_income_statement_many(conn, statements["income_statements"])
+    db.upsert_balance_sheet_many(conn, statements["balance_sheets"])
+    db.upsert_market_data_many(conn, market)
+    return len(statements["income_statements"]) * 2 + len(market)
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    value = fn(*args)
+    return value, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the EVA input merge: per-ticker queries vs one per table")
+    parser.add_argument("--tickers", type=int, default=1000, help="Tickers in the synthetic universe")
+    parser.add_argument("--years", type=int, default=4, help="Years of statements per ticker and source")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "merge.db")
+        conn = db.get_connection()
+        rows = populate(conn, args.tickers, args.years)
+        db.analyze(conn)
+        engine = EVAEngine(conn)
+        tickers = db.get_all_tickers(conn)
+
+        per_ticker, t_scalar = _timed(lambda: input_frame([engine._merge_financials(t) for t in tickers]))
+        batch, t_batch = _timed(engine.merged_frame, tickers)
+        conn.close()
+
+    pd.testing.assert_frame_equal(per_ticker, batch, check_exact=True)
+    queries = len(tickers) * len(MERGE_FIELDS) * len(SOURCE_PRIORITY)
+    print(f"{args.tickers:,} tickers, {rows:,} stored rows — both merges identical")
+    print(f"{'merge':<40}{'queries':>9}{'seconds':>9}")
+    print(f"{'_merge_financials per ticker':<40}{queries:>9,}{t_scalar:>9.3f}")
+    print(f"{'merged_frame (one statement per table)':<40}{len(MERGE_FIELDS):>9}{t_batch:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Per-page parse time: BeautifulSoup extraction (what the collectors did before)
+vs the targeted lxml/XPath extraction in html_parsing.
+
+Builds synthetic pages shaped like the real ones — site chrome, scripts, a
+key-stats block and large statement tables — checks that both paths return
+identical fields, then times them.
+
+Usage:
+    python benchmarks/bench_html_parsing.py [--rows 400] [--repeat 20]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import html_parsing  # noqa: E402
+
+
+# ═══════════════════════════════════════════════════════════════
+# SYNTHETIC PAGES
+# ═══════════════════════════════════════════════════════════════
+
+def _chrome(n_links: int) -> str:
+    nav = "".join(f'<li class="nav-item"><a href="/markets/EGX/stocks/S{i:04d}">Stock {i}</a></li>'
+                  for i in range(n_links))
+    script = "<script>window.__DATA__ = {" + ",".join(f'"k{i}": {i}' for i in range(n_links)) + "};</script>"
+    return f'<header><ul class="menu">{nav}</ul></header>{script}<!-- tracking -->'
+
+
+def stock_page(rows: int) -> str:
+    stats = "".join(f"<tr><td>Metric {i}</td><td>{i},{i:03d}.5</td></tr>" for i in range(rows))
+    return f"""<html><head><title>COMI</title><style>.price {{ color: red }}</style></head><body>
+    {_chrome(rows)}
+    <div class="stockPageContent"><h1>Commercial International Bank</h1>
+      <span class="price"> 78.<!-- c -->40 </span>
+      <div class="key-stat"><span>Open</span><strong>77.10</strong></div>
+      <div class="key-stat"><span>High</span><strong>79.00</strong></div>
+      <div class="info-item"><label>Low</label><b>76.80</b></div>
+      <div class="stock-info"><dt>Sector</dt><dd>Banks</dd></div>
+    </div>
+    <table class="stats"><tr><th>Market Cap</th><td>240,500,000,000</td></tr>
+      <tr><td>P/E Ratio</td><td>6.2</td></tr><tr><td>P/B</td><td>1.9</td></tr>
+      <tr><td>Volume</td><td>3,120,400</td></tr><tr><td>Avg Volume</td><td>2,000,000</td></tr>
+      <tr><td>52 Week High</td><td>85.00</td></tr><tr><td>52 Week Low</td><td>60.10</td></tr>
+      <tr><td>Dividend Yield</td><td>3.5%</td></tr><tr><td>Beta</td><td>1.12</td></tr>
+      <tr><td>Shares Outstanding</td><td>3,070,000,000</td></tr>{stats}</table>
+    </body></html>"""
+
+
+def financials_page(rows: int) -> str:
+    labels = ["Revenue", "Net Income", "Total Assets", "Total Equity", "EBIT", "Current Liabilities",
+              "Total Debt", "Operating Expenses"]
+    body = "".join(
+        f"<tr><td>{labels[i % len(labels)]} {i}</td>" + "".join(f"<td>({i * 10 + p:,})</td>" for p in range(8)) + "</tr>"
+        for i in range(rows)
+    )
+    return f"""<html><body>{_chrome(rows)}
+    <table><thead><tr><th>Item</th>{''.join(f'<th>{2024 - p}</th>' for p in range(8))}</tr></thead>
+    <tbody>{body}</tbody></table></body></html>"""
+
+
+def overview_page(rows: int) -> str:
+    grid = "".join(f'<div class="stat-row"><span>Stat {i}</span><span>{i}.{i % 10}M</span></div>'
+                   for i in range(rows))
+    return f"""<html><body>{_chrome(rows)}
+    <div data-test="overview-quote">EGP 78.40</div>
+    <table data-test="overview-info">
+      <tr><td>Market Cap</td><td>240.5B</td></tr><tr><td>PE Ratio</td><td>6.20</td></tr>
+      <tr><td>Price to Book</td><td>1.90</td></tr><tr><td>Dividend Yield</td><td>3.50%</td></tr>
+      <tr><td>Beta</td><td>1.12</td></tr><tr><td>Shares Outstanding</td><td>3.07B</td></tr>
+      <tr><td>52-Week High</td><td>85.00</td></tr><tr><td>52-Week Low</td><td>60.10</td></tr>
+      <tr><td>Volume</td><td>3,120,400</td></tr></table>
+    <div class="overview-item"><span>Beta (5Y)</span><span>1.15</span></div>{grid}
+    </body></html>"""
+
+
+# ═══════════════════════════════════════════════════════════════
+# BEFORE: BeautifulSoup extraction as the collectors did it
+# ═══════════════════════════════════════════════════════════════
+
+def bs4_mubasher_stock_fields(html: str):
+    soup = BeautifulSoup(html, "lxml")
+    data = {}
+    for sel in [".stockPageContent .price", ".stock-price", "[class*='price']", ".last-price"]:
+        el = soup.select_one(sel)
+        if el:
+            try:
+                data["close_price"] = float(el.get_text(strip=True).replace(",", ""))
+                break
+            except ValueError:
+                continue
+    for table in soup.select("table"):
+        for row in table.find_all("tr"):
+            cells = row.find_all(["td", "th"])
+            if len(cells) >= 2:
+                label = cells[0].get_text(strip=True).lower()
+                try:
+                    value = float(cells[-1].get_text(strip=True).replace(",", "").replace("%", ""))
+                except ValueError:
+                    continue
+                if "market cap" in label or "mkt cap" in label:
+                    data["market_cap"] = value
+                elif "p/e" in label or "pe ratio" in label:
+                    data["pe_ratio"] = value
+                elif "p/b" in label:
+                    data["pb_ratio"] = value
+                elif "volume" in label and "avg" not in label:
+                    data["volume"] = int(value)
+                elif "52" in label and "high" in label:
+                    data["fifty_two_week_high"] = value
+                elif "52" in label and "low" in label:
+                    data["fifty_two_week_low"] = value
+                elif "dividend" in label and "yield" in label:
+                    data["dividend_yield"] = value / 100 if value > 1 else value
+                elif "beta" in label:
+                    data["beta"] = value
+                elif "shares" in label and ("outstanding" in label or "issued" in label):
+                    data["shares_outstanding"] = value
+    for div in soup.select("[class*='key-stat'], [class*='info-item'], [class*='stock-info']"):
+        label_el = div.find(["span", "label", "dt"])
+        value_el = div.find(["strong", "b", "dd"])
+        if label_el and value_el:
+            label = label_el.get_text(strip=True).lower()
+            try:
+                value = float(value_el.get_text(strip=True).replace(",", "").replace("%", ""))
+                if "sector" in label:
+                    pass
+                elif "open" in label:
+                    data["open_price"] = value
+                elif "high" in label and "52" not in label:
+                    data["high_price"] = value
+                elif "low" in label and "52" not in label:
+                    data["low_price"] = value
+            except ValueError:
+                continue
+    name_el = soup.select_one("h1, .company-name, [class*='stock-name']")
+    soup.find(string=lambda s: s and "sector" in s.lower() if s else False)  # sector lookup the old code did
+    return data, name_el.get_text(strip=True) if name_el else ""
+
+
+def _bs4_statement_rows(soup):
+    for table in soup.select("table"):
+        thead = table.find("thead")
+        if thead:
+            [th.get_text(strip=True) for th in thead.find_all(["th", "td"])]  # header scan the old code did
+        tbody = table.find("tbody")
+        if not tbody:
+            continue
+        for row in tbody.find_all("tr"):
+            cells = row.find_all("td")
+            if len(cells) >= 2:
+                yield cells[0].get_text(strip=True).lower(), cells
+
+
+def bs4_mubasher_financial_items(html: str):
+    items = []
+    for label, cells in _bs4_statement_rows(BeautifulSoup(html, "lxml")):
+        values = []
+        for cell in cells[1:]:
+            text = cell.get_text(strip=True).replace(",", "").replace("(", "-").replace(")", "")
+            try:
+                values.append(float(text))
+            except ValueError:
+                values.append(None)
+        if not values or values[0] is None:
+            continue
+        latest_value = values[0]
+        if any(k in label for k in ["revenue", "sales", "turnover"]):
+            items.append(("income", "revenue", latest_value))
+        elif "net income" in label or "net profit" in label:
+            items.append(("income", "net_income", latest_value))
+        elif "total assets" in label:
+            items.append(("balance", "total_assets", latest_value))
+        elif "total equity" in label or "shareholders" in label:
+            items.append(("balance", "total_equity", latest_value))
+    return items
+
+
+def bs4_stockanalysis_overview_fields(html: str):
+    soup = BeautifulSoup(html, "lxml")
+    data = {}
+    price_el = soup.select_one("[data-test='overview-quote']")
+    if not price_el:
+        price_el = soup.select_one(".price-value, [class*='price']")
+    if price_el:
+        try:
+            data["close_price"] = float(price_el.get_text(strip=True).replace(",", "").replace("EGP", "").strip())
+        except ValueError:
+            pass
+    for item in soup.select("[data-test='overview-info'] tr, .overview-item, [class*='stat-row']"):
+        cells = item.find_all(["td", "span", "div"])
+        if len(cells) >= 2:
+            label = cells[0].get_text(strip=True).lower()
+            value_text = cells[-1].get_text(strip=True).replace(",", "").replace("%", "").replace("EGP", "").strip()
+            try:
+                value = float(value_text.replace("B", "e9").replace("M", "e6").replace("K", "e3")
+                              if any(c in value_text for c in ["B", "M", "K"]) else value_text)
+            except (ValueError, OverflowError):
+                continue
+            if "market cap" in label:
+                data["market_cap"] = value
+            elif "p/e" in label or "pe ratio" in label:
+                data["pe_ratio"] = value
+            elif "p/b" in label or "price to book" in label:
+                data["pb_ratio"] = value
+            elif "dividend yield" in label:
+                data["dividend_yield"] = value / 100 if value > 1 else value
+            elif "beta" in label:
+                data["beta"] = value
+            elif "shares" in label and "outstanding" in label:
+                data["shares_outstanding"] = value
+            elif "52" in label and "high" in label:
+                data["fifty_two_week_high"] = value
+            elif "52" in label and "low" in label:
+                data["fifty_two_week_low"] = value
+            elif "volume" in label and "avg" not in label:
+                data["volume"] = int(value)
+    return data
+
+
+def bs4_stockanalysis_financial_items(html: str):
+    items = []
+    for label, cells in _bs4_statement_rows(BeautifulSoup(html, "lxml")):
+        try:
+            value = float(cells[1].get_text(strip=True).replace(",", "").replace("(", "-").replace(")", ""))
+        except ValueError:
+            continue
+        if "revenue" in label or "total revenue" in label:
+            items.append(("income", "revenue", value))
+        elif label.startswith("ebit") and "da" not in label:
+            items.append(("income", "ebit", value))
+        elif "net income" in label:
+            items.append(("income", "net_income", value))
+        elif "total assets" in label:
+            items.append(("balance", "total_assets", value))
+        elif "current liabilities" in label:
+            items.append(("balance", "current_liabilities", value))
+        elif "total debt" in label:
+            items.append(("balance", "total_debt", value))
+        elif "total equity" in label or "stockholders" in label:
+            items.append(("balance", "total_equity", value))
+    return items
+
+
+# ═══════════════════════════════════════════════════════════════
+# MAIN
+# ═══════════════════════════════════════════════════════════════
+
+def _time_per_page(fn, html: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(html)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML extraction: BeautifulSoup vs lxml/XPath")
+    parser.add_argument("--rows", type=int, default=400, help="Table rows / links per synthetic page")
+    parser.add_argument("--repeat", type=int, default=20, help="Parses per measurement")
+    args = parser.parse_args()
+
+    cases = [
+        ("Mubasher stock page", stock_page(args.rows),
+         bs4_mubasher_stock_fields, html_parsing.mubasher_stock_fields),
+        ("Mubasher financials", financials_page(args.rows),
+         bs4_mubasher_financial_items, html_parsing.mubasher_financial_items),
+        ("StockAnalysis overview", overview_page(args.rows),
+         bs4_stockanalysis_overview_fields, html_parsing.stockanalysis_overview_fields),
+        ("StockAnalysis financials", financials_page(args.rows),
+         bs4_stockanalysis_financial_items, html_parsing.stockanalysis_financial_items),
+    ]
+
+    print(f"{'page':<26}{'size':>9}{'bs4 ms':>10}{'lxml ms':>10}{'speedup':>9}")
+    for name, html, before, after in cases:
+        expected, actual = before(html), after(html)
+        if expected != actual:
+            raise SystemExit(f"{name}: outputs differ\n  bs4:  {expected}\n  lxml: {actual}")
+        t_before = _time_per_page(before, html, args.repeat)
+        t_after = _time_per_page(after, html, args.repeat)
+        print(f"{name:<26}{len(html) // 1024:>7}KB{t_before:>10.2f}{t_after:>10.2f}{t_before / t_after:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
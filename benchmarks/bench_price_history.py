@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Bulk load time of the daily price history: reading price_history rows vs the
+packed per-ticker arrays in price_history_packed.
+
+Writes synthetic trading days (five weekdays a week) for a universe of
+tickers into a throwaway SQLite file through the database.py / price_history
+helpers, checks that both read paths return the same bars, then times them.
+
+Usage:
+    python benchmarks/bench_price_history.py [--tickers 250] [--years 5]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database as db  # noqa: E402
+import price_history  # noqa: E402
+
+
+def synthetic_history(n_tickers: int, years: int):
+    """(ticker, days, bars) with a random-walk close and weekday trading days."""
+    rng = np.random.default_rng(0)
+    last = price_history.day_number("2025-06-30")
+    days = np.arange(last - round(365.25 * years), last + 1, dtype=np.int32)
+    days = days[(days + 3) % 7 < 5]   # 1970-01-01 was a Thursday: keep Monday-Friday
+    for i in range(n_tickers):
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, len(days))))
+        bars = np.column_stack([close * 0.99, close * 1.01, close * 0.98, close, close,
+                                rng.integers(1_000, 1_000_000, len(days))]).astype(np.float64)
+        yield f"T{i:04d}", days, bars
+
+
+def load_rows(conn):
+    """The row-table read path: every bar as a tuple, grouped into arrays per ticker."""
+    rows = conn.execute(
+        "SELECT ticker, day, open, high, low, close, adj_close, volume FROM price_history ORDER BY ticker, day"
+    ).fetchall()
+    out = {}
+    for ticker in dict.fromkeys(r[0] for r in rows):
+        out[ticker] = []
+    for r in rows:
+        out[r[0]].append(r[1:])
+    return {t: (np.array([b[0] for b in bars], dtype=np.int32), np.array([b[1:] for b in bars], dtype=np.float64))
+            for t, bars in out.items()}
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    value = fn(*args)
+    return value, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark price history loads: rows vs packed arrays")
+    parser.add_argument("--tickers", type=int, default=250, help="Tickers in the synthetic universe")
+    parser.add_argument("--years", type=int, default=5, help="Years of daily bars per ticker")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "prices.db")
+        conn = db.get_connection()
+
+        history_rows, packed = [], []
+        for ticker, days, bars in synthetic_history(args.tickers, args.years):
+            history_rows += price_history.rows(ticker, days, bars)
+            packed.append(price_history.pack(ticker, days, bars))
+        _, t_write = _timed(lambda: (db.upsert_price_history_many(conn, history_rows),
+                                     db.set_packed_prices_many(conn, packed)))
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.close()
+
+        conn = db.get_connection()
+        by_rows, t_rows = _timed(load_rows, conn)
+        by_arrays, t_arrays = _timed(price_history.load_arrays, conn)
+        frames, t_frames = _timed(price_history.load, conn)
+        conn.close()
+
+        for ticker, (days, bars) in by_rows.items():
+            if not (np.array_equal(days, by_arrays[ticker][0]) and np.array_equal(bars, by_arrays[ticker][1])):
+                raise SystemExit(f"{ticker}: row and packed histories differ")
+
+        print(f"{len(history_rows):,} bars for {args.tickers} tickers over {args.years} years "
+              f"(written in {t_write:.2f}s, {os.path.getsize(db.DB_PATH) / 1e6:.1f} MB file)")
+        print(f"{'read path':<34}{'seconds':>9}")
+        print(f"{'price_history rows':<34}{t_rows:>9.3f}")
+        print(f"{'packed arrays (load_arrays)':<34}{t_arrays:>9.3f}")
+        print(f"{'packed DataFrames (load)':<34}{t_frames:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
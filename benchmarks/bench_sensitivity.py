@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Sensitivity grid throughput: config.SENSITIVITY_GRID (10 × 10 × 5 × 5
+scenarios) over a synthetic universe with sensitivity.cube(), against what
+the same scenarios would cost as one calculate_batch() run each.
+
+Checks a few random scenarios of the cube against calculate_batch with those
+parameters (same signals, values equal to float32 precision).
+
+Usage:
+    python benchmarks/bench_sensitivity.py [--tickers 250]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sensitivity  # noqa: E402
+from config import SENSITIVITY_GRID  # noqa: E402
+from eva_engine import EVAEngine, MODEL_PARAMETERS, input_frame  # noqa: E402
+from bench_eva_batch import synthetic_inputs  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sensitivity grid")
+    parser.add_argument("--tickers", type=int, default=250, help="Tickers in the synthetic universe")
+    args = parser.parse_args()
+
+    inputs = input_frame(synthetic_inputs(args.tickers))
+    engine = EVAEngine(conn=None)
+
+    start = time.perf_counter()
+    result = sensitivity.cube(inputs)
+    t_cube = time.perf_counter() - start
+    scenarios = int(np.prod(result.shape[1:]))
+
+    rng = np.random.default_rng(1)
+    t_batch = 0.0
+    checks = 5
+    for _ in range(checks):
+        point = {name: float(rng.choice(values)) for name, values in SENSITIVITY_GRID.items()}
+        start = time.perf_counter()
+        batch = engine.calculate_batch(inputs, parameters=dict(MODEL_PARAMETERS, **point))
+        t_batch += time.perf_counter() - start
+        for r in batch:
+            cell = result.sel(ticker=r["ticker"], **point)
+            if sensitivity.SIGNALS[cell["signal"]] != r["signal"] or not np.isclose(cell["eva"], r["eva"], rtol=1e-6, atol=0.01):
+                raise SystemExit(f"{r['ticker']} at {point}: cube and calculate_batch differ")
+
+    print(f"{args.tickers:,} tickers × {scenarios:,} scenarios = {result.signal.size:,} cells "
+          f"({sum(a.nbytes for a in result.arrays.values()) / 1e6:.1f} MB) — spot checks match calculate_batch")
+    print(f"{'path':<40}{'seconds':>9}")
+    print(f"{'sensitivity.cube (broadcast)':<40}{t_cube:>9.3f}")
+    print(f"{'calculate_batch per scenario (est.)':<40}{t_batch / checks * scenarios:>9.3f}")
+
+
+if __name__ == "__main__":
+    logging.disable(logging.WARNING)
+    main()
@@ -21,17 +21,53 @@ DEFAULT_BETA = 1.0             # Default beta if unavailable
 UNDERVALUED_THRESHOLD = 0.15   # >15% intrinsic premium = UNDERVALUED
 OVERVALUED_THRESHOLD = -0.15   # <-15% intrinsic premium = OVERVALUED
 
+# Parameter ranges of `python main.py sensitivity` (sensitivity.py), keyed by
+# eva_engine.MODEL_PARAMETERS name; parameters not listed stay at the values above
+SENSITIVITY_GRID = {
+    "risk_free_rate": [round(0.20 + 0.015 * i, 4) for i in range(10)],        # 20% – 33.5%
+    "equity_risk_premium": [round(0.04 + 0.01 * i, 4) for i in range(10)],    # 4% – 13%
+    "cost_of_debt_pretax": [0.16, 0.19, 0.22, 0.25, 0.28],
+    "tax_rate": [0.175, 0.20, 0.225, 0.25, 0.275],
+}
+SENSITIVITY_CHUNK_CELLS = 250_000   # ticker × scenario cells per broadcast pass (bounds memory)
+
+# Monte Carlo intrinsic value (`python main.py simulate`, monte_carlo.py): normal draws
+# around the constants above. Tickers without a beta draw around DEFAULT_BETA with
+# the wider default_beta_sd; the same seed always gives the same percentiles
+MONTE_CARLO = {
+    "samples": 5000,
+    "seed": 20240101,
+    "risk_free_rate_sd": 0.02,
+    "cost_of_debt_sd": 0.03,
+    "beta_sd": 0.2,
+    "default_beta_sd": 0.4,
+    "chunk_cells": 1_000_000,   # ticker × sample cells per pass (bounds memory)
+}
+
 # ═══════════════════════════════════════════════════════════════
 # DATA SOURCE CONFIGURATION
 # ═══════════════════════════════════════════════════════════════
 
 YAHOO_FINANCE_SUFFIX = ".CA"   # EGX stocks use .CA suffix on Yahoo Finance
+YAHOO_BATCH_SIZE = 100         # Symbols per multi-symbol yf.download call in the bulk price refresh
+PRICE_HISTORY_YEARS = 5        # Daily bars fetched for a ticker with no stored price history
 
 # Request settings
 REQUEST_TIMEOUT = 30
-REQUEST_DELAY_MIN = 1.0        # Min seconds between requests (be respectful)
-REQUEST_DELAY_MAX = 3.0        # Max seconds between requests
-MAX_RETRIES = 3
+MAX_RETRIES = 3                # Retries after a 429/503 before giving up on a URL
+
+# Per-host politeness: hostname -> (requests/sec, burst). Unlisted hosts use RATE_LIMIT_DEFAULT.
+YAHOO_API_HOST = "query2.finance.yahoo.com"
+HOST_RATE_LIMITS = {
+    YAHOO_API_HOST: (4.0, 8),
+    "english.mubasher.info": (1.0, 3),
+    "stockanalysis.com": (1.5, 3),
+    "www.egx.com.eg": (0.5, 2),
+}
+RATE_LIMIT_DEFAULT = (1.0, 2)
+RATE_LIMIT_BACKOFF = 0.5       # Multiply a host's rate by this on 429/503
+RATE_LIMIT_RECOVERY = 0.05     # Req/s given back after each successful response
+RATE_LIMIT_MIN_RATE = 0.05     # Never slow a host below this
 
 USER_AGENTS = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
@@ -47,6 +83,7 @@ MUBASHER_STOCK_URL = f"{MUBASHER_BASE}/markets/EGX/stocks/{{ticker}}"
 MUBASHER_FINANCIALS_URL = f"{MUBASHER_BASE}/markets/EGX/stocks/{{ticker}}/financial-statements"
 
 EGX_LISTED_STOCKS_URL = "https://www.egx.com.eg/en/ListedStocks.aspx"
+EGX_MARKET_INDICATORS_URL = "https://www.egx.com.eg/en/MarketIndicator.aspx"
 EGX_STOCK_DATA_URL = "https://www.egx.com.eg/en/stocksdata/companylookup.aspx?Ession=&Ession2=&ticker={ticker}"
 
 INVESTING_BASE = "https://www.investing.com"
@@ -58,7 +95,57 @@ STOCKANALYSIS_BASE = "https://stockanalysis.com/quote/egx"
 # ═══════════════════════════════════════════════════════════════
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "egx_data.db")
+DB_BUSY_TIMEOUT = 30           # Seconds a connection waits on another writer's lock
+
+# Per-connection SQLite pragmas, picked by name in database.get_connection().
+# WAL + synchronous=NORMAL can lose the last commits on power loss, never corrupt;
+# "bulk" also skips fsync entirely for throwaway rebuilds.
+DB_PRAGMA_PROFILES = {
+    "default": {"synchronous": "NORMAL", "cache_size": -64000,        # 64 MB page cache
+                "mmap_size": 256 * 1024 * 1024, "temp_store": "MEMORY"},
+    "safe": {"synchronous": "FULL", "cache_size": -16000,
+             "mmap_size": 0, "temp_store": "DEFAULT"},
+    "bulk": {"synchronous": "OFF", "cache_size": -256000,
+             "mmap_size": 1024 * 1024 * 1024, "temp_store": "MEMORY"},
+}
+DB_PRAGMA_PROFILE = os.environ.get("EGX_DB_PROFILE", "default")
+DB_READERS = 4                 # Read-only connections pooled by database.ConnectionManager
+
+# Response cache (raw_cache table): per-source TTLs in hours.
+# Sources not listed use CollectionConfig.cache_ttl_hours.
+CACHE_TTL_HOURS = {
+    "yahoo_finance": 24,       # info + statements
+    "yahoo_prices": 4,         # bulk daily bars
+    "mubasher": 24,
+    "stockanalysis": 24,
+    "egx_official": 24,
+}
+CACHE_MAX_BYTES = 256 * 1024 * 1024   # LRU-evict compressed payloads beyond this total
+
+# Incremental collection: a (ticker, source, data class) is re-collected only once its
+# last successful collection_log entry is older than this many hours (--force ignores it).
+# Collectors receive it as `freshness`; None (full runs) collects everything
+FRESHNESS_HOURS = {
+    "prices": 12,              # quotes, OHLCV, market cap
+    "statements": 24 * 7,      # income / balance / cash flow — change quarterly
+    "metadata": 24 * 30,       # names, sectors, listings
+    "history": 12,             # daily OHLCV bars in price_history
+}
+
+# Maintenance (maintenance.py): collection_log rows older than this are rolled into
+# per-day totals (never inside the FRESHNESS_HOURS windows); EVA snapshots are kept
+# daily for daily_days, then one per ticker per week until weekly_days, then monthly
+LOG_RETENTION_DAYS = 30
+EVA_RETENTION = {
+    "daily_days": 30,
+    "weekly_days": 365,
+}
+
+# Single-writer queue (db_writer.DatabaseWriter): commit every N rows or T seconds
+WRITER_BATCH_ROWS = 500
+WRITER_FLUSH_SECONDS = 2.0
 REPORTS_DIR = os.path.join(os.path.dirname(__file__), "reports")
+ARROW_EXPORT_DIR = os.path.join(os.path.dirname(__file__), "exports")   # arrow_export.py (main.py export)
 
 # ═══════════════════════════════════════════════════════════════
 # KNOWN EGX TICKERS (Major stocks — agent will also discover more)
@@ -131,8 +218,13 @@ class CollectionConfig:
     """Runtime configuration for a data collection run."""
     tickers: Optional[List[str]] = None          # None = all discovered tickers
     sources: List[str] = field(default_factory=lambda: ["yahoo", "mubasher", "egx", "stockanalysis"])
-    max_workers: int = 4
+    max_workers: int = 4                          # Yahoo worker threads / scraper requests in flight per host (1 = sequential)
+    prices_only: bool = False                     # Yahoo: bulk market-data refresh only, skip statements
+    price_history: bool = True                    # Yahoo: extend price_history with the days since the last stored bar
+    maintain: bool = True                         # run maintenance.py (retention, vacuum) after the pipeline
+    parallel_sources: bool = False                # run each source in its own worker thread
     use_cache: bool = True
     cache_ttl_hours: int = 24
+    incremental: bool = True                      # skip (ticker, source, data class) still fresh per FRESHNESS_HOURS
     export_format: str = "csv"                    # csv, json, xlsx
     verbose: bool = True
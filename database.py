@@ -6,24 +6,282 @@ SQLite storage for collected financial data and EVA results.
 import sqlite3
 import json
 import os
+import pathlib
+import queue
+import re
+import threading
+import time
+import zlib
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import groupby
 from typing import Optional, Dict, List, Any
-from config import DB_PATH
+from config import DB_PATH, DB_BUSY_TIMEOUT, DB_PRAGMA_PROFILE, DB_PRAGMA_PROFILES, DB_READERS
 
 
-def get_connection() -> sqlite3.Connection:
-    """Get a database connection, creating tables if needed."""
+def get_connection(profile: str = DB_PRAGMA_PROFILE, check_same_thread: bool = True) -> sqlite3.Connection:
+    """
+    Get a database connection with the given pragma profile (config.DB_PRAGMA_PROFILES),
+    migrating the schema first if it is behind.
+    """
     os.makedirs(os.path.dirname(DB_PATH) if os.path.dirname(DB_PATH) else ".", exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT, check_same_thread=check_same_thread,
+                           factory=_connection_class())
     conn.row_factory = sqlite3.Row
+    _instrument(conn)
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")   # applies to new files; maintenance converts old ones
     conn.execute("PRAGMA journal_mode=WAL")
-    _create_tables(conn)
+    for pragma, value in DB_PRAGMA_PROFILES[profile].items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    migrate(conn)
     return conn
 
 
-def _create_tables(conn: sqlite3.Connection):
-    """Create all database tables."""
-    conn.executescript("""
+def get_read_connection(profile: str = DB_PRAGMA_PROFILE) -> sqlite3.Connection:
+    """
+    Read-only connection (mode=ro, query_only) for readers running beside the
+    writer. Under WAL it reads the last committed state without blocking writes
+    or being blocked by them. Not tied to the creating thread, so it can be pooled.
+    """
+    uri = f"{pathlib.Path(DB_PATH).resolve().as_uri()}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, timeout=DB_BUSY_TIMEOUT, check_same_thread=False,
+                           factory=_connection_class())
+    conn.row_factory = sqlite3.Row
+    _instrument(conn)
+    conn.execute("PRAGMA query_only = ON")
+    for pragma, value in DB_PRAGMA_PROFILES[profile].items():
+        if pragma != "synchronous":
+            conn.execute(f"PRAGMA {pragma} = {value}")
+    return conn
+
+
+class ConnectionManager:
+    """
+    One read-write connection (migrated on open) plus a pool of read-only ones.
+    EVA, reporting and the Supabase push take a reader, so they never queue
+    behind the connection the collectors use.
+    """
+
+    def __init__(self, readers: int = DB_READERS, profile: str = DB_PRAGMA_PROFILE):
+        self.profile = profile
+        self.conn = get_connection(profile)   # the read-write connection; creates / migrates the schema
+        self._readers = max(1, readers)
+        self._opened = 0
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def reader(self):
+        """Borrow a read-only connection; opened lazily, blocks when all `readers` are in use."""
+        conn = None
+        with self._lock:
+            if self._idle.empty() and self._opened < self._readers:
+                self._opened += 1
+                conn = get_read_connection(self.profile)
+        if conn is None:
+            conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        """Close the pooled readers and the read-write connection."""
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+        self.conn.close()
+
+
+# ═══════════════════════════════════════════════════════════════
+# QUERY PROFILING
+# ═══════════════════════════════════════════════════════════════
+# Opt-in (main.py --db-profile). Connections opened after enable_profiling()
+# time every execute / fetch and attribute the time, rows and SQLite VM steps
+# (progress handler) to the statement's normalised text. The trace callback
+# also counts what SQLite itself runs, including executescript() statements
+# and the implicit BEGIN / COMMIT.
+
+_VM_STEP_INTERVAL = 1000   # progress handler granularity, in VM instructions
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+def normalize_sql(sql: str) -> str:
+    """Statement text with literals replaced by ? and placeholder lists collapsed."""
+    sql = _LITERALS.sub("?", " ".join(sql.split()))
+    return _PLACEHOLDER_LISTS.sub("?, …", sql)
+
+
+class QueryProfiler:
+    """Per-statement call counts, latencies, rows touched and VM steps (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Dict] = {}
+        self.traced: Dict[str, int] = {}
+
+    def record(self, sql: str, seconds: float, rows: int, vm_steps: int) -> tuple:
+        """Add one execution; returns the handle fetches use to extend it."""
+        key = normalize_sql(sql)
+        with self._lock:
+            entry = self.stats.setdefault(key, {"calls": 0, "rows": 0, "vm_steps": 0, "times": []})
+            entry["calls"] += 1
+            entry["rows"] += max(rows, 0)
+            entry["vm_steps"] += vm_steps
+            entry["times"].append(seconds)
+            return key, len(entry["times"]) - 1
+
+    def extend(self, handle: tuple, seconds: float, rows: int, vm_steps: int):
+        """Fetch time and rows of an execution recorded earlier."""
+        key, i = handle
+        with self._lock:
+            entry = self.stats[key]
+            entry["times"][i] += seconds
+            entry["rows"] += rows
+            entry["vm_steps"] += vm_steps
+
+    def trace(self, statement: str):
+        key = normalize_sql(statement)
+        with self._lock:
+            self.traced[key] = self.traced.get(key, 0) + 1
+
+    def summary(self) -> List[Dict]:
+        """One row per statement, slowest total first."""
+        with self._lock:
+            items = [(sql, dict(entry, times=sorted(entry["times"]))) for sql, entry in self.stats.items()]
+        out = []
+        for sql, entry in items:
+            times = entry["times"]
+            out.append({
+                "sql": sql,
+                "calls": entry["calls"],
+                "total_ms": sum(times) * 1000,
+                "mean_ms": sum(times) / len(times) * 1000,
+                "p95_ms": times[max(0, -(-len(times) * 95 // 100) - 1)] * 1000,
+                "rows": entry["rows"],
+                "vm_steps": entry["vm_steps"],
+            })
+        return sorted(out, key=lambda r: r["total_ms"], reverse=True)
+
+    def report(self, limit: Optional[int] = None) -> str:
+        """Text table of summary() plus the statement counts seen by the trace callback."""
+        rows = self.summary()
+        total = sum(r["total_ms"] for r in rows) or 1.0
+        lines = [f"{'total ms':>10}{'%':>6}{'calls':>8}{'mean ms':>9}{'p95 ms':>9}{'rows':>9}{'VM steps':>11}  statement"]
+        for r in rows[:limit]:
+            lines.append(f"{r['total_ms']:>10.1f}{r['total_ms'] / total:>6.1%}{r['calls']:>8}{r['mean_ms']:>9.3f}"
+                         f"{r['p95_ms']:>9.3f}{r['rows']:>9}{r['vm_steps']:>11}  {r['sql'][:160]}")
+        with self._lock:
+            traced = sorted(self.traced.items(), key=lambda kv: kv[1], reverse=True)
+        lines += ["", f"{'traced':>10}  statement as run by SQLite"]
+        lines += [f"{count:>10}  {sql[:160]}" for sql, count in traced[:limit]]
+        return "\n".join(lines)
+
+
+_profiler: Optional[QueryProfiler] = None
+
+
+def enable_profiling() -> QueryProfiler:
+    """Profile every connection opened from now on; returns the shared profiler."""
+    global _profiler
+    if _profiler is None:
+        _profiler = QueryProfiler()
+    return _profiler
+
+
+class _ProfiledCursor(sqlite3.Cursor):
+    """Cursor that reports each execute and the fetches that follow it to the profiler."""
+
+    _handle = None
+
+    def _timed(self, method, sql, *args):
+        conn = self.connection
+        steps, start = conn.vm_steps, time.perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            self._handle = _profiler.record(sql, time.perf_counter() - start, self.rowcount,
+                                            conn.vm_steps - steps)
+
+    def _fetched(self, method, *args):
+        conn = self.connection
+        steps, start = conn.vm_steps, time.perf_counter()
+        rows = method(*args)
+        if self._handle is not None:
+            count = len(rows) if isinstance(rows, list) else int(rows is not None)
+            _profiler.extend(self._handle, time.perf_counter() - start, count, conn.vm_steps - steps)
+        return rows
+
+    def execute(self, sql, parameters=()):
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self._timed(super().executescript, sql_script)
+
+    def fetchone(self):
+        return self._fetched(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetched(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetched(super().fetchall)
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+
+class _ProfiledConnection(sqlite3.Connection):
+    """Connection whose shortcut execute methods go through _ProfiledCursor."""
+
+    vm_steps = 0
+
+    def cursor(self, factory=_ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def _connection_class():
+    return sqlite3.Connection if _profiler is None else _ProfiledConnection
+
+
+def _instrument(conn: sqlite3.Connection):
+    if not isinstance(conn, _ProfiledConnection):
+        return
+
+    def step():
+        conn.vm_steps += _VM_STEP_INTERVAL
+        return 0
+
+    conn.set_progress_handler(step, _VM_STEP_INTERVAL)
+    conn.set_trace_callback(_profiler.trace)
+
+
+# ═══════════════════════════════════════════════════════════════
+# SCHEMA MIGRATIONS
+# ═══════════════════════════════════════════════════════════════
+# MIGRATIONS[n - 1] takes a database from user_version n-1 to n. Each step is
+# SQL or a callable(conn), and must be safe to re-run: databases created before
+# versioning report user_version 0 while already holding some of the objects.
+# Append new steps; never edit one that has shipped.
+
+_BASE_SCHEMA = """
     -- Master list of all EGX tickers
     CREATE TABLE IF NOT EXISTS companies (
         ticker TEXT PRIMARY KEY,
@@ -174,120 +432,629 @@ def _create_tables(conn: sqlite3.Connection):
     -- Cache for raw API/scrape responses
     CREATE TABLE IF NOT EXISTS raw_cache (
         cache_key TEXT PRIMARY KEY,
-        data TEXT,             -- JSON serialized
+        data BLOB,             -- zlib-compressed JSON
         source TEXT,
         created_at TEXT DEFAULT (datetime('now')),
         expires_at TEXT
     );
+"""
+
+
+def _cache_validators_and_log_class(conn: sqlite3.Connection):
+    """Compressed LRU cache columns, conditional-GET validators, collection_log data classes."""
+    _ensure_column(conn, "raw_cache", "size_bytes", "INTEGER")
+    _ensure_column(conn, "raw_cache", "last_accessed", "TEXT")
+    _ensure_column(conn, "collection_log", "data_class", "TEXT")   # 'prices', 'statements', 'metadata'
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS http_validators (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            content_hash TEXT,     -- sha256 of the last body, for sites without validators
+            checked_at TEXT
+        )
     """)
+
+
+_INDEXES = """
+    CREATE INDEX IF NOT EXISTS idx_collection_log_fresh ON collection_log(source, data_class, ticker, timestamp);
+    CREATE INDEX IF NOT EXISTS idx_raw_cache_expires ON raw_cache(expires_at);
+    CREATE INDEX IF NOT EXISTS idx_raw_cache_lru ON raw_cache(last_accessed);
+
+    -- Hot read paths: latest annual row per (ticker, source) for the EVA merge,
+    -- and the latest-calculation-date report (MAX + equality lookup, ordered by eva)
+    CREATE INDEX IF NOT EXISTS idx_income_latest ON income_statements(ticker, source, period, period_end);
+    CREATE INDEX IF NOT EXISTS idx_balance_latest ON balance_sheets(ticker, source, period, period_end);
+    CREATE INDEX IF NOT EXISTS idx_cash_flow_latest ON cash_flows(ticker, source, period, period_end);
+    CREATE INDEX IF NOT EXISTS idx_market_data_latest ON market_data(ticker, source, date);
+    CREATE INDEX IF NOT EXISTS idx_eva_results_date ON eva_results(calculation_date, eva);
+"""
+
+# Snapshot table -> (history table, snapshot key, ordering column). Each snapshot
+# holds the newest history row per key, kept current by triggers on the history
+# table, so "latest" lookups are primary-key reads whatever the history depth.
+# Snapshot columns mirror the history table in order (rows are copied with
+# SELECT *), so a migration adding a history column must add it here as well.
+LATEST_SNAPSHOTS = {
+    "latest_income_statements": ("income_statements", ("ticker", "source", "period"), "period_end"),
+    "latest_balance_sheets": ("balance_sheets", ("ticker", "source", "period"), "period_end"),
+    "latest_market_data": ("market_data", ("ticker", "source"), "date"),
+}
+
+
+def _latest_snapshots(conn: sqlite3.Connection):
+    """Create, backfill and wire up the triggers of the latest_* snapshot tables."""
+    for snapshot, (history, key, order) in LATEST_SNAPSHOTS.items():
+        cols = conn.execute(f"PRAGMA table_info({history})").fetchall()
+        decls = ", ".join(f"{c[1]} {c[2]}".strip() for c in cols)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {snapshot} ({decls}, PRIMARY KEY ({', '.join(key)}))")
+
+        match = " AND ".join(f"{k} = {{row}}.{k}" for k in key)
+        conn.execute(f"""
+            INSERT OR REPLACE INTO {snapshot}
+            SELECT * FROM {history} h
+            WHERE {order} = (SELECT MAX({order}) FROM {history} WHERE {match.format(row="h")})
+        """)
+
+        # Insert / update: only a row at or past the current snapshot's position can replace it
+        newer = (f"NEW.{order} >= COALESCE((SELECT {order} FROM {snapshot} "
+                 f"WHERE {match.format(row='NEW')}), '')")
+        copy_new = f"""
+                DELETE FROM {snapshot} WHERE {match.format(row="NEW")};
+                INSERT INTO {snapshot} SELECT * FROM {history} WHERE rowid = NEW.rowid;"""
+        for event in ("INSERT", "UPDATE"):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{snapshot}_{event.lower()} AFTER {event} ON {history}
+                WHEN {newer}
+                BEGIN {copy_new}
+                END
+            """)
+        # Delete of the snapshot row: fall back to the next newest history row
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{snapshot}_delete AFTER DELETE ON {history}
+            WHEN OLD.{order} = (SELECT {order} FROM {snapshot} WHERE {match.format(row="OLD")})
+            BEGIN
+                DELETE FROM {snapshot} WHERE {match.format(row="OLD")};
+                INSERT INTO {snapshot} SELECT * FROM {history}
+                    WHERE {match.format(row="OLD")} ORDER BY {order} DESC LIMIT 1;
+            END
+        """)
+
+
+_PRICE_HISTORY = """
+    -- Daily OHLCV bars; day = days since 1970-01-01
+    CREATE TABLE IF NOT EXISTS price_history (
+        ticker TEXT,
+        day INTEGER,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        adj_close REAL,
+        volume INTEGER,
+        PRIMARY KEY (ticker, day)
+    ) WITHOUT ROWID;
+
+    -- The same bars packed per ticker for bulk loads (see price_history.py):
+    -- days as little-endian int32, bars as little-endian float64 rows
+    CREATE TABLE IF NOT EXISTS price_history_packed (
+        ticker TEXT PRIMARY KEY,
+        first_day INTEGER,
+        last_day INTEGER,
+        bars INTEGER,
+        days BLOB,
+        ohlcv BLOB,
+        updated_at TEXT
+    );
+"""
+
+_COLLECTION_LOG_DAILY = """
+    -- collection_log rows past retention, rolled up per day (maintenance.py)
+    CREATE TABLE IF NOT EXISTS collection_log_daily (
+        day TEXT,
+        source TEXT,
+        data_class TEXT,
+        status TEXT,
+        attempts INTEGER,
+        records_collected INTEGER,
+        duration_seconds REAL,     -- total over the attempts
+        PRIMARY KEY (day, source, data_class, status)
+    );
+"""
+
+
+def _eva_input_fingerprints(conn: sqlite3.Connection):
+    """Fingerprint of the inputs and parameters behind each EVA result (incremental recompute)."""
+    _ensure_column(conn, "eva_results", "input_fingerprint", "TEXT")
+
+
+_EVA_SIMULATIONS = """
+    -- Monte Carlo intrinsic-value distributions beside eva_results (monte_carlo.py)
+    CREATE TABLE IF NOT EXISTS eva_simulations (
+        ticker TEXT,
+        calculation_date TEXT,
+        samples INTEGER,
+        seed INTEGER,
+        intrinsic_value_p5 REAL,
+        intrinsic_value_p50 REAL,
+        intrinsic_value_p95 REAL,
+        intrinsic_premium_p5 REAL,
+        intrinsic_premium_p50 REAL,
+        intrinsic_premium_p95 REAL,
+        prob_undervalued REAL,     -- share of samples per signal
+        prob_fair_value REAL,
+        prob_overvalued REAL,
+        PRIMARY KEY (ticker, calculation_date)
+    );
+"""
+
+
+MIGRATIONS = [
+    _BASE_SCHEMA,                       # 1: tables of the first release
+    _cache_validators_and_log_class,    # 2: cache LRU columns, HTTP validators, log data classes
+    _INDEXES,                           # 3: freshness, cache eviction and hot-read indexes
+    _latest_snapshots,                  # 4: latest_* snapshot tables and their triggers
+    _PRICE_HISTORY,                     # 5: daily OHLCV history
+    _COLLECTION_LOG_DAILY,              # 6: collection_log retention rollup
+    _eva_input_fingerprints,            # 7: eva_results.input_fingerprint
+    _EVA_SIMULATIONS,                   # 8: Monte Carlo intrinsic-value percentiles
+]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection):
+    """
+    Apply the migrations this database has not seen yet, in one transaction.
+    A current database costs a single pragma read.
+    """
+    if schema_version(conn) >= len(MIGRATIONS):
+        return
+    conn.execute("BEGIN IMMEDIATE")   # concurrent openers wait here, then see the new version
+    try:
+        for step in MIGRATIONS[schema_version(conn):]:
+            if callable(step):
+                step(conn)
+            else:
+                for statement in _statements(step):
+                    conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _statements(script: str):
+    """Split a SQL script into single statements (trigger bodies stay whole)."""
+    buf = ""
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            yield buf.strip()
+            buf = ""
+
+
+def _ensure_column(conn: sqlite3.Connection, table: str, column: str, decl: str):
+    """Add a column to an existing table if it is missing."""
+    cols = {r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+    if column not in cols:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+# Primary key shared by income_statements, balance_sheets and cash_flows
+STATEMENT_KEY = ("ticker", "period", "period_end", "source")
+
+
+@lru_cache(maxsize=None)
+def _insert_sql(table: str, keys: tuple, verb: str = "INSERT", conflict: tuple = (),
+                merge: bool = False) -> str:
+    """
+    INSERT statement for one column set, built once and reused (sqlite3 also caches
+    the prepared statement by its text). With `conflict`, existing rows get only the
+    supplied non-key columns overwritten; with `merge` as well, a NULL in the new row
+    keeps the stored value instead of overwriting it.
+    """
+    cols = ", ".join(keys)
+    placeholders = ", ".join(["?"] * len(keys))
+    sql = f"{verb} INTO {table} ({cols}) VALUES ({placeholders})"
+    if conflict:
+        updates = ", ".join([f"{k}=COALESCE(excluded.{k}, {table}.{k})" if merge else f"{k}=excluded.{k}"
+                             for k in keys if k not in conflict])
+        sql += f" ON CONFLICT({', '.join(conflict)}) DO UPDATE SET {updates}"
+    return sql
+
+
+def _write_many(conn: sqlite3.Connection, table: str, rows: List[Dict], verb: str = "INSERT",
+                conflict: tuple = (), merge: bool = False):
+    """
+    executemany over rows, one statement per consecutive run of rows sharing a
+    column set, then a single commit. Row order is preserved, so later rows for
+    the same key still win exactly as with one call per row.
+    """
+    if not rows:
+        return
+    for keys, group in groupby(rows, key=lambda r: tuple(r.keys())):
+        conn.executemany(_insert_sql(table, keys, verb, conflict, merge), [list(r.values()) for r in group])
     conn.commit()
 
 
+def _stamp(rows: List[Dict]) -> List[Dict]:
+    now = datetime.now().isoformat()
+    for data in rows:
+        data["updated_at"] = now
+    return rows
+
+
 def upsert_company(conn: sqlite3.Connection, ticker: str, **kwargs):
     """Insert or update a company record."""
     kwargs["ticker"] = ticker
-    kwargs["updated_at"] = datetime.now().isoformat()
-    cols = ", ".join(kwargs.keys())
-    placeholders = ", ".join(["?"] * len(kwargs))
-    updates = ", ".join([f"{k}=excluded.{k}" for k in kwargs if k != "ticker"])
-    conn.execute(
-        f"INSERT INTO companies ({cols}) VALUES ({placeholders}) ON CONFLICT(ticker) DO UPDATE SET {updates}",
-        list(kwargs.values())
-    )
-    conn.commit()
+    upsert_company_many(conn, [kwargs])
+
+
+def upsert_company_many(conn: sqlite3.Connection, rows: List[Dict]):
+    """Insert or update many company records (each dict carries its ticker) in one transaction."""
+    _write_many(conn, "companies", _stamp(rows), conflict=("ticker",))
 
 
 def upsert_market_data(conn: sqlite3.Connection, data: Dict):
     """Insert or update market data."""
-    data["updated_at"] = datetime.now().isoformat()
-    cols = ", ".join(data.keys())
-    placeholders = ", ".join(["?"] * len(data))
-    conn.execute(
-        f"INSERT OR REPLACE INTO market_data ({cols}) VALUES ({placeholders})",
-        list(data.values())
-    )
-    conn.commit()
+    upsert_market_data_many(conn, [data])
+
 
+def upsert_market_data_many(conn: sqlite3.Connection, rows: List[Dict]):
+    """
+    Insert or update many market data rows in a single transaction. On conflict
+    only the supplied columns are overwritten, so the bulk price refresh and the
+    per-ticker info fields can land on the same (ticker, date, source) row
+    without wiping each other.
+    """
+    _write_many(conn, "market_data", _stamp(rows), conflict=("ticker", "date", "source"))
 
-def upsert_income_statement(conn: sqlite3.Connection, data: Dict):
+
+def _write_statements(conn: sqlite3.Connection, table: str, rows: List[Dict], merge: bool):
+    """
+    Statement rows replace the whole period row by default. merge=True folds the
+    supplied columns into an existing row instead (NULLs keep the stored value),
+    for sources that only see part of a statement at a time.
+    """
+    if merge:
+        _write_many(conn, table, _stamp(rows), conflict=STATEMENT_KEY, merge=True)
+    else:
+        _write_many(conn, table, _stamp(rows), verb="INSERT OR REPLACE")
+
+
+def upsert_income_statement(conn: sqlite3.Connection, data: Dict, merge: bool = False):
     """Insert or update income statement data."""
-    data["updated_at"] = datetime.now().isoformat()
-    cols = ", ".join(data.keys())
-    placeholders = ", ".join(["?"] * len(data))
-    conn.execute(
-        f"INSERT OR REPLACE INTO income_statements ({cols}) VALUES ({placeholders})",
-        list(data.values())
-    )
-    conn.commit()
+    upsert_income_statement_many(conn, [data], merge)
+
 
+def upsert_income_statement_many(conn: sqlite3.Connection, rows: List[Dict], merge: bool = False):
+    """Insert or update many income statement rows in a single transaction."""
+    _write_statements(conn, "income_statements", rows, merge)
 
-def upsert_balance_sheet(conn: sqlite3.Connection, data: Dict):
+
+def upsert_balance_sheet(conn: sqlite3.Connection, data: Dict, merge: bool = False):
     """Insert or update balance sheet data."""
-    data["updated_at"] = datetime.now().isoformat()
-    cols = ", ".join(data.keys())
-    placeholders = ", ".join(["?"] * len(data))
-    conn.execute(
-        f"INSERT OR REPLACE INTO balance_sheets ({cols}) VALUES ({placeholders})",
-        list(data.values())
-    )
-    conn.commit()
+    upsert_balance_sheet_many(conn, [data], merge)
 
 
-def upsert_cash_flow(conn: sqlite3.Connection, data: Dict):
+def upsert_balance_sheet_many(conn: sqlite3.Connection, rows: List[Dict], merge: bool = False):
+    """Insert or update many balance sheet rows in a single transaction."""
+    _write_statements(conn, "balance_sheets", rows, merge)
+
+
+def upsert_cash_flow(conn: sqlite3.Connection, data: Dict, merge: bool = False):
     """Insert or update cash flow data."""
-    data["updated_at"] = datetime.now().isoformat()
-    cols = ", ".join(data.keys())
-    placeholders = ", ".join(["?"] * len(data))
-    conn.execute(
-        f"INSERT OR REPLACE INTO cash_flows ({cols}) VALUES ({placeholders})",
-        list(data.values())
-    )
-    conn.commit()
+    upsert_cash_flow_many(conn, [data], merge)
+
+
+def upsert_cash_flow_many(conn: sqlite3.Connection, rows: List[Dict], merge: bool = False):
+    """Insert or update many cash flow rows in a single transaction."""
+    _write_statements(conn, "cash_flows", rows, merge)
 
 
 def upsert_eva_result(conn: sqlite3.Connection, data: Dict):
     """Insert or update EVA calculation result."""
-    cols = ", ".join(data.keys())
-    placeholders = ", ".join(["?"] * len(data))
+    upsert_eva_result_many(conn, [data])
+
+
+def upsert_eva_result_many(conn: sqlite3.Connection, rows: List[Dict]):
+    """Insert or update many EVA results in a single transaction."""
+    _write_many(conn, "eva_results", rows, verb="INSERT OR REPLACE")
+
+
+def upsert_eva_simulation_many(conn: sqlite3.Connection, rows: List[Dict]):
+    """Insert or replace many Monte Carlo summaries in a single transaction."""
+    _write_many(conn, "eva_simulations", rows, verb="INSERT OR REPLACE")
+
+
+def upsert_price_history_many(conn: sqlite3.Connection, rows: List[Dict]):
+    """Insert or replace many daily bars (ticker, day, open, ..., volume) in a single transaction."""
+    _write_many(conn, "price_history", rows, verb="INSERT OR REPLACE")
+
+
+def set_packed_prices_many(conn: sqlite3.Connection, rows: List[Dict]):
+    """Replace the packed per-ticker price history of many tickers in a single transaction."""
+    _write_many(conn, "price_history_packed", _stamp(rows), verb="INSERT OR REPLACE")
+
+
+def get_packed_prices(conn: sqlite3.Connection, tickers: Optional[List[str]] = None) -> List[sqlite3.Row]:
+    """Packed price history rows, for the given tickers or all of them."""
+    if tickers is None:
+        return conn.execute("SELECT ticker, days, ohlcv FROM price_history_packed").fetchall()
+    rows = []
+    for i in range(0, len(tickers), 500):   # stay under SQLite's bound-parameter limit
+        chunk = tickers[i:i + 500]
+        rows += conn.execute(
+            f"SELECT ticker, days, ohlcv FROM price_history_packed WHERE ticker IN ({', '.join('?' * len(chunk))})",
+            chunk
+        ).fetchall()
+    return rows
+
+
+def log_collection(conn: sqlite3.Connection, ticker: str, source: str, status: str,
+                   records: int = 0, error: str = None, duration: float = 0, data_class: str = None):
+    """Log a data collection attempt."""
     conn.execute(
-        f"INSERT OR REPLACE INTO eva_results ({cols}) VALUES ({placeholders})",
-        list(data.values())
+        "INSERT INTO collection_log (ticker, source, status, records_collected, error_message, duration_seconds, data_class) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (ticker, source, status, records, error, duration, data_class)
     )
     conn.commit()
 
 
-def log_collection(conn: sqlite3.Connection, ticker: str, source: str, status: str,
-                   records: int = 0, error: str = None, duration: float = 0):
-    """Log a data collection attempt."""
+def log_collection_many(conn: sqlite3.Connection, entries: List[Dict]):
+    """
+    Log many collection attempts in one transaction. Each entry uses the
+    collection_log column names (ticker, source, status, records_collected, ...).
+    """
+    _write_many(conn, "collection_log", entries)
+
+
+def stale_tickers(conn: sqlite3.Connection, tickers: List[str], source: str, data_class: str,
+                  freshness: Optional[Dict[str, float]]) -> List[str]:
+    """
+    The tickers whose last successful or partial (source, data_class) collection is
+    older than freshness[data_class] hours. freshness=None means everything is stale.
+    """
+    if not freshness or data_class not in freshness:
+        return list(tickers)
+    rows = conn.execute(FRESH_TICKERS_SQL, (source, data_class, f"-{freshness[data_class]} hours")).fetchall()
+    fresh = {r["ticker"] for r in rows}
+    return [t for t in tickers if t not in fresh]
+
+
+def get_cache(conn: sqlite3.Connection, key: str) -> Optional[Any]:
+    """Get cached data if not expired. Read-only: hits are recorded with touch_cache_many()."""
+    row = conn.execute(
+        "SELECT data FROM raw_cache WHERE cache_key = ? AND expires_at > ?",
+        (key, datetime.now().isoformat())
+    ).fetchone()
+    if row is None:
+        return None
+    data = row["data"]
+    if isinstance(data, bytes):
+        data = zlib.decompress(data).decode("utf-8")
+    return json.loads(data)
+
+
+def set_cache(conn: sqlite3.Connection, key: str, data: Any, source: str, ttl_hours: float = 24):
+    """Cache data with TTL, stored as zlib-compressed JSON."""
+    now = datetime.now()
+    blob = zlib.compress(json.dumps(data, default=str).encode("utf-8"))
     conn.execute(
-        "INSERT INTO collection_log (ticker, source, status, records_collected, error_message, duration_seconds) "
-        "VALUES (?, ?, ?, ?, ?, ?)",
-        (ticker, source, status, records, error, duration)
+        "INSERT OR REPLACE INTO raw_cache (cache_key, data, source, created_at, expires_at, size_bytes, last_accessed) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (key, blob, source, now.isoformat(), (now + timedelta(hours=ttl_hours)).isoformat(),
+         len(blob), now.isoformat())
     )
     conn.commit()
 
 
-def get_cache(conn: sqlite3.Connection, key: str) -> Optional[Dict]:
-    """Get cached data if not expired."""
+def touch_cache_many(conn: sqlite3.Connection, accessed: Dict[str, str]):
+    """Set last_accessed for many cache keys ({key: timestamp}) in one statement."""
+    if not accessed:
+        return
+    conn.executemany("UPDATE raw_cache SET last_accessed = ? WHERE cache_key = ?",
+                     [(ts, key) for key, ts in accessed.items()])
+    conn.commit()
+
+
+def purge_expired_cache(conn: sqlite3.Connection) -> int:
+    """Delete expired cache entries. Returns the number of rows removed."""
+    cur = conn.execute("DELETE FROM raw_cache WHERE expires_at <= ?", (datetime.now().isoformat(),))
+    conn.commit()
+    return cur.rowcount
+
+
+def evict_cache(conn: sqlite3.Connection, max_bytes: int) -> int:
+    """Evict least-recently-used cache entries until the total payload size fits max_bytes."""
+    total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM raw_cache").fetchone()[0]
+    if total <= max_bytes:
+        return 0
+    removed = 0
+    victims = conn.execute(
+        "SELECT cache_key, COALESCE(size_bytes, LENGTH(data)) AS size FROM raw_cache ORDER BY last_accessed"
+    ).fetchall()
+    for row in victims:
+        if total <= max_bytes:
+            break
+        conn.execute("DELETE FROM raw_cache WHERE cache_key = ?", (row["cache_key"],))
+        total -= row["size"] or 0
+        removed += 1
+    conn.commit()
+    return removed
+
+
+def rollup_collection_log(conn: sqlite3.Connection, keep_days: float) -> int:
+    """
+    Fold collection_log rows older than keep_days into per-day collection_log_daily
+    totals and delete them. Returns the number of log rows removed.
+    """
+    cutoff = f"-{keep_days} days"
+    conn.execute("""
+        INSERT INTO collection_log_daily
+            (day, source, data_class, status, attempts, records_collected, duration_seconds)
+        SELECT date(timestamp), source, COALESCE(data_class, ''), status,
+               COUNT(*), COALESCE(SUM(records_collected), 0), COALESCE(SUM(duration_seconds), 0)
+        FROM collection_log
+        WHERE timestamp < datetime('now', ?)
+        GROUP BY date(timestamp), source, COALESCE(data_class, ''), status
+        ON CONFLICT(day, source, data_class, status) DO UPDATE SET
+            attempts = attempts + excluded.attempts,
+            records_collected = records_collected + excluded.records_collected,
+            duration_seconds = duration_seconds + excluded.duration_seconds
+    """, (cutoff,))
+    cur = conn.execute("DELETE FROM collection_log WHERE timestamp < datetime('now', ?)", (cutoff,))
+    conn.commit()
+    return cur.rowcount
+
+
+def downsample_eva_results(conn: sqlite3.Connection, daily_days: int, weekly_days: int) -> int:
+    """
+    Thin old EVA snapshots: every calculation of the last daily_days is kept, then
+    the latest per ticker per week until weekly_days, then the latest per month.
+    Returns the number of rows removed.
+    """
+    cur = conn.execute("""
+        DELETE FROM eva_results WHERE rowid IN (
+            SELECT rowid FROM (
+                SELECT rowid, ROW_NUMBER() OVER (
+                    PARTITION BY ticker,
+                        CASE WHEN calculation_date >= date('now', ?)
+                             THEN strftime('%Y-W%W', calculation_date)
+                             ELSE strftime('%Y-%m', calculation_date) END
+                    ORDER BY calculation_date DESC) AS keep_rank
+                FROM eva_results
+                WHERE calculation_date < date('now', ?)
+            ) WHERE keep_rank > 1
+        )
+    """, (f"-{weekly_days} days", f"-{daily_days} days"))
+    conn.commit()
+    return cur.rowcount
+
+
+def file_stats(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Allocated and free bytes of the database file (WAL checkpointed first)."""
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return {
+        "bytes": conn.execute("PRAGMA page_count").fetchone()[0] * page_size,
+        "free_bytes": conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size,
+    }
+
+
+def vacuum(conn: sqlite3.Connection) -> str:
+    """
+    Return free pages to the filesystem. A file not yet in auto_vacuum=INCREMENTAL
+    mode (created before it became the default) gets the one full VACUUM that
+    converts it; after that, PRAGMA incremental_vacuum. Returns the mode used.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return "full (converted to incremental)"
+    # executescript steps the pragma to completion; execute() stops after the first page
+    conn.executescript("PRAGMA incremental_vacuum;")
+    return "incremental"
+
+
+def get_validators(conn: sqlite3.Connection, url: str) -> Optional[Dict]:
+    """Stored ETag / Last-Modified / content hash for a URL."""
     row = conn.execute(
-        "SELECT data FROM raw_cache WHERE cache_key = ? AND expires_at > datetime('now')",
-        (key,)
+        "SELECT etag, last_modified, content_hash FROM http_validators WHERE url = ?", (url,)
     ).fetchone()
-    if row:
-        return json.loads(row["data"])
-    return None
+    return dict(row) if row else None
 
 
-def set_cache(conn: sqlite3.Connection, key: str, data: Any, source: str, ttl_hours: int = 24):
-    """Cache data with TTL."""
-    expires = (datetime.now() + timedelta(hours=ttl_hours)).isoformat()
+def set_validators(conn: sqlite3.Connection, url: str, etag: Optional[str],
+                   last_modified: Optional[str], content_hash: Optional[str]):
+    """Record the validators of the latest full response for a URL."""
     conn.execute(
-        "INSERT OR REPLACE INTO raw_cache (cache_key, data, source, expires_at) VALUES (?, ?, ?, ?)",
-        (key, json.dumps(data, default=str), source, expires)
+        "INSERT OR REPLACE INTO http_validators (url, etag, last_modified, content_hash, checked_at) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (url, etag, last_modified, content_hash, datetime.now().isoformat())
     )
     conn.commit()
 
 
+def touch_validators(conn: sqlite3.Connection, url: str):
+    """Mark a URL as revalidated (304) without changing its validators."""
+    conn.execute("UPDATE http_validators SET checked_at = ? WHERE url = ?", (datetime.now().isoformat(), url))
+    conn.commit()
+
+
+# ── Hot queries ──
+# Shared by the code that runs them and by explain_hot_queries(), so the
+# plans printed by `main.py --explain` are the plans the pipeline gets.
+
+LATEST_STATEMENT_SQL = "SELECT * FROM latest_{table} WHERE ticker = ? AND source = ? AND period = 'annual'"
+
+LATEST_MARKET_DATA_SQL = "SELECT * FROM latest_market_data WHERE ticker = ? AND source = ?"
+
+LATEST_EVA_RESULTS_SQL = """
+        SELECT e.*, c.name, c.sector
+        FROM eva_results e
+        LEFT JOIN companies c ON e.ticker = c.ticker
+        WHERE e.calculation_date = (SELECT MAX(calculation_date) FROM eva_results)
+        ORDER BY e.eva DESC
+    """
+
+
+@lru_cache(maxsize=None)
+def merged_latest_sql(table: str, fields: tuple, sources: tuple) -> str:
+    """
+    One row per ticker from the latest_<table> snapshot (annual rows for
+    statements), each field taken from the first of `sources` that has it —
+    the field-wise source-priority merge of all tickers in one statement.
+    The snapshot holds one row per (ticker, source[, period]), so each
+    MAX(CASE ...) picks that source's value or NULL.
+    """
+    columns = ",\n    ".join(
+        "COALESCE(" + ", ".join(f"MAX(CASE WHEN source = '{s}' THEN {f} END)" for s in sources) + f") AS {f}"
+        for f in fields
+    )
+    where = " AND period = 'annual'" if table != "market_data" else ""
+    placeholders = ", ".join(f"'{s}'" for s in sources)
+    return (f"SELECT ticker,\n    {columns}\nFROM latest_{table}\n"
+            f"WHERE source IN ({placeholders}){where}\nGROUP BY ticker")
+
+
+FRESH_TICKERS_SQL = (
+    "SELECT DISTINCT ticker FROM collection_log "
+    "WHERE source = ? AND data_class = ? AND status IN ('success', 'partial') AND timestamp > datetime('now', ?)"
+)
+
+HOT_QUERIES = {
+    "EVA merge — income_statements": (LATEST_STATEMENT_SQL.format(table="income_statements"), ("COMI", "yahoo_finance")),
+    "EVA merge — balance_sheets": (LATEST_STATEMENT_SQL.format(table="balance_sheets"), ("COMI", "yahoo_finance")),
+    "EVA merge — market_data": (LATEST_MARKET_DATA_SQL, ("COMI", "yahoo_finance")),
+    "Report — latest EVA results": (LATEST_EVA_RESULTS_SQL, ()),
+    "Incremental — fresh tickers": (FRESH_TICKERS_SQL, ("yahoo_finance", "prices", "-12 hours")),
+}
+
+
+def analyze(conn: sqlite3.Connection):
+    """Refresh the planner statistics (sqlite_stat1) after a bulk load."""
+    conn.execute("PRAGMA analysis_limit = 1000")   # sample large indexes instead of reading them whole
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def explain_hot_queries(conn: sqlite3.Connection) -> Dict[str, List[str]]:
+    """EXPLAIN QUERY PLAN detail lines for each hot query."""
+    return {name: [r["detail"] for r in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+            for name, (sql, params) in HOT_QUERIES.items()}
+
+
+def is_full_scan(detail: str) -> bool:
+    """True for a plan step that reads a whole table rather than searching an index."""
+    return detail.startswith("SCAN") and "INDEX" not in detail
+
+
 def get_all_tickers(conn: sqlite3.Connection) -> List[str]:
     """Get all known tickers."""
     rows = conn.execute("SELECT ticker FROM companies ORDER BY ticker").fetchall()
@@ -295,12 +1062,12 @@ def get_all_tickers(conn: sqlite3.Connection) -> List[str]:
 
 
 def get_latest_financials(conn: sqlite3.Connection, ticker: str) -> Dict:
-    """Get the most recent financial data for a ticker, merged from all sources."""
+    """Get the most recent financial data for a ticker, merged from all sources (one snapshot row per source)."""
     result = {}
 
     # Latest income statement
     row = conn.execute(
-        "SELECT * FROM income_statements WHERE ticker = ? AND period = 'annual' ORDER BY period_end DESC LIMIT 1",
+        "SELECT * FROM latest_income_statements WHERE ticker = ? AND period = 'annual' ORDER BY period_end DESC LIMIT 1",
         (ticker,)
     ).fetchone()
     if row:
@@ -308,7 +1075,7 @@ def get_latest_financials(conn: sqlite3.Connection, ticker: str) -> Dict:
 
     # Latest balance sheet
     row = conn.execute(
-        "SELECT * FROM balance_sheets WHERE ticker = ? AND period = 'annual' ORDER BY period_end DESC LIMIT 1",
+        "SELECT * FROM latest_balance_sheets WHERE ticker = ? AND period = 'annual' ORDER BY period_end DESC LIMIT 1",
         (ticker,)
     ).fetchone()
     if row:
@@ -316,7 +1083,7 @@ def get_latest_financials(conn: sqlite3.Connection, ticker: str) -> Dict:
 
     # Latest market data
     row = conn.execute(
-        "SELECT * FROM market_data WHERE ticker = ? ORDER BY date DESC LIMIT 1",
+        "SELECT * FROM latest_market_data WHERE ticker = ? ORDER BY date DESC LIMIT 1",
         (ticker,)
     ).fetchone()
     if row:
@@ -330,13 +1097,17 @@ def get_latest_financials(conn: sqlite3.Connection, ticker: str) -> Dict:
     return result
 
 
-def get_all_eva_results(conn: sqlite3.Connection) -> List[Dict]:
-    """Get all EVA results for the latest calculation date."""
+def get_latest_eva_result_per_ticker(conn: sqlite3.Connection) -> Dict[str, Dict]:
+    """Newest eva_results row of every ticker, by ticker."""
     rows = conn.execute("""
-        SELECT e.*, c.name, c.sector
-        FROM eva_results e
-        LEFT JOIN companies c ON e.ticker = c.ticker
-        WHERE e.calculation_date = (SELECT MAX(calculation_date) FROM eva_results)
-        ORDER BY e.eva DESC
+        SELECT e.* FROM eva_results e
+        JOIN (SELECT ticker, MAX(calculation_date) AS calculation_date FROM eva_results GROUP BY ticker) m
+          ON e.ticker = m.ticker AND e.calculation_date = m.calculation_date
     """).fetchall()
+    return {r["ticker"]: dict(r) for r in rows}
+
+
+def get_all_eva_results(conn: sqlite3.Connection) -> List[Dict]:
+    """Get all EVA results for the latest calculation date."""
+    rows = conn.execute(LATEST_EVA_RESULTS_SQL).fetchall()
     return [dict(r) for r in rows]
@@ -0,0 +1,223 @@
+"""
+EGX EVA Analyzer — Database Writer
+One background thread owns a dedicated write connection and applies the
+statements collectors hand it in grouped transactions, committing every
+WRITER_BATCH_ROWS rows or WRITER_FLUSH_SECONDS, whichever comes first.
+
+It accepts the same execute / executemany / commit calls the database.py
+helpers make, so `db.upsert_income_statement(writer, row)` queues the row
+instead of writing and committing it on the spot. commit() is a no-op —
+transaction boundaries belong to the writer — and flush() is the explicit
+"everything so far is on disk" point at the end of a stage.
+
+Each statement runs in its own SAVEPOINT: one that fails is rolled back
+whole, the rest of the batch still commits, and the next flush() raises
+DatabaseWriterError so the stage knows some of its writes were dropped.
+Statements issued inside `with writer.atomic():` share one savepoint, so
+a page's rows and the bookkeeping that says it was processed (collection
+log, HTTP validators, cache entry) are committed together or not at all.
+"""
+
+import time
+import queue
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
+
+from config import WRITER_BATCH_ROWS, WRITER_FLUSH_SECONDS
+import database as db
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseWriterError(RuntimeError):
+    """Statements the writer rolled back since the previous flush()."""
+
+
+class DatabaseWriter:
+    """Queue-fed single writer. Thread-safe: any number of producer threads may share one."""
+
+    def __init__(self, batch_rows: int = WRITER_BATCH_ROWS, flush_seconds: float = WRITER_FLUSH_SECONDS):
+        self.batch_rows = max(1, batch_rows)
+        self.flush_seconds = flush_seconds
+        self.rows_written = 0
+        self.transactions = 0
+        self.failures = 0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._error = None
+        self._failed = []
+        self._failed_lock = threading.Lock()
+        self._local = threading.local()   # .statements: the open atomic() block of this thread
+        # Opened here so a locked or unwritable database fails the caller, not the thread
+        self._conn = db.get_connection(check_same_thread=False)
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    # ── connection-like interface used by the database.py helpers ──
+
+    def execute(self, sql: str, params=()):
+        self._queue_rows(sql, [params])
+
+    def executemany(self, sql: str, seq_of_params):
+        self._queue_rows(sql, list(seq_of_params))
+
+    def commit(self):
+        """No-op: the writer thread decides when to commit."""
+
+    @contextmanager
+    def atomic(self):
+        """
+        Queue the statements this thread issues inside the block as one op,
+        applied all-or-nothing. Nothing is queued if the block raises.
+        """
+        if getattr(self._local, "statements", None) is not None:   # nested: part of the outer block
+            yield
+            return
+        self._local.statements = []
+        try:
+            yield
+            statements = self._local.statements
+        finally:
+            self._local.statements = None
+        if statements:
+            self._put(("rows", statements))
+
+    # ── stage control ──
+
+    def flush(self):
+        """
+        Block until everything queued so far is committed. Raises DatabaseWriterError
+        if any statement since the previous flush failed and was rolled back.
+        """
+        done = threading.Event()
+        self._put(("flush", done))
+        while not done.wait(0.5):
+            self._check_alive()
+        with self._failed_lock:
+            failed, self._failed = self._failed, []
+        if failed:
+            raise DatabaseWriterError(f"{len(failed)} write(s) rolled back, first: {failed[0]}")
+
+    def close(self):
+        """Flush, stop the writer thread and close its connection."""
+        if self._closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self._closed = True
+            if self._thread.is_alive():
+                self._queue.put(("stop",))
+                self._thread.join()
+        logger.info(f"DB writer: {self.rows_written} rows in {self.transactions} transactions"
+                    + (f", {self.failures} failed statements" if self.failures else ""))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _put(self, op):
+        if self._closed:
+            raise RuntimeError("DatabaseWriter is closed")
+        self._check_alive()
+        self._queue.put(op)
+
+    def _queue_rows(self, sql: str, rows):
+        statements = getattr(self._local, "statements", None)
+        if statements is not None:
+            statements.append((sql, rows))
+        else:
+            self._put(("rows", [(sql, rows)]))
+
+    def _check_alive(self):
+        if not self._thread.is_alive():
+            raise RuntimeError(f"DatabaseWriter thread stopped: {self._error}") from self._error
+
+    def _fail(self, message: str):
+        self.failures += 1
+        logger.error(f"DB writer: {message}")
+        with self._failed_lock:
+            self._failed.append(message)
+
+    # ── writer thread ──
+
+    def _run(self):
+        conn = self._conn
+        pending = 0
+        deadline = None
+
+        def commit():
+            nonlocal pending, deadline
+            if conn.in_transaction:
+                try:
+                    conn.commit()
+                    self.rows_written += pending
+                    self.transactions += 1
+                except sqlite3.Error as e:
+                    self._fail(f"commit of {pending} rows failed - {e}")
+                    conn.rollback()
+            pending, deadline = 0, None
+
+        def apply(statements):
+            """Run one op's statements inside a savepoint, so a failure leaves none of its rows behind."""
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            conn.execute("SAVEPOINT op")
+            try:
+                for sql, rows in statements:
+                    conn.executemany(sql, rows)
+            except Exception:
+                conn.execute("ROLLBACK TO op")
+                raise
+            finally:
+                conn.execute("RELEASE op")
+
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    op = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    commit()
+                    continue
+
+                kind = op[0]
+                if kind == "rows":
+                    _, statements = op
+                    try:
+                        apply(statements)
+                    except Exception as e:  # a bad row must not take the writer thread down
+                        self._fail(f"statement failed - {e}")
+                        if not pending:   # nothing else in the transaction — release the write lock now
+                            conn.rollback()
+                        continue
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_seconds
+                    pending += sum(len(rows) for _, rows in statements)
+                    if pending >= self.batch_rows:
+                        commit()
+                elif kind == "flush":
+                    commit()
+                    op[1].set()
+                elif kind == "stop":
+                    commit()
+                    return
+        except BaseException as e:
+            self._error = e
+            logger.error(f"DB writer: thread stopped - {e}")
+        finally:
+            conn.close()
+
+
+def atomic(target):
+    """target.atomic() for a DatabaseWriter; a plain connection already commits each helper call."""
+    return target.atomic() if isinstance(target, DatabaseWriter) else nullcontext()
+
+
+def write_target(conn, writer=None):
+    """Where database.py helpers should write: the DatabaseWriter if there is one, else straight to conn."""
+    return writer if writer is not None else conn
@@ -12,14 +12,15 @@ import logging
 from datetime import datetime
 from typing import Dict, List, Optional
 
-import requests
 from bs4 import BeautifulSoup
 
 from config import (
-    EGX_LISTED_STOCKS_URL, USER_AGENTS,
-    REQUEST_TIMEOUT, REQUEST_DELAY_MIN, REQUEST_DELAY_MAX
+    EGX_LISTED_STOCKS_URL, EGX_MARKET_INDICATORS_URL, USER_AGENTS
 )
 import database as db
+from db_writer import write_target
+from http_client import Fetcher
+from response_cache import ResponseCache
 
 logger = logging.getLogger(__name__)
 
@@ -29,15 +30,23 @@ class EGXOfficialCollector:
 
     SOURCE = "egx_official"
 
-    def __init__(self, conn):
+    def __init__(self, conn, max_workers: int = 1, use_cache: bool = True, cache_ttl_hours: float = 24,
+                 writer=None, freshness: Optional[Dict[str, float]] = None):
         self.conn = conn
-        self.session = requests.Session()
-        self.session.headers.update({
+        self.freshness = freshness
+        self.writer = write_target(conn, writer)
+        self.cache = ResponseCache(conn, self.SOURCE, enabled=use_cache, default_ttl_hours=cache_ttl_hours,
+                                   writer=self.writer)
+        self.http = Fetcher("EGX", {
             "User-Agent": random.choice(USER_AGENTS),
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
             "Accept-Language": "en-US,en;q=0.9",
             "Referer": "https://www.egx.com.eg/en/homepage.aspx",
-        })
+        }, max_in_flight=max_workers, cache=self.cache)
+
+    def _get(self, url: str) -> Optional[BeautifulSoup]:
+        """Make a GET request and return parsed HTML."""
+        return _soup(self.http.get(url))
 
     def discover_all_listed_stocks(self) -> List[Dict]:
         """
@@ -48,14 +57,16 @@ class EGXOfficialCollector:
         This method handles the initial page load and attempts to get
         as many stocks as possible.
         """
-        discovered = []
         logger.info(f"  [EGX] Fetching listed stocks from {EGX_LISTED_STOCKS_URL}")
+        return self._parse_listed_stocks(self._get(EGX_LISTED_STOCKS_URL))
 
-        try:
-            resp = self.session.get(EGX_LISTED_STOCKS_URL, timeout=REQUEST_TIMEOUT)
-            resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "lxml")
+    def _parse_listed_stocks(self, soup: Optional[BeautifulSoup]) -> List[Dict]:
+        """Extract and store every listed stock from a fetched ListedStocks page."""
+        discovered = []
 
+        if soup is None:
+            logger.error("  [EGX] Failed to fetch listed stocks")
+        else:
             # The EGX listed stocks page has a table with stock information
             # Look for the main data table
             tables = soup.find_all("table")
@@ -121,9 +132,6 @@ class EGXOfficialCollector:
                             "isin": "",
                         })
 
-        except requests.RequestException as e:
-            logger.error(f"  [EGX] Failed to fetch listed stocks: {e}")
-
         # Deduplicate
         seen = set()
         unique = []
@@ -135,14 +143,10 @@ class EGXOfficialCollector:
         logger.info(f"  [EGX] Discovered {len(unique)} stocks from official website")
 
         # Store all in database
-        for stock in unique:
-            db.upsert_company(
-                self.conn,
-                ticker=stock["ticker"],
-                name=stock["name"],
-                isin=stock.get("isin", ""),
-                source=self.SOURCE,
-            )
+        db.upsert_company_many(self.writer, [
+            {"ticker": stock["ticker"], "name": stock["name"], "isin": stock.get("isin", ""), "source": self.SOURCE}
+            for stock in unique
+        ])
 
         return unique
 
@@ -151,13 +155,16 @@ class EGXOfficialCollector:
         Scrape market-level indicators from EGX.
         These can be used for market-wide analysis.
         """
+        return self._parse_market_indicators(self._get(EGX_MARKET_INDICATORS_URL))
+
+    def _parse_market_indicators(self, soup: Optional[BeautifulSoup]) -> Dict:
+        """Extract market-level indicators from a fetched MarketIndicator page."""
         indicators = {}
-        try:
-            url = "https://www.egx.com.eg/en/MarketIndicator.aspx"
-            resp = self.session.get(url, timeout=REQUEST_TIMEOUT)
-            resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "lxml")
+        if soup is None:
+            logger.warning("  [EGX] Failed to scrape market indicators: page not available")
+            return indicators
 
+        try:
             # Extract market indicators from tables
             tables = soup.find_all("table")
             for table in tables:
@@ -180,16 +187,37 @@ class EGXOfficialCollector:
 
     def collect_all(self, tickers=None) -> List[Dict]:
         """Discover all stocks and collect basic data."""
+        if not db.stale_tickers(self.conn, ["ALL"], self.SOURCE, "metadata", self.freshness):
+            logger.info("  [EGX] Listing fresh, skipped")
+            return []
         start = time.time()
-        discovered = self.discover_all_listed_stocks()
-
-        time.sleep(random.uniform(REQUEST_DELAY_MIN, REQUEST_DELAY_MAX))
-
-        indicators = self.scrape_market_indicators()
+        if self.http.concurrent:
+            # Both pages live on the same host — fetch them together and parse each as it lands
+            logger.info(f"  [EGX] Fetching listed stocks from {EGX_LISTED_STOCKS_URL}")
+            parsers = {
+                EGX_LISTED_STOCKS_URL: self._parse_listed_stocks,
+                EGX_MARKET_INDICATORS_URL: self._parse_market_indicators,
+            }
+            parsed = {}
+
+            def on_response(url: str, html: Optional[str], elapsed: float):
+                parsed[url] = parsers[url](_soup(html))
+
+            self.http.fetch_many(parsers, on_response)
+            discovered = parsed[EGX_LISTED_STOCKS_URL]
+            indicators = parsed[EGX_MARKET_INDICATORS_URL]
+        else:
+            discovered = self.discover_all_listed_stocks()
+            indicators = self.scrape_market_indicators()
 
         duration = time.time() - start
-        db.log_collection(self.conn, "ALL", self.SOURCE, "success",
-                         len(discovered), None, duration)
+        db.log_collection(self.writer, "ALL", self.SOURCE, "success" if discovered else "failed",
+                         len(discovered), None, duration, data_class="metadata")
 
         return [{"ticker": d["ticker"], "source": self.SOURCE, "records": 1, "errors": []}
                 for d in discovered]
+
+
+def _soup(html: Optional[str]) -> Optional[BeautifulSoup]:
+    """Parse an HTML body, passing None through."""
+    return BeautifulSoup(html, "lxml") if html is not None else None
@@ -4,25 +4,207 @@ Computes Economic Value Added for all stocks using collected financial data.
 Includes data quality scoring and multi-source data merging.
 """
 
+import hashlib
 import logging
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 
+import numpy as np
+import pandas as pd
+
 from config import (
     RISK_FREE_RATE, EQUITY_RISK_PREMIUM, COST_OF_DEBT_PRETAX,
     CORPORATE_TAX_RATE, DEFAULT_BETA,
     UNDERVALUED_THRESHOLD, OVERVALUED_THRESHOLD,
 )
 import database as db
+from db_writer import write_target
 
 logger = logging.getLogger(__name__)
 
+# Bump when the EVA maths change, so stored results are not carried forward
+MODEL_VERSION = 1
+
+# Everything besides the merged inputs that a result depends on (eva_arrays() keywords)
+MODEL_PARAMETERS = {
+    "risk_free_rate": RISK_FREE_RATE,
+    "equity_risk_premium": EQUITY_RISK_PREMIUM,
+    "cost_of_debt_pretax": COST_OF_DEBT_PRETAX,
+    "tax_rate": CORPORATE_TAX_RATE,
+    "default_beta": DEFAULT_BETA,
+    "undervalued_threshold": UNDERVALUED_THRESHOLD,
+    "overvalued_threshold": OVERVALUED_THRESHOLD,
+}
+
+# Merged input fields (see EVAEngine._merge_financials). total_liabilities and
+# pretax_income are read when an input set carries them.
+INPUT_FIELDS = [
+    "revenue", "ebit", "ebitda", "net_income", "interest_expense", "tax_expense",
+    "total_assets", "current_assets", "current_liabilities", "total_debt", "total_equity",
+    "long_term_debt", "cash_and_equivalents", "close_price", "market_cap", "shares_outstanding",
+    "beta", "pe_ratio", "dividend_yield", "total_liabilities", "pretax_income",
+]
+
+# eva_arrays() signal codes
+SIGNALS = ("INSUFFICIENT DATA", "UNDERVALUED", "FAIR VALUE", "OVERVALUED")
+
+_QUALITY_WEIGHTS = (
+    (3, ["ebit", "total_assets", "current_liabilities", "total_equity",
+         "total_debt", "market_cap", "shares_outstanding"]),
+    (2, ["revenue", "net_income", "close_price", "beta"]),
+    (1, ["interest_expense", "tax_expense", "ebitda", "cash_and_equivalents"]),
+)
+
+
+# Field-wise merge priority (first source with a value wins) and the fields taken from each table
+SOURCE_PRIORITY = ["yahoo_finance", "stockanalysis", "mubasher", "egx_official"]
+MERGE_FIELDS = {
+    "income_statements": ["revenue", "ebit", "ebitda", "net_income", "interest_expense", "tax_expense"],
+    "balance_sheets": ["total_assets", "current_assets", "current_liabilities",
+                       "total_debt", "total_equity", "long_term_debt", "cash_and_equivalents"],
+    "market_data": ["close_price", "market_cap", "shares_outstanding", "beta", "pe_ratio", "dividend_yield"],
+}
+
+# eva_results columns of a result dict, in calculate_eva's order
+RESULT_FIELDS = [
+    "ticker", "calculation_date", "nopat", "invested_capital", "wacc", "cost_of_equity",
+    "cost_of_debt_after_tax", "equity_weight", "debt_weight", "eva", "eva_spread", "roic",
+    "capital_charge", "eva_per_share", "intrinsic_value", "market_cap", "intrinsic_premium",
+    "signal", "data_quality_score",
+]
+
+_RESULT_ROUNDING = (
+    ("nopat", 2), ("invested_capital", 2), ("wacc", 6), ("cost_of_equity", 6),
+    ("cost_of_debt_after_tax", 6), ("equity_weight", 4), ("debt_weight", 4), ("eva", 2),
+    ("eva_spread", 6), ("roic", 6), ("capital_charge", 2), ("eva_per_share", 2), ("intrinsic_value", 2),
+)
+
+
+def _known(x: np.ndarray) -> np.ndarray:
+    """`x is not None` for NaN-coded inputs."""
+    return ~np.isnan(x)
+
+
+def _truthy(x: np.ndarray) -> np.ndarray:
+    """Python truthiness (`if x`, `x or default`) for NaN-coded inputs."""
+    return ~np.isnan(x) & (x != 0)
+
+
+def eva_arrays(data: Dict[str, np.ndarray],
+               risk_free_rate=RISK_FREE_RATE, equity_risk_premium=EQUITY_RISK_PREMIUM,
+               cost_of_debt_pretax=COST_OF_DEBT_PRETAX, tax_rate=CORPORATE_TAX_RATE,
+               default_beta=DEFAULT_BETA, undervalued_threshold=UNDERVALUED_THRESHOLD,
+               overvalued_threshold=OVERVALUED_THRESHOLD) -> Dict[str, np.ndarray]:
+    """
+    EVAEngine.calculate_eva as whole-array operations over float64 input
+    columns (NaN = unknown). Parameters may be scalars or arrays that broadcast
+    against the inputs. Returns unrounded outputs plus `valid` (a result would
+    be produced), the skip reasons and `signal` as an index into SIGNALS.
+    """
+    nan = np.full(np.shape(data["ebit"]), np.nan)
+    x = {f: np.asarray(data.get(f, nan), dtype=np.float64) for f in INPUT_FIELDS}
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # _estimate_missing
+        interest = np.where(_truthy(x["interest_expense"]), x["interest_expense"], 0.0)
+        ebit = np.where(~_known(x["ebit"]) & _known(x["net_income"]),
+                        x["net_income"] / (1 - tax_rate) + np.abs(interest), x["ebit"])
+        total_debt = np.where(~_known(x["total_debt"]) & _known(x["long_term_debt"]),
+                              x["long_term_debt"] * 1.2, x["total_debt"])
+        close = x["close_price"]
+        shares = np.where(~_known(x["shares_outstanding"]) & _truthy(x["market_cap"]) & _truthy(close),
+                          x["market_cap"] / close, x["shares_outstanding"])
+        market_cap = np.where(~_known(x["market_cap"]) & _truthy(shares) & _truthy(close),
+                              shares * close, x["market_cap"])
+        beta = np.where(_known(x["beta"]), x["beta"], default_beta)
+        estimated = dict(x, ebit=ebit, total_debt=total_debt, shares_outstanding=shares,
+                         market_cap=market_cap, beta=beta)
+
+        # _compute_data_quality (beta is always known by now)
+        score = sum(weight * sum(_known(estimated[f]).astype(np.int64) for f in fields)
+                    for weight, fields in _QUALITY_WEIGHTS)
+        quality = score / sum(weight * len(fields) for weight, fields in _QUALITY_WEIGHTS)
+
+        missing_ebit = ~_known(ebit)
+        missing_balance = ~missing_ebit & ~(_known(x["total_assets"]) & _known(x["current_liabilities"]))
+
+        total_equity = np.where(~_known(x["total_equity"]) & _truthy(x["total_assets"])
+                                & _truthy(x["total_liabilities"]),
+                                x["total_assets"] - x["total_liabilities"], x["total_equity"])
+        total_debt = np.where(_known(total_debt), total_debt, 0.0)
+
+        # NOPAT
+        actual_rate = np.abs(x["tax_expense"]) / np.abs(x["pretax_income"])
+        use_actual = _known(x["tax_expense"]) & _truthy(x["pretax_income"]) & (0.05 < actual_rate) & (actual_rate < 0.5)
+        effective_tax_rate = np.where(use_actual, actual_rate, tax_rate)
+        nopat = ebit * (1 - effective_tax_rate)
+
+        invested_capital = x["total_assets"] - x["current_liabilities"]
+        negative_capital = ~missing_ebit & ~missing_balance & ~(invested_capital > 0)
+        valid = ~(missing_ebit | missing_balance | negative_capital)
+
+        # Capital structure and WACC
+        equity = np.maximum(np.where(_truthy(total_equity), total_equity, 0.0), 1.0)
+        debt = np.maximum(np.where(_truthy(total_debt), total_debt, 0.0), 0.0)
+        total_capital = equity + debt
+        equity_weight = equity / total_capital
+        debt_weight = debt / total_capital
+
+        cost_of_equity = risk_free_rate + np.where(_truthy(beta), beta, default_beta) * equity_risk_premium
+        implied_cost = np.abs(x["interest_expense"]) / debt
+        use_implied = _truthy(x["interest_expense"]) & (debt > 0) & (0.05 < implied_cost) & (implied_cost < 0.5)
+        cost_of_debt_after_tax = np.where(use_implied, implied_cost * (1 - tax_rate),
+                                          cost_of_debt_pretax * (1 - tax_rate))
+        wacc = (equity_weight * cost_of_equity) + (debt_weight * cost_of_debt_after_tax)
+
+        # EVA, spread, per-share and intrinsic value
+        capital_charge = wacc * invested_capital
+        eva = nopat - capital_charge
+        roic = np.where(invested_capital > 0, nopat / invested_capital, 0.0)
+        eva_spread = roic - wacc
+        per_share = np.where(_truthy(shares), shares, 1.0)
+        eva_per_share = eva / per_share
+        intrinsic_value = np.where(wacc > 0, invested_capital + (eva / wacc), invested_capital)
+        market_cap = np.where(_truthy(market_cap), market_cap,
+                              np.where(_truthy(close), close * per_share, np.nan))
+
+        priced = _truthy(market_cap) & (market_cap > 0)
+        intrinsic_premium = np.where(priced, (intrinsic_value - market_cap) / market_cap, np.nan)
+        signal = np.select([~priced, intrinsic_premium > undervalued_threshold,
+                            intrinsic_premium < overvalued_threshold], [0, 1, 3], default=2)
+
+    return {
+        "valid": valid, "missing_ebit": missing_ebit, "missing_balance": missing_balance,
+        "negative_capital": negative_capital, "data_quality_score": quality,
+        "nopat": nopat, "invested_capital": invested_capital, "wacc": wacc,
+        "cost_of_equity": cost_of_equity, "cost_of_debt_after_tax": cost_of_debt_after_tax,
+        "equity_weight": equity_weight, "debt_weight": debt_weight, "eva": eva, "eva_spread": eva_spread,
+        "roic": roic, "capital_charge": capital_charge, "eva_per_share": eva_per_share,
+        "intrinsic_value": intrinsic_value, "market_cap": market_cap,
+        "intrinsic_premium": intrinsic_premium, "signal": signal,
+    }
+
+
+def input_frame(inputs: List[Dict]) -> pd.DataFrame:
+    """Merged input dicts as one float64 column per INPUT_FIELDS entry (None → NaN), plus ticker."""
+    frame = pd.DataFrame.from_records(inputs, columns=["ticker"] + INPUT_FIELDS)
+    frame[INPUT_FIELDS] = frame[INPUT_FIELDS].astype(np.float64)
+    return frame
+
+
+def input_fingerprints(inputs: pd.DataFrame, parameters: Dict = MODEL_PARAMETERS) -> List[str]:
+    """Per input row: a hash of its INPUT_FIELDS values, the model parameters and MODEL_VERSION."""
+    salt = repr((MODEL_VERSION, sorted(parameters.items()))).encode()
+    values = np.ascontiguousarray(inputs[INPUT_FIELDS].to_numpy(np.float64))
+    return [hashlib.blake2b(salt + row.tobytes(), digest_size=16).hexdigest() for row in values]
+
 
 class EVAEngine:
     """Computes EVA analysis from collected financial data."""
 
-    def __init__(self, conn):
+    def __init__(self, conn, writer=None):
         self.conn = conn
+        self.writer = write_target(conn, writer)
 
     def _merge_financials(self, ticker: str) -> Dict:
         """
@@ -34,77 +216,31 @@ class EVAEngine:
 
         Uses the most recent and complete data available.
         """
-        merged = {
-            "ticker": ticker,
-            "revenue": None,
-            "ebit": None,
-            "ebitda": None,
-            "net_income": None,
-            "interest_expense": None,
-            "tax_expense": None,
-            "total_assets": None,
-            "current_assets": None,
-            "current_liabilities": None,
-            "total_debt": None,
-            "total_equity": None,
-            "long_term_debt": None,
-            "cash_and_equivalents": None,
-            "close_price": None,
-            "market_cap": None,
-            "shares_outstanding": None,
-            "beta": None,
-            "pe_ratio": None,
-            "dividend_yield": None,
-        }
-
-        source_priority = ["yahoo_finance", "stockanalysis", "mubasher", "egx_official"]
-
-        # ── Merge Income Statement ──
-        for source in source_priority:
-            row = self.conn.execute(
-                """SELECT * FROM income_statements
-                   WHERE ticker = ? AND source = ? AND period = 'annual'
-                   ORDER BY period_end DESC LIMIT 1""",
-                (ticker, source)
-            ).fetchone()
-            if row:
-                row = dict(row)
-                for field in ["revenue", "ebit", "ebitda", "net_income", "interest_expense", "tax_expense"]:
-                    if merged[field] is None and row.get(field) is not None:
-                        merged[field] = row[field]
-
-        # ── Merge Balance Sheet ──
-        for source in source_priority:
-            row = self.conn.execute(
-                """SELECT * FROM balance_sheets
-                   WHERE ticker = ? AND source = ? AND period = 'annual'
-                   ORDER BY period_end DESC LIMIT 1""",
-                (ticker, source)
-            ).fetchone()
-            if row:
-                row = dict(row)
-                for field in ["total_assets", "current_assets", "current_liabilities",
-                              "total_debt", "total_equity", "long_term_debt", "cash_and_equivalents"]:
-                    if merged[field] is None and row.get(field) is not None:
-                        merged[field] = row[field]
-
-        # ── Merge Market Data ──
-        for source in source_priority:
-            row = self.conn.execute(
-                """SELECT * FROM market_data
-                   WHERE ticker = ? AND source = ?
-                   ORDER BY date DESC LIMIT 1""",
-                (ticker, source)
-            ).fetchone()
-            if row:
-                row = dict(row)
-                for field in ["close_price", "market_cap", "shares_outstanding", "beta",
-                              "pe_ratio", "dividend_yield"]:
-                    if merged[field] is None and row.get(field) is not None:
-                        merged[field] = row[field]
-
+        merged = {"ticker": ticker}
+        for table, fields in MERGE_FIELDS.items():
+            merged.update(dict.fromkeys(fields))
+            sql = db.LATEST_MARKET_DATA_SQL if table == "market_data" else db.LATEST_STATEMENT_SQL.format(table=table)
+            for source in SOURCE_PRIORITY:
+                row = self.conn.execute(sql, (ticker, source)).fetchone()
+                if row:
+                    for field in fields:
+                        if merged[field] is None and row[field] is not None:
+                            merged[field] = row[field]
         return merged
 
+    def merged_frame(self, tickers: List[str] = None) -> pd.DataFrame:
+        """
+        _merge_financials for every ticker at once: one merged_latest_sql
+        statement per table instead of tables × sources queries per ticker.
+        Same columns as input_frame().
+        """
+        frame = pd.DataFrame({"ticker": pd.Series(tickers or db.get_all_tickers(self.conn), dtype=object)})
+        for table, fields in MERGE_FIELDS.items():
+            rows = self.conn.execute(db.merged_latest_sql(table, tuple(fields), tuple(SOURCE_PRIORITY))).fetchall()
+            part = pd.DataFrame.from_records([tuple(r) for r in rows], columns=["ticker"] + fields)
+            frame = frame.merge(part, on="ticker", how="left")
+        return frame.reindex(columns=["ticker"] + INPUT_FIELDS).astype(dict.fromkeys(INPUT_FIELDS, np.float64))
+
     def _compute_data_quality(self, data: Dict) -> float:
         """
         Score data quality from 0.0 to 1.0 based on completeness.
@@ -166,7 +302,7 @@ class EVAEngine:
 
         return data
 
-    def calculate_eva(self, ticker: str) -> Optional[Dict]:
+    def calculate_eva(self, ticker: str, save: bool = True) -> Optional[Dict]:
         """
         Calculate EVA for a single stock.
 
@@ -177,6 +313,8 @@ class EVAEngine:
           Invested Capital = Total Assets - Current Liabilities
           WACC = (E/V × Ke) + (D/V × Kd × (1-T))
           Ke = Rf + β × (Rm - Rf)  ← CAPM
+
+        With save=False the result is only returned; run_all() writes the whole batch at once.
         """
         # Get merged financial data
         data = self._merge_financials(ticker)
@@ -292,11 +430,54 @@ class EVAEngine:
             "data_quality_score": quality,
         }
 
-        db.upsert_eva_result(self.conn, result)
+        if save:
+            db.upsert_eva_result(self.writer, result)
         return result
 
-    def run_all(self, tickers: List[str] = None) -> List[Dict]:
-        """Run EVA calculation for all tickers."""
+    def merged_inputs(self, tickers: List[str] = None) -> List[Dict]:
+        """Merged financial inputs per ticker (the dataset calculate_eva works from), None for unknown."""
+        frame = self.merged_frame(tickers).astype(object)
+        return frame.where(frame.notna(), None).to_dict("records")
+
+    def calculate_batch(self, inputs: pd.DataFrame, calculation_date: str = None,
+                        parameters: Dict = MODEL_PARAMETERS) -> List[Dict]:
+        """
+        calculate_eva over a whole input frame (see input_frame()) at once:
+        one eva_arrays() pass, then the same rounding and result dicts as the
+        scalar path. Rows that cannot be computed are logged and left out.
+        """
+        calculation_date = calculation_date or datetime.now().strftime("%Y-%m-%d")
+        out = eva_arrays({f: inputs[f].to_numpy(np.float64) for f in INPUT_FIELDS if f in inputs}, **parameters)
+        tickers = inputs["ticker"].to_numpy(dtype=object)
+
+        for i in np.flatnonzero(~out["valid"]).tolist():
+            if out["missing_ebit"][i]:
+                logger.warning(f"  {tickers[i]}: Cannot compute EVA — missing EBIT")
+            elif out["missing_balance"][i]:
+                logger.warning(f"  {tickers[i]}: Cannot compute EVA — missing balance sheet data")
+            else:
+                logger.warning(f"  {tickers[i]}: Negative invested capital — skipping")
+
+        # Rounded column by column on Python floats, so round() is the scalar path's, not numpy's
+        valid = np.flatnonzero(out["valid"])
+        n = len(valid)
+        columns = {"ticker": tickers[valid].tolist(), "calculation_date": [calculation_date] * n}
+        for name, digits in _RESULT_ROUNDING:
+            columns[name] = [round(v, digits) for v in out[name][valid].tolist()]
+        columns["market_cap"] = [round(v, 2) if v == v and v else None
+                                 for v in out["market_cap"][valid].tolist()]
+        columns["intrinsic_premium"] = [round(v, 4) if v == v else None
+                                        for v in out["intrinsic_premium"][valid].tolist()]
+        columns["signal"] = [SIGNALS[code] for code in out["signal"][valid].tolist()]
+        columns["data_quality_score"] = [round(v, 3) for v in out["data_quality_score"][valid].tolist()]
+        return [dict(zip(RESULT_FIELDS, row)) for row in zip(*(columns[f] for f in RESULT_FIELDS))]
+
+    def run_all(self, tickers: List[str] = None, incremental: bool = True) -> List[Dict]:
+        """
+        Run EVA calculation for all tickers. With incremental=True a ticker whose
+        input fingerprint matches its newest stored result is not recomputed:
+        that result is carried forward to today's calculation_date.
+        """
         if not tickers:
             tickers = db.get_all_tickers(self.conn)
 
@@ -304,10 +485,7 @@ class EVAEngine:
             logger.warning("No tickers found in database. Run data collection first.")
             return []
 
-        results = []
         total = len(tickers)
-        computed = 0
-        skipped = 0
 
         logger.info(f"\n{'='*60}")
         logger.info(f"EVA ENGINE — Computing for {total} stocks")
@@ -315,18 +493,30 @@ class EVAEngine:
         logger.info(f"Parameters: Rf={RISK_FREE_RATE:.1%}, ERP={EQUITY_RISK_PREMIUM:.1%}, "
                     f"Kd={COST_OF_DEBT_PRETAX:.1%}, T={CORPORATE_TAX_RATE:.1%}")
 
-        for ticker in tickers:
-            result = self.calculate_eva(ticker)
-            if result:
-                results.append(result)
-                computed += 1
-                signal = result["signal"]
-                eva = result["eva"]
-                logger.info(f"  {ticker}: EVA={eva:,.0f} | ROIC={result['roic']:.1%} | "
-                           f"WACC={result['wacc']:.1%} | Signal={signal} | "
-                           f"Quality={result['data_quality_score']:.0%}")
-            else:
-                skipped += 1
+        today = datetime.now().strftime("%Y-%m-%d")
+        inputs = self.merged_frame(tickers)
+        fingerprints = dict(zip(inputs["ticker"], input_fingerprints(inputs)))
+        previous = db.get_latest_eva_result_per_ticker(self.conn) if incremental else {}
+        unchanged = inputs["ticker"].map(
+            lambda t: t in previous and previous[t]["input_fingerprint"] == fingerprints[t]).to_numpy(bool)
+
+        recomputed = self.calculate_batch(inputs[~unchanged], calculation_date=today)
+        for result in recomputed:
+            result["input_fingerprint"] = fingerprints[result["ticker"]]
+            logger.info(f"  {result['ticker']}: EVA={result['eva']:,.0f} | ROIC={result['roic']:.1%} | "
+                        f"WACC={result['wacc']:.1%} | Signal={result['signal']} | "
+                        f"Quality={result['data_quality_score']:.0%}")
+        carried = [previous[t] for t in inputs["ticker"][unchanged]]
+        stale = [dict(r, calculation_date=today) for r in carried if r["calculation_date"] != today]
+
+        # Stored results from earlier today are already current; nothing to write for them
+        db.upsert_eva_result_many(self.writer, recomputed + stale)
+        by_ticker = {r["ticker"]: r for r in carried}
+        by_ticker.update({r["ticker"]: r for r in stale + recomputed})
+        results = [by_ticker[t] for t in inputs["ticker"] if t in by_ticker]
+        computed = len(results)
+        skipped = total - computed
+        logger.info(f"Recomputed: {len(recomputed)} | Carried forward (inputs unchanged): {len(carried)}")
 
         # Summary
         logger.info(f"\n{'='*60}")
@@ -0,0 +1,248 @@
+"""
+EGX EVA Analyzer — HTML Extraction
+Targeted lxml/XPath extraction for the scraped stock and financials pages.
+
+The collectors used to build a full BeautifulSoup tree per page and run broad
+CSS selectors over it. These functions parse once with lxml (C, no Python
+object per node) and only walk the regions they read, returning the same
+field values the BeautifulSoup code produced. Element text follows
+BeautifulSoup's get_text(strip=True): stripped text nodes joined, with
+script/style content and comments left out.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import lxml.html
+from lxml import etree
+
+
+def _has_class(name: str) -> str:
+    """XPath predicate equivalent to the CSS class selector `.name`."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def _first(expr: str) -> etree.XPath:
+    """Compiled XPath returning the first match in document order (like select_one)."""
+    return etree.XPath(f"({expr})[1]")
+
+
+# ── Mubasher stock page ──
+_MUBASHER_PRICE = [   # tried in order, as the CSS selectors they replace
+    _first(f"//*[{_has_class('stockPageContent')}]//*[{_has_class('price')}]"),
+    _first(f"//*[{_has_class('stock-price')}]"),
+    _first("//*[contains(@class, 'price')]"),
+    _first(f"//*[{_has_class('last-price')}]"),
+]
+_MUBASHER_KEY_STATS = etree.XPath(
+    "//*[contains(@class, 'key-stat') or contains(@class, 'info-item') or contains(@class, 'stock-info')]"
+)
+_MUBASHER_NAME = _first(f"//h1 | //*[{_has_class('company-name')}] | //*[contains(@class, 'stock-name')]")
+
+# ── StockAnalysis overview page ──
+_SA_QUOTE = _first("//*[@data-test='overview-quote']")
+_SA_PRICE = _first(f"//*[{_has_class('price-value')}] | //*[contains(@class, 'price')]")
+_SA_STATS = etree.XPath(
+    f"//*[@data-test='overview-info']//tr | //*[{_has_class('overview-item')}] | //*[contains(@class, 'stat-row')]"
+)
+
+
+def load(html: str) -> etree._Element:
+    """Parse a page with lxml and drop script/style/comment nodes so element text matches get_text()."""
+    try:
+        root = lxml.html.document_fromstring(html)
+    except ValueError:  # unicode input carrying an XML encoding declaration
+        root = lxml.html.document_fromstring(html.encode("utf-8"))
+    except etree.ParserError:  # empty document
+        return lxml.html.Element("html")
+    etree.strip_elements(root, "script", "style", etree.Comment, with_tail=False)
+    return root
+
+
+def text(el) -> str:
+    """BeautifulSoup get_text(strip=True) for an lxml element."""
+    return "".join(s.strip() for s in el.itertext())
+
+
+def _one(xpath: etree.XPath, root) -> Optional[etree._Element]:
+    found = xpath(root)
+    return found[0] if found else None
+
+
+def mubasher_stock_fields(html: str) -> Tuple[Dict, str]:
+    """
+    market_data fields and company name from a Mubasher stock page.
+    Returns ({field: value}, name) — name is "" when the page has none.
+    """
+    root = load(html)
+    data = {}
+
+    for xpath in _MUBASHER_PRICE:
+        el = _one(xpath, root)
+        if el is not None:
+            try:
+                data["close_price"] = float(text(el).replace(",", ""))
+                break
+            except ValueError:
+                continue
+
+    # Key stats tables: label in the first cell, value in the last
+    for table in root.iter("table"):
+        for row in table.iterdescendants("tr"):
+            cells = list(row.iterdescendants("td", "th"))
+            if len(cells) < 2:
+                continue
+            label = text(cells[0]).lower()
+            try:
+                value = float(text(cells[-1]).replace(",", "").replace("%", ""))
+            except ValueError:
+                continue
+
+            if "market cap" in label or "mkt cap" in label:
+                data["market_cap"] = value
+            elif "p/e" in label or "pe ratio" in label:
+                data["pe_ratio"] = value
+            elif "p/b" in label:
+                data["pb_ratio"] = value
+            elif "volume" in label and "avg" not in label:
+                data["volume"] = int(value)
+            elif "52" in label and "high" in label:
+                data["fifty_two_week_high"] = value
+            elif "52" in label and "low" in label:
+                data["fifty_two_week_low"] = value
+            elif "dividend" in label and "yield" in label:
+                data["dividend_yield"] = value / 100 if value > 1 else value
+            elif "beta" in label:
+                data["beta"] = value
+            elif "shares" in label and ("outstanding" in label or "issued" in label):
+                data["shares_outstanding"] = value
+
+    # Div-based key stats
+    for div in _MUBASHER_KEY_STATS(root):
+        label_el = next(div.iterdescendants("span", "label", "dt"), None)
+        value_el = next(div.iterdescendants("strong", "b", "dd"), None)
+        if label_el is None or value_el is None:
+            continue
+        label = text(label_el).lower()
+        try:
+            value = float(text(value_el).replace(",", "").replace("%", ""))
+        except ValueError:
+            continue
+        if "sector" in label:
+            pass  # text field
+        elif "open" in label:
+            data["open_price"] = value
+        elif "high" in label and "52" not in label:
+            data["high_price"] = value
+        elif "low" in label and "52" not in label:
+            data["low_price"] = value
+
+    name_el = _one(_MUBASHER_NAME, root)
+    return data, text(name_el) if name_el is not None else ""
+
+
+def _statement_rows(root):
+    """(label, td cells) for every tbody row of every table."""
+    for table in root.iter("table"):
+        tbody = next(table.iterdescendants("tbody"), None)
+        if tbody is None:
+            continue
+        for row in tbody.iterdescendants("tr"):
+            cells = list(row.iterdescendants("td"))
+            if len(cells) >= 2:
+                yield text(cells[0]).lower(), cells
+
+
+def mubasher_financial_items(html: str) -> List[Tuple[str, str, float]]:
+    """
+    (statement, field, value) items from a Mubasher financials page, using the
+    most recent period column. statement is "income" or "balance".
+    """
+    items = []
+    for label, cells in _statement_rows(load(html)):
+        try:
+            latest_value = float(text(cells[1]).replace(",", "").replace("(", "-").replace(")", ""))
+        except ValueError:
+            continue
+
+        if any(k in label for k in ["revenue", "sales", "turnover"]):
+            items.append(("income", "revenue", latest_value))
+        elif "net income" in label or "net profit" in label:
+            items.append(("income", "net_income", latest_value))
+        elif "total assets" in label:
+            items.append(("balance", "total_assets", latest_value))
+        elif "total equity" in label or "shareholders" in label:
+            items.append(("balance", "total_equity", latest_value))
+    return items
+
+
+def stockanalysis_overview_fields(html: str) -> Dict:
+    """market_data fields from a StockAnalysis overview page."""
+    root = load(html)
+    data = {}
+
+    price_el = _one(_SA_QUOTE, root)
+    if price_el is None:
+        price_el = _one(_SA_PRICE, root)
+    if price_el is not None:
+        try:
+            data["close_price"] = float(text(price_el).replace(",", "").replace("EGP", "").strip())
+        except ValueError:
+            pass
+
+    for item in _SA_STATS(root):
+        cells = list(item.iterdescendants("td", "span", "div"))
+        if len(cells) < 2:
+            continue
+        label = text(cells[0]).lower()
+        value_text = text(cells[-1]).replace(",", "").replace("%", "").replace("EGP", "").strip()
+        try:
+            value = float(value_text.replace("B", "e9").replace("M", "e6").replace("K", "e3")
+                          if any(c in value_text for c in ["B", "M", "K"]) else value_text)
+        except (ValueError, OverflowError):
+            continue
+
+        if "market cap" in label:
+            data["market_cap"] = value
+        elif "p/e" in label or "pe ratio" in label:
+            data["pe_ratio"] = value
+        elif "p/b" in label or "price to book" in label:
+            data["pb_ratio"] = value
+        elif "dividend yield" in label:
+            data["dividend_yield"] = value / 100 if value > 1 else value
+        elif "beta" in label:
+            data["beta"] = value
+        elif "shares" in label and "outstanding" in label:
+            data["shares_outstanding"] = value
+        elif "52" in label and "high" in label:
+            data["fifty_two_week_high"] = value
+        elif "52" in label and "low" in label:
+            data["fifty_two_week_low"] = value
+        elif "volume" in label and "avg" not in label:
+            data["volume"] = int(value)
+    return data
+
+
+def stockanalysis_financial_items(html: str) -> List[Tuple[str, str, float]]:
+    """(statement, field, value) items from a StockAnalysis financials page."""
+    items = []
+    for label, cells in _statement_rows(load(html)):
+        try:
+            value = float(text(cells[1]).replace(",", "").replace("(", "-").replace(")", ""))
+        except ValueError:
+            continue
+
+        if "revenue" in label or "total revenue" in label:
+            items.append(("income", "revenue", value))
+        elif label.startswith("ebit") and "da" not in label:
+            items.append(("income", "ebit", value))
+        elif "net income" in label:
+            items.append(("income", "net_income", value))
+        elif "total assets" in label:
+            items.append(("balance", "total_assets", value))
+        elif "current liabilities" in label:
+            items.append(("balance", "current_liabilities", value))
+        elif "total debt" in label:
+            items.append(("balance", "total_debt", value))
+        elif "total equity" in label or "stockholders" in label:
+            items.append(("balance", "total_equity", value))
+    return items
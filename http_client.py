@@ -0,0 +1,222 @@
+"""
+EGX EVA Analyzer — Shared HTTP Layer
+Blocking and asyncio fetch paths shared by the scraping collectors.
+The async path keeps several requests in flight per host and hands each
+body back to the collector as soon as it arrives, so parsing overlaps
+with the remaining downloads. Both paths are paced by the shared
+per-host rate limiter, and pages fetched conditionally are revalidated
+with ETag / Last-Modified (or a body hash) so unchanged pages come back
+as NOT_MODIFIED instead of a body to re-parse. A changed conditional page
+only counts as seen once the collector has saved it and called record().
+"""
+
+import time
+import asyncio
+import logging
+from typing import Callable, Container, Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+import requests
+
+try:
+    import httpx
+except ImportError:  # async engine unavailable — collectors fall back to the sequential path
+    httpx = None
+
+from config import REQUEST_TIMEOUT, MAX_RETRIES
+from rate_limiter import limiter, THROTTLE_STATUSES
+from response_cache import ResponseCache, ValidatorStore
+
+logger = logging.getLogger(__name__)
+
+# Returned instead of a body when a conditional fetch finds the page unchanged
+NOT_MODIFIED = object()
+
+# on_response(url, body_or_None_or_NOT_MODIFIED, seconds_spent_fetching)
+ResponseHandler = Callable[[str, Optional[str], float], None]
+
+
+class Fetcher:
+    """
+    HTTP client shared by the scraping collectors.
+
+    get() is the plain blocking request used by the sequential path.
+    fetch_many() runs a batch of URLs through an httpx.AsyncClient with at most
+    `max_in_flight` concurrent requests per host; with max_in_flight=1 (or
+    without httpx installed) it degrades to the sequential get() loop.
+    With a cache, bodies are served from / stored to raw_cache keyed by URL,
+    except for URLs fetched uncached (pages whose data must be today's, like quotes).
+    With validators, conditional fetches return NOT_MODIFIED for unchanged pages.
+    """
+
+    def __init__(self, label: str, headers: Dict[str, str], max_in_flight: int = 1,
+                 cache: Optional[ResponseCache] = None, validators: Optional[ValidatorStore] = None):
+        self.label = label
+        self.headers = dict(headers)
+        self.max_in_flight = max(1, max_in_flight)
+        self.cache = cache
+        self.validators = validators
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        # url -> (body, etag, last_modified) of changed conditional pages awaiting record()
+        self._unrecorded: Dict[str, tuple] = {}
+
+    @property
+    def concurrent(self) -> bool:
+        """True when fetch_many() will use the async engine."""
+        return self.max_in_flight > 1 and httpx is not None
+
+    def _revalidating(self, conditional: bool) -> bool:
+        return conditional and self.validators is not None and self.validators.enabled
+
+    def _cached(self, url: str, conditional: bool, cached: bool = True):
+        """
+        Cache lookup. Conditional URLs are only cached by record() (or for a body
+        identical to the recorded one), so one still in the cache was saved
+        within its TTL and counts as unchanged.
+        """
+        if self.cache is None or not cached:
+            return None
+        cached = self.cache.get(url)
+        if cached is not None and self._revalidating(conditional):
+            return NOT_MODIFIED
+        return cached
+
+    def _request_headers(self, url: str, conditional: bool) -> Dict[str, str]:
+        return self.validators.headers(url) if self._revalidating(conditional) else {}
+
+    def _settle(self, url: str, status: int, body: Optional[str], headers, conditional: bool,
+                cached: bool = True):
+        """
+        Turn a finished response into what the collector sees: the body, or
+        NOT_MODIFIED for a 304 / byte-identical page. Runs on the calling thread.
+        """
+        if self._revalidating(conditional):
+            if status == 304:
+                self.validators.not_modified(url)
+                return NOT_MODIFIED
+            etag, last_modified = headers.get("ETag"), headers.get("Last-Modified")
+            if self.validators.unchanged_body(url, body, etag, last_modified):
+                if self.cache is not None:
+                    self.cache.set(url, body)
+                return NOT_MODIFIED
+            self._unrecorded[url] = (body, etag, last_modified)
+            return body
+        if self.cache is not None and cached:
+            self.cache.set(url, body)
+        return body
+
+    def record(self, url: str):
+        """
+        Mark a changed conditional page as processed: store its validators and
+        cache entry. Collectors call this after the page's rows are written, inside
+        the same writer.atomic() block so both commit together. A page that is
+        never recorded is revalidated as changed and parsed again on the next run.
+        """
+        entry = self._unrecorded.pop(url, None)
+        if entry is None:
+            return
+        body, etag, last_modified = entry
+        self.validators.record(url, body, etag, last_modified)
+        if self.cache is not None:
+            self.cache.set(url, body)
+
+    def get(self, url: str, conditional: bool = False, cached: bool = True):
+        """
+        Blocking GET. Returns the response body, or None on 404 / request failure.
+        With conditional=True an unchanged page returns NOT_MODIFIED instead;
+        with cached=False the response cache is neither read nor written.
+        429/503 answers are reported to the rate limiter and retried up to MAX_RETRIES times.
+        """
+        self._unrecorded.pop(url, None)
+        hit = self._cached(url, conditional, cached)
+        if hit is not None:
+            return hit
+        try:
+            headers = self._request_headers(url, conditional)
+            for attempt in range(MAX_RETRIES + 1):
+                limiter.acquire(url)
+                resp = self.session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+                limiter.record(url, resp.status_code, resp.headers.get("Retry-After"))
+                if resp.status_code not in THROTTLE_STATUSES or attempt == MAX_RETRIES:
+                    break
+            if resp.status_code == 404:
+                return None
+            resp.raise_for_status()
+            return self._settle(url, resp.status_code, resp.text, resp.headers, conditional, cached)
+        except requests.RequestException as e:
+            logger.warning(f"  [{self.label}] Request failed for {url}: {e}")
+            return None
+
+    def fetch_many(self, urls: Iterable[str], on_response: ResponseHandler,
+                   conditional: Container[str] = (), uncached: Container[str] = ()):
+        """
+        Fetch every URL and call on_response(url, body, elapsed) as each one completes.
+        URLs listed in `conditional` are revalidated and may yield NOT_MODIFIED;
+        URLs listed in `uncached` bypass the response cache.
+        Callbacks always run on the calling thread, so they may write to the database;
+        a changed conditional page must be record()ed from its callback.
+        """
+        urls = list(urls)
+        if not self.concurrent:
+            for url in urls:
+                start = time.time()
+                body = self.get(url, conditional=url in conditional, cached=url not in uncached)
+                on_response(url, body, time.time() - start)
+                self._unrecorded.pop(url, None)
+            return
+
+        misses = []
+        for url in urls:
+            hit = self._cached(url, url in conditional, url not in uncached)
+            if hit is not None:
+                on_response(url, hit, 0.0)
+            else:
+                misses.append(url)
+        if misses:
+            asyncio.run(self._fetch_many_async(misses, on_response, conditional, uncached))
+
+    async def _fetch_many_async(self, urls, on_response: ResponseHandler, conditional: Container[str],
+                                uncached: Container[str]):
+        """Async engine behind fetch_many(): one semaphore per host bounds the requests in flight."""
+        hosts = {urlparse(u).hostname for u in urls}
+        slots = {host: asyncio.Semaphore(self.max_in_flight) for host in hosts}
+        limits = httpx.Limits(max_connections=self.max_in_flight * len(hosts),
+                              max_keepalive_connections=self.max_in_flight * len(hosts))
+
+        async with httpx.AsyncClient(headers=self.headers, timeout=REQUEST_TIMEOUT,
+                                     limits=limits, follow_redirects=True) as client:
+
+            responses = asyncio.Queue()
+            # Validator lookups hit the database, so resolve them here rather than inside the tasks
+            request_headers = {u: self._request_headers(u, u in conditional) for u in urls}
+
+            async def fetch_one(url: str):
+                async with slots[urlparse(url).hostname]:
+                    start = time.time()
+                    resp = None
+                    try:
+                        for attempt in range(MAX_RETRIES + 1):
+                            await limiter.acquire_async(url)
+                            resp = await client.get(url, headers=request_headers[url])
+                            limiter.record(url, resp.status_code, resp.headers.get("Retry-After"))
+                            if resp.status_code not in THROTTLE_STATUSES or attempt == MAX_RETRIES:
+                                break
+                        if resp.status_code not in (304, 404):
+                            resp.raise_for_status()
+                    except httpx.HTTPError as e:
+                        logger.warning(f"  [{self.label}] Request failed for {url}: {e}")
+                        resp = None
+                    finally:
+                        responses.put_nowait((url, resp, time.time() - start))
+
+            tasks = [asyncio.create_task(fetch_one(u)) for u in urls]
+            for _ in urls:
+                url, resp, elapsed = await responses.get()
+                body = None
+                if resp is not None and resp.status_code != 404:
+                    body = self._settle(url, resp.status_code, resp.text, resp.headers, url in conditional,
+                                        url not in uncached)
+                on_response(url, body, elapsed)
+                self._unrecorded.pop(url, None)
+            await asyncio.gather(*tasks)
@@ -9,6 +9,17 @@ Usage:
     python main.py --tickers COMI TMGH     # Specific stocks only
     python main.py --sources yahoo mubasher # Specific sources
     python main.py --export xlsx           # Also export locally
+    python main.py --sources yahoo mubasher --parallel-sources  # Sources side by side
+    python main.py --prices-only           # Fast daily price refresh only
+    python main.py --no-cache              # Ignore cached responses, fetch everything
+    python main.py --force                 # Re-collect tickers even if still fresh, recompute all EVA
+    python main.py --explain               # Print query plans of the hot database queries
+    python main.py --db-profile            # Per-statement SQLite timings, written to reports/
+    python main.py --no-history            # Skip the daily price history download
+    python main.py maintain                # Retention, cache purge, EVA thinning, vacuum only
+    python main.py export --arrow-format feather  # Columnar snapshot of the database (needs pyarrow)
+    python main.py sensitivity             # EVA / signals over config.SENSITIVITY_GRID, saved to exports/
+    python main.py simulate --samples 5000 # Monte Carlo intrinsic-value percentiles into eva_simulations
 """
 
 import argparse
@@ -16,6 +27,7 @@ import logging
 import os
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from typing import List, Dict
 
@@ -27,8 +39,9 @@ PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
-from config import KNOWN_EGX_TICKERS, CollectionConfig
+from config import KNOWN_EGX_TICKERS, FRESHNESS_HOURS, MONTE_CARLO, REPORTS_DIR, CollectionConfig
 import database as db
+from db_writer import DatabaseWriter, DatabaseWriterError
 
 # ═══════════════════════════════════════════════════════════════
 # LOGGING SETUP
@@ -79,7 +92,7 @@ def _import_collector(name: str):
 # PIPELINE STEPS
 # ═══════════════════════════════════════════════════════════════
 
-def step_discover(conn, config: CollectionConfig) -> List[str]:
+def step_discover(conn, config: CollectionConfig, writer: DatabaseWriter) -> List[str]:
     """Step 1: Determine which tickers to analyze."""
     logger.info("=" * 60)
     logger.info("STEP 1: TICKER DISCOVERY")
@@ -92,13 +105,58 @@ def step_discover(conn, config: CollectionConfig) -> List[str]:
         tickers = sorted(set(KNOWN_EGX_TICKERS))
         logger.info(f"Using {len(tickers)} known EGX tickers")
 
-    for ticker in tickers:
-        db.upsert_company(conn, ticker=ticker, source="seed")
+    db.upsert_company_many(writer, [{"ticker": ticker, "source": "seed"} for ticker in tickers])
+    writer.flush()
 
     return tickers
 
 
-def step_collect(conn, tickers: List[str], config: CollectionConfig) -> int:
+def _run_source(conn, source_name: str, tickers: List[str], config: CollectionConfig,
+                writer: DatabaseWriter):
+    """Run one collector over the tickers. Returns its results, or None if unavailable."""
+    CollectorClass = _import_collector(source_name)
+    if CollectorClass is None:
+        logger.warning(f"Skipping source '{source_name}' (not available)")
+        return None
+
+    logger.info(f"\n--- {source_name.upper()} ---")
+    collector = CollectorClass(conn, max_workers=config.max_workers,
+                               use_cache=config.use_cache, cache_ttl_hours=config.cache_ttl_hours,
+                               writer=writer, freshness=FRESHNESS_HOURS if config.incremental else None)
+    if config.prices_only:
+        if not hasattr(collector, "collect_prices"):
+            logger.info(f"Skipping source '{source_name}' (no bulk price refresh)")
+            return None
+        results = collector.collect_prices(tickers)
+    else:
+        results = collector.collect_all(tickers)
+    if config.price_history and hasattr(collector, "collect_price_history"):
+        collector.collect_price_history(tickers)
+    return results
+
+
+def _run_source_isolated(source_name: str, tickers: List[str], config: CollectionConfig,
+                         writer: DatabaseWriter):
+    """
+    Worker-thread entry point: sqlite3 connections are per-thread, so each source opens
+    its own for reads and cache lookups; all sources share the one writer.
+    """
+    conn = db.get_connection()
+    try:
+        return _run_source(conn, source_name, tickers, config, writer)
+    finally:
+        conn.close()
+
+
+def _log_source_summary(source_name: str, results: List[Dict], tickers: List[str]) -> int:
+    """Log the per-source summary line and return its record count."""
+    records = sum(r.get("records", 0) for r in results)
+    success = sum(1 for r in results if r.get("records", 0) > 0)
+    logger.info(f"{source_name}: {records} records from {success}/{len(tickers)} stocks")
+    return records
+
+
+def step_collect(conn, tickers: List[str], config: CollectionConfig, writer: DatabaseWriter) -> int:
     """Step 2: Collect financial data from available sources."""
     logger.info("=" * 60)
     logger.info("STEP 2: DATA COLLECTION")
@@ -108,36 +166,53 @@ def step_collect(conn, tickers: List[str], config: CollectionConfig) -> int:
 
     total_records = 0
 
-    for source_name in config.sources:
-        CollectorClass = _import_collector(source_name)
-        if CollectorClass is None:
-            logger.warning(f"Skipping source '{source_name}' (not available)")
-            continue
-
-        logger.info(f"\n--- {source_name.upper()} ---")
-        try:
-            collector = CollectorClass(conn)
-            results = collector.collect_all(tickers)
-            records = sum(r.get("records", 0) for r in results)
-            success = sum(1 for r in results if r.get("records", 0) > 0)
-            total_records += records
-            logger.info(f"{source_name}: {records} records from {success}/{len(tickers)} stocks")
-        except Exception as e:
-            logger.error(f"{source_name} collection failed: {e}")
+    if config.parallel_sources and len(config.sources) > 1:
+        # Sources hit different hosts — run them side by side, one worker each
+        logger.info(f"Running {len(config.sources)} sources concurrently")
+        with ThreadPoolExecutor(max_workers=len(config.sources), thread_name_prefix="source") as pool:
+            futures = {pool.submit(_run_source_isolated, name, tickers, config, writer): name
+                       for name in config.sources}
+            for future in as_completed(futures):
+                source_name = futures[future]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    logger.error(f"{source_name} collection failed: {e}")
+                    continue
+                if results is not None:
+                    total_records += _log_source_summary(source_name, results, tickers)
+    else:
+        for source_name in config.sources:
+            try:
+                results = _run_source(conn, source_name, tickers, config, writer)
+            except Exception as e:
+                logger.error(f"{source_name} collection failed: {e}")
+                continue
+            if results is not None:
+                total_records += _log_source_summary(source_name, results, tickers)
+
+    try:
+        writer.flush()
+    except DatabaseWriterError as e:
+        logger.error(f"Data collection incomplete, some collected data was not saved: {e}")
+    from response_cache import cleanup
+    cleanup(conn)
+    db.analyze(conn)
 
     logger.info(f"\nTotal records collected: {total_records}")
     return total_records
 
 
-def step_eva(conn, tickers: List[str]) -> List[Dict]:
-    """Step 3: Run EVA calculations."""
+def step_eva(conn, tickers: List[str], writer: DatabaseWriter, incremental: bool = True) -> List[Dict]:
+    """Step 3: Run EVA calculations (unchanged inputs are carried forward unless --force)."""
     logger.info("=" * 60)
     logger.info("STEP 3: EVA CALCULATION")
     logger.info("=" * 60)
 
     from eva_engine import EVAEngine
-    engine = EVAEngine(conn)
-    results = engine.run_all(tickers)
+    engine = EVAEngine(conn, writer=writer)
+    results = engine.run_all(tickers, incremental=incremental)
+    writer.flush()
     return results
 
 
@@ -189,7 +264,7 @@ def step_push_supabase(conn, tickers: List[str], eva_results: List[Dict],
     market_rows = []
     for ticker in tickers:
         row = conn.execute(
-            "SELECT * FROM market_data WHERE ticker = ? ORDER BY date DESC LIMIT 1",
+            "SELECT * FROM latest_market_data WHERE ticker = ? ORDER BY date DESC LIMIT 1",
             (ticker,)
         ).fetchone()
         if row:
@@ -201,7 +276,7 @@ def step_push_supabase(conn, tickers: List[str], eva_results: List[Dict],
     income_rows = []
     for ticker in tickers:
         row = conn.execute(
-            "SELECT * FROM income_statements WHERE ticker = ? ORDER BY period_end DESC LIMIT 1",
+            "SELECT * FROM latest_income_statements WHERE ticker = ? ORDER BY period_end DESC LIMIT 1",
             (ticker,)
         ).fetchone()
         if row:
@@ -213,7 +288,7 @@ def step_push_supabase(conn, tickers: List[str], eva_results: List[Dict],
     balance_rows = []
     for ticker in tickers:
         row = conn.execute(
-            "SELECT * FROM balance_sheets WHERE ticker = ? ORDER BY period_end DESC LIMIT 1",
+            "SELECT * FROM latest_balance_sheets WHERE ticker = ? ORDER BY period_end DESC LIMIT 1",
             (ticker,)
         ).fetchone()
         if row:
@@ -242,6 +317,42 @@ def step_push_supabase(conn, tickers: List[str], eva_results: List[Dict],
                 f"{len(undervalued)} undervalued")
 
 
+def _with_reader(connections: db.ConnectionManager, step, *args):
+    """Run a read-only pipeline step on a pooled read-only connection."""
+    with connections.reader() as reader:
+        return step(reader, *args)
+
+
+def explain_queries(conn):
+    """--explain: print EXPLAIN QUERY PLAN for each hot query, flagging full table scans."""
+    logger.info("=" * 60)
+    logger.info("QUERY PLANS")
+    logger.info("=" * 60)
+
+    scans = 0
+    for name, plan in db.explain_hot_queries(conn).items():
+        logger.info(name)
+        for detail in plan:
+            full = db.is_full_scan(detail)
+            scans += full
+            logger.info(f"    {detail}{'   <-- FULL SCAN' if full else ''}")
+    logger.info(f"\n{scans} full table scans" if scans else "\nNo full table scans")
+
+
+def write_db_profile(profiler: db.QueryProfiler, top: int = 10):
+    """--db-profile: write the per-statement report to reports/ and log the slowest statements."""
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    path = os.path.join(REPORTS_DIR, f"db_profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
+    with open(path, "w") as f:
+        f.write(profiler.report() + "\n")
+    logger.info("=" * 60)
+    logger.info("DATABASE PROFILE")
+    logger.info("=" * 60)
+    for line in profiler.report(limit=top).split("\n\n")[0].splitlines():
+        logger.info(line)
+    logger.info(f"Full profile: {path}")
+
+
 # ═══════════════════════════════════════════════════════════════
 # MAIN
 # ═══════════════════════════════════════════════════════════════
@@ -249,12 +360,41 @@ def step_push_supabase(conn, tickers: List[str], eva_results: List[Dict],
 def parse_args():
     parser = argparse.ArgumentParser(
         description="EGX EVA Analyzer — Egyptian Stock Market Value Analysis")
+    parser.add_argument("command", nargs="?", choices=["run", "maintain", "export", "sensitivity", "simulate"], default="run",
+                        help="run = full pipeline (default), maintain = database maintenance only, "
+                             "export = Parquet/Feather snapshot of the database, "
+                             "sensitivity = EVA over the config.SENSITIVITY_GRID parameter grid, "
+                             "simulate = Monte Carlo intrinsic-value distributions")
     parser.add_argument("--tickers", nargs="+", help="Specific tickers")
     parser.add_argument("--sources", nargs="+",
                         choices=["yahoo", "mubasher", "egx", "stockanalysis"],
                         default=["yahoo"], help="Data sources (default: yahoo)")
     parser.add_argument("--export", choices=["csv", "json", "xlsx"], default="csv")
     parser.add_argument("--quick", action="store_true", help="Yahoo only, known tickers")
+    parser.add_argument("--prices-only", action="store_true",
+                        help="Bulk market-data refresh only (Yahoo), skip statements")
+    parser.add_argument("--parallel-sources", action="store_true",
+                        help="Run each data source in its own worker at the same time")
+    parser.add_argument("--workers", type=int, default=CollectionConfig.max_workers,
+                        help="Parallel fetch workers per source (1 = sequential)")
+    parser.add_argument("--no-history", action="store_true",
+                        help="Skip the incremental daily price history download (Yahoo)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Bypass the response cache and re-fetch everything")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-collect everything, ignoring the incremental freshness windows")
+    parser.add_argument("--explain", action="store_true",
+                        help="Print the query plans of the hot database queries and exit")
+    parser.add_argument("--db-profile", action="store_true",
+                        help="Time every SQLite statement and write a slow-query report at the end")
+    parser.add_argument("--no-maintain", action="store_true",
+                        help="Skip the database maintenance step at the end of a run")
+    parser.add_argument("--arrow-format", choices=["parquet", "feather"], default="parquet",
+                        help="File format of the export command (feather is memory-mappable)")
+    parser.add_argument("--samples", type=int, default=MONTE_CARLO["samples"],
+                        help="Monte Carlo samples per ticker (simulate)")
+    parser.add_argument("--seed", type=int, default=MONTE_CARLO["seed"],
+                        help="Monte Carlo random seed (simulate); the same seed reproduces the results")
     parser.add_argument("--quiet", action="store_true")
     parser.add_argument("--no-supabase", action="store_true", help="Skip Supabase push")
     return parser.parse_args()
@@ -263,10 +403,42 @@ def parse_args():
 def main():
     args = parse_args()
     setup_logging(verbose=not args.quiet)
+    profiler = db.enable_profiling() if args.db_profile else None
+
+    if args.explain or args.command in ("maintain", "export", "sensitivity", "simulate"):
+        conn = db.get_connection()
+        if args.explain:
+            explain_queries(conn)
+        elif args.command == "maintain":
+            import maintenance
+            maintenance.run(conn)
+        elif args.command == "sensitivity":
+            import sensitivity
+            sensitivity.run(conn, tickers=args.tickers, path=sensitivity.default_path())
+        elif args.command == "simulate":
+            import monte_carlo
+            monte_carlo.run(conn, tickers=args.tickers, samples=args.samples, seed=args.seed)
+        else:
+            import arrow_export
+            if arrow_export.available():
+                arrow_export.export(conn, args.arrow_format)
+            else:
+                logger.error("pyarrow is not installed — pip install pyarrow to use the export command")
+        conn.close()
+        if profiler:
+            write_db_profile(profiler)
+        return
 
     config = CollectionConfig(
         tickers=args.tickers,
         sources=["yahoo"] if args.quick else args.sources,
+        max_workers=args.workers,
+        prices_only=args.prices_only,
+        price_history=not args.no_history,
+        maintain=not args.no_maintain,
+        parallel_sources=args.parallel_sources,
+        use_cache=not args.no_cache,
+        incremental=not args.force,
         export_format=args.export,
         verbose=not args.quiet,
     )
@@ -278,23 +450,36 @@ def main():
     logger.info("+" + "=" * 58 + "+")
     logger.info(f"Started:  {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     logger.info(f"Sources:  {', '.join(config.sources)}")
+    logger.info(f"Workers:  {config.max_workers}")
+    logger.info(f"Mode:     {'incremental' if config.incremental else 'full (--force)'}")
     logger.info(f"Supabase: {'ENABLED' if os.environ.get('SUPABASE_URL') else 'DISABLED'}")
 
     pipeline_start = time.time()
-    conn = db.get_connection()
+    connections = db.ConnectionManager()
+    conn = connections.conn
+    writer = DatabaseWriter()
     eva_results = []
     total_records = 0
 
     try:
-        tickers = step_discover(conn, config)
-        total_records = step_collect(conn, tickers, config)
-        eva_results = step_eva(conn, tickers)
-        step_report(conn, config)
+        tickers = step_discover(conn, config, writer)
+        total_records = step_collect(conn, tickers, config, writer)
+        with connections.reader() as reader:
+            eva_results = step_eva(reader, tickers, writer, config.incremental)
 
+        # Reports and the Supabase push only read, so they run side by side on their own readers
         duration = time.time() - pipeline_start
-        if not args.no_supabase:
-            step_push_supabase(conn, tickers, eva_results, total_records,
-                               duration, config.sources)
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="publish") as pool:
+            jobs = [pool.submit(_with_reader, connections, step_report, config)]
+            if not args.no_supabase:
+                jobs.append(pool.submit(_with_reader, connections, step_push_supabase, tickers, eva_results,
+                                        total_records, duration, config.sources))
+            for job in jobs:
+                job.result()
+
+        if config.maintain:
+            import maintenance
+            maintenance.run(conn)
 
     except KeyboardInterrupt:
         logger.info("\nInterrupted. Partial results saved.")
@@ -313,7 +498,10 @@ def main():
             except Exception:
                 pass
     finally:
-        conn.close()
+        writer.close()
+        connections.close()
+        if profiler:
+            write_db_profile(profiler)
 
     total_time = time.time() - pipeline_start
     logger.info(f"\nPipeline time: {total_time:.1f}s | Results: {len(eva_results)} stocks")
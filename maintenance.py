@@ -0,0 +1,70 @@
+"""
+EGX EVA Analyzer — Database Maintenance
+Keeps egx_data.db from growing without bound: old collection_log rows are
+rolled into daily totals, expired / over-budget cache entries are dropped,
+old EVA snapshots are thinned, and the freed pages are returned to the
+filesystem with incremental vacuum. Run with `python main.py maintain`, or
+automatically at the end of a pipeline run.
+"""
+
+import time
+import logging
+from typing import Dict
+
+from config import LOG_RETENTION_DAYS, EVA_RETENTION, FRESHNESS_HOURS
+import database as db
+import response_cache
+
+logger = logging.getLogger(__name__)
+
+# Hot-query timings are averaged over this many executions
+_TIMING_RUNS = 20
+
+
+def _time_queries(conn) -> Dict[str, float]:
+    """Mean milliseconds per execution of each database.HOT_QUERIES entry."""
+    timings = {}
+    for name, (sql, params) in db.HOT_QUERIES.items():
+        start = time.perf_counter()
+        for _ in range(_TIMING_RUNS):
+            conn.execute(sql, params).fetchall()
+        timings[name] = (time.perf_counter() - start) / _TIMING_RUNS * 1000
+    return timings
+
+
+def run(conn) -> Dict:
+    """Run every maintenance step and log what it reclaimed. Returns the report."""
+    logger.info("=" * 60)
+    logger.info("DATABASE MAINTENANCE")
+    logger.info("=" * 60)
+    start = time.time()
+    before = db.file_stats(conn)
+    timings_before = _time_queries(conn)
+
+    # Per-ticker rows inside the freshness windows still drive incremental runs
+    keep_days = max(LOG_RETENTION_DAYS, max(FRESHNESS_HOURS.values()) / 24)
+    report = {"log_rows_rolled_up": db.rollup_collection_log(conn, keep_days)}
+    report["cache_expired"], report["cache_evicted"] = response_cache.cleanup(conn)
+    report["eva_rows_removed"] = db.downsample_eva_results(conn, EVA_RETENTION["daily_days"],
+                                                           EVA_RETENTION["weekly_days"])
+    report["vacuum"] = db.vacuum(conn)
+    db.analyze(conn)
+
+    after = db.file_stats(conn)
+    timings_after = _time_queries(conn)
+    report["bytes_before"], report["bytes_after"] = before["bytes"], after["bytes"]
+    report["bytes_reclaimed"] = before["bytes"] - after["bytes"]
+    report["query_ms"] = {name: (timings_before[name], timings_after[name]) for name in timings_before}
+
+    logger.info(f"collection_log: {report['log_rows_rolled_up']} rows older than {keep_days:g} days "
+                f"rolled into collection_log_daily")
+    logger.info(f"raw_cache:      {report['cache_expired']} expired, {report['cache_evicted']} evicted")
+    logger.info(f"eva_results:    {report['eva_rows_removed']} snapshots thinned "
+                f"(daily {EVA_RETENTION['daily_days']}d, weekly {EVA_RETENTION['weekly_days']}d, then monthly)")
+    logger.info(f"vacuum:         {report['vacuum']}")
+    logger.info(f"File size:      {before['bytes'] / 1e6:.2f} MB → {after['bytes'] / 1e6:.2f} MB "
+                f"({report['bytes_reclaimed'] / 1e6:.2f} MB reclaimed)")
+    for name, (ms_before, ms_after) in report["query_ms"].items():
+        logger.info(f"  {name:<38}{ms_before:>8.3f} ms → {ms_after:.3f} ms")
+    logger.info(f"Maintenance done in {time.time() - start:.1f}s")
+    return report
@@ -0,0 +1,102 @@
+"""
+EGX EVA Analyzer — Monte Carlo Intrinsic Value
+calculate_eva gives one point estimate, but beta (DEFAULT_BETA for many EGX
+names), the risk-free rate and the cost of debt are uncertain. This draws
+config.MONTE_CARLO["samples"] parameter sets and runs eva_arrays() over them:
+
+  - risk-free rate and pre-tax cost of debt: one market-wide draw per sample
+    (a sample is a macro scenario shared by all tickers)
+  - beta: per ticker, around its own beta, or around DEFAULT_BETA with a wider
+    spread when it has none
+
+Tickers are simulated in chunks of chunk_cells ticker × sample cells, so
+memory stays bounded whatever the universe size. Draws come from the seed
+(per-ticker beta streams from the seed and the ticker), so results do not
+depend on the chunking or on which other tickers are simulated.
+Percentiles and signal probabilities are stored in eva_simulations.
+"""
+
+import time
+import zlib
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import MONTE_CARLO, RISK_FREE_RATE, COST_OF_DEBT_PRETAX, DEFAULT_BETA
+from eva_engine import EVAEngine, INPUT_FIELDS, MODEL_PARAMETERS, SIGNALS, eva_arrays
+import database as db
+from db_writer import write_target
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (5, 50, 95)
+
+
+def _beta_draws(tickers: List[str], beta: np.ndarray, samples: int, seed: int) -> np.ndarray:
+    """(tickers, samples) betas: each ticker's own stream, around its beta or DEFAULT_BETA."""
+    z = np.stack([np.random.default_rng([seed, zlib.crc32(t.encode())]).standard_normal(samples)
+                  for t in tickers]) if tickers else np.empty((0, samples))
+    known = ~np.isnan(beta) & (beta != 0)   # calculate_eva: `beta or DEFAULT_BETA`
+    centre = np.where(known, beta, DEFAULT_BETA)[:, None]
+    spread = np.where(known, MONTE_CARLO["beta_sd"], MONTE_CARLO["default_beta_sd"])[:, None]
+    return centre + spread * z
+
+
+def simulate(inputs: pd.DataFrame, samples: int = MONTE_CARLO["samples"], seed: int = MONTE_CARLO["seed"],
+             chunk_cells: int = MONTE_CARLO["chunk_cells"], calculation_date: str = None) -> List[Dict]:
+    """eva_simulations rows for the computable tickers of a merged input frame."""
+    calculation_date = calculation_date or datetime.now().strftime("%Y-%m-%d")
+    macro = np.random.default_rng(seed)
+    risk_free_rate = macro.normal(RISK_FREE_RATE, MONTE_CARLO["risk_free_rate_sd"], samples)
+    cost_of_debt = macro.normal(COST_OF_DEBT_PRETAX, MONTE_CARLO["cost_of_debt_sd"], samples)
+    params = dict(MODEL_PARAMETERS, risk_free_rate=np.clip(risk_free_rate, 0, None),
+                  cost_of_debt_pretax=np.clip(cost_of_debt, 0, None))
+
+    rows = []
+    step = max(1, chunk_cells // samples)
+    for start in range(0, len(inputs), step):
+        part = inputs.iloc[start:start + step]
+        tickers = part["ticker"].tolist()
+        data = {f: part[f].to_numpy(np.float64)[:, None] for f in INPUT_FIELDS if f in part}
+        data["beta"] = _beta_draws(tickers, part["beta"].to_numpy(np.float64), samples, seed)
+        out = eva_arrays(data, **params)
+
+        valid = out["valid"][:, 0]
+        value = np.percentile(out["intrinsic_value"][valid], PERCENTILES, axis=1)
+        premium = np.percentile(out["intrinsic_premium"][valid], PERCENTILES, axis=1)   # NaN when unpriced
+        signal = out["signal"][valid]
+        probs = {code: (signal == code).mean(axis=1) for code in range(1, len(SIGNALS))}
+
+        for i, ticker in enumerate(np.asarray(tickers, dtype=object)[valid].tolist()):
+            row = {"ticker": ticker, "calculation_date": calculation_date, "samples": samples, "seed": seed}
+            for p, v in zip(PERCENTILES, value[:, i].tolist()):
+                row[f"intrinsic_value_p{p}"] = round(v, 2)
+            for p, v in zip(PERCENTILES, premium[:, i].tolist()):
+                row[f"intrinsic_premium_p{p}"] = round(v, 4) if v == v else None
+            for code, share in probs.items():
+                row[f"prob_{SIGNALS[code].lower().replace(' ', '_')}"] = round(float(share[i]), 4)
+            rows.append(row)
+    return rows
+
+
+def run(conn, writer=None, tickers: Optional[List[str]] = None,
+        samples: int = MONTE_CARLO["samples"], seed: int = MONTE_CARLO["seed"]) -> List[Dict]:
+    """Simulate every ticker (or `tickers`), store the summaries and log the most likely undervalued."""
+    logger.info("=" * 60)
+    logger.info(f"MONTE CARLO — {samples:,} samples per ticker (seed {seed})")
+    logger.info("=" * 60)
+    start = time.time()
+    rows = simulate(EVAEngine(conn).merged_frame(tickers), samples, seed)
+    db.upsert_eva_simulation_many(write_target(conn, writer), rows)
+
+    logger.info(f"Simulated {len(rows)} tickers in {time.time() - start:.1f}s")
+    for r in sorted(rows, key=lambda r: r["prob_undervalued"], reverse=True)[:10]:
+        if r["intrinsic_premium_p50"] is None:
+            continue
+        logger.info(f"  {r['ticker']}: P(UNDERVALUED)={r['prob_undervalued']:.0%} | "
+                    f"premium p5/p50/p95={r['intrinsic_premium_p5']:.1%} / {r['intrinsic_premium_p50']:.1%} / "
+                    f"{r['intrinsic_premium_p95']:.1%}")
+    return rows
@@ -4,21 +4,25 @@ Scrapes stock listings, prices, and financial data from english.mubasher.info.
 This is one of the most comprehensive free sources for EGX financial data.
 """
 
+import re
 import time
 import random
 import logging
 from datetime import datetime
 from typing import Dict, List, Optional
 
-import requests
 from bs4 import BeautifulSoup
 
 from config import (
     MUBASHER_BASE, MUBASHER_EGX_STOCKS,
     MUBASHER_STOCK_URL, MUBASHER_FINANCIALS_URL,
-    USER_AGENTS, REQUEST_TIMEOUT, REQUEST_DELAY_MIN, REQUEST_DELAY_MAX
+    USER_AGENTS
 )
 import database as db
+import html_parsing
+from db_writer import atomic, write_target
+from http_client import Fetcher, NOT_MODIFIED
+from response_cache import ResponseCache, ValidatorStore
 
 logger = logging.getLogger(__name__)
 
@@ -28,27 +32,22 @@ class MubasherCollector:
 
     SOURCE = "mubasher"
 
-    def __init__(self, conn):
+    def __init__(self, conn, max_workers: int = 1, use_cache: bool = True, cache_ttl_hours: float = 24,
+                 writer=None, freshness: Optional[Dict[str, float]] = None):
         self.conn = conn
-        self.session = requests.Session()
-        self.session.headers.update({
+        self.freshness = freshness
+        self.writer = write_target(conn, writer)
+        self.cache = ResponseCache(conn, self.SOURCE, enabled=use_cache, default_ttl_hours=cache_ttl_hours,
+                                   writer=self.writer)
+        self.http = Fetcher("Mubasher", {
             "User-Agent": random.choice(USER_AGENTS),
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
             "Accept-Language": "en-US,en;q=0.9,ar;q=0.8",
             "Accept-Encoding": "gzip, deflate, br",
             "Connection": "keep-alive",
             "Referer": MUBASHER_BASE,
-        })
-
-    def _get(self, url: str) -> Optional[BeautifulSoup]:
-        """Make a GET request and return parsed HTML."""
-        try:
-            resp = self.session.get(url, timeout=REQUEST_TIMEOUT)
-            resp.raise_for_status()
-            return BeautifulSoup(resp.text, "lxml")
-        except requests.RequestException as e:
-            logger.warning(f"  [Mubasher] Request failed for {url}: {e}")
-            return None
+        }, max_in_flight=max_workers, cache=self.cache,
+           validators=ValidatorStore(conn, enabled=use_cache, writer=self.writer))
 
     def discover_tickers(self) -> List[Dict]:
         """
@@ -62,11 +61,11 @@ class MubasherCollector:
             f"{MUBASHER_EGX_STOCKS}/indices/EGX100%20EWI",
         ]
 
-        for url in index_urls:
+        def on_response(url: str, html: Optional[str], elapsed: float):
             logger.info(f"  [Mubasher] Scanning {url}...")
-            soup = self._get(url)
-            if not soup:
-                continue
+            if html is None:
+                return
+            soup = BeautifulSoup(html, "lxml")
 
             # Look for stock table rows
             # Mubasher typically renders stock data in table rows with class patterns
@@ -96,12 +95,11 @@ class MubasherCollector:
                 text = script.get_text()
                 if "stockCode" in text or "ticker" in text:
                     # Try to extract tickers from embedded JSON
-                    import re
                     ticker_matches = re.findall(r'"(?:stockCode|ticker)"\s*:\s*"([A-Z]{2,6})"', text)
                     for t in ticker_matches:
                         discovered.append({"ticker": t, "name": ""})
 
-            time.sleep(random.uniform(REQUEST_DELAY_MIN, REQUEST_DELAY_MAX))
+        self.http.fetch_many(index_urls, on_response)
 
         # Deduplicate
         seen = set()
@@ -119,103 +117,27 @@ class MubasherCollector:
         Scrape main stock page for price, market data, and key metrics.
         URL: english.mubasher.info/markets/EGX/stocks/{ticker}
         """
-        url = MUBASHER_STOCK_URL.format(ticker=ticker)
-        result = {"ticker": ticker, "records": 0, "errors": []}
+        html = self.http.get(MUBASHER_STOCK_URL.format(ticker=ticker), cached=False)   # prices must be today's
+        return self._parse_stock_page(ticker, html)
 
-        soup = self._get(url)
-        if not soup:
+    def _parse_stock_page(self, ticker: str, html: Optional[str]) -> Dict:
+        """Extract and store market data and company name from a fetched stock page."""
+        result = {"ticker": ticker, "records": 0, "errors": []}
+        if html is None:
             result["errors"].append("Failed to fetch stock page")
             return result
 
         try:
-            # Extract price data from the page
-            data = {"ticker": ticker, "date": datetime.now().strftime("%Y-%m-%d"), "source": self.SOURCE}
-
-            # Try to find price elements
-            # Mubasher uses various CSS classes for stock data
-            price_selectors = [
-                ".stockPageContent .price",
-                ".stock-price",
-                "[class*='price']",
-                ".last-price",
-            ]
-            for sel in price_selectors:
-                el = soup.select_one(sel)
-                if el:
-                    try:
-                        price_text = el.get_text(strip=True).replace(",", "")
-                        data["close_price"] = float(price_text)
-                        break
-                    except ValueError:
-                        continue
-
-            # Extract key stats table
-            # Mubasher shows metrics like Market Cap, P/E, Volume, etc. in info tables
-            stat_tables = soup.select("table")
-            for table in stat_tables:
-                rows = table.find_all("tr")
-                for row in rows:
-                    cells = row.find_all(["td", "th"])
-                    if len(cells) >= 2:
-                        label = cells[0].get_text(strip=True).lower()
-                        value_text = cells[-1].get_text(strip=True).replace(",", "").replace("%", "")
-
-                        try:
-                            value = float(value_text)
-                        except ValueError:
-                            continue
-
-                        if "market cap" in label or "mkt cap" in label:
-                            data["market_cap"] = value
-                        elif "p/e" in label or "pe ratio" in label:
-                            data["pe_ratio"] = value
-                        elif "p/b" in label:
-                            data["pb_ratio"] = value
-                        elif "volume" in label and "avg" not in label:
-                            data["volume"] = int(value)
-                        elif "52" in label and "high" in label:
-                            data["fifty_two_week_high"] = value
-                        elif "52" in label and "low" in label:
-                            data["fifty_two_week_low"] = value
-                        elif "dividend" in label and "yield" in label:
-                            data["dividend_yield"] = value / 100 if value > 1 else value
-                        elif "beta" in label:
-                            data["beta"] = value
-                        elif "shares" in label and ("outstanding" in label or "issued" in label):
-                            data["shares_outstanding"] = value
-
-            # Also look for info in div-based key stats
-            key_stat_divs = soup.select("[class*='key-stat'], [class*='info-item'], [class*='stock-info']")
-            for div in key_stat_divs:
-                label_el = div.find(["span", "label", "dt"])
-                value_el = div.find(["strong", "b", "dd"])
-                if label_el and value_el:
-                    label = label_el.get_text(strip=True).lower()
-                    try:
-                        value = float(value_el.get_text(strip=True).replace(",", "").replace("%", ""))
-                        if "sector" in label:
-                            pass  # text field
-                        elif "open" in label:
-                            data["open_price"] = value
-                        elif "high" in label and "52" not in label:
-                            data["high_price"] = value
-                        elif "low" in label and "52" not in label:
-                            data["low_price"] = value
-                    except ValueError:
-                        continue
+            fields, company_name = html_parsing.mubasher_stock_fields(html)
+            data = {"ticker": ticker, "date": datetime.now().strftime("%Y-%m-%d"), "source": self.SOURCE, **fields}
 
             if data.get("close_price") or data.get("market_cap"):
-                db.upsert_market_data(self.conn, data)
+                db.upsert_market_data(self.writer, data)
                 result["records"] += 1
                 logger.info(f"  [Mubasher] {ticker}: Market data ✓")
 
-            # Try to extract company name and sector
-            name_el = soup.select_one("h1, .company-name, [class*='stock-name']")
-            sector_el = soup.find(string=lambda s: s and "sector" in s.lower() if s else False)
-
-            company_name = name_el.get_text(strip=True) if name_el else ""
             if company_name:
-                db.upsert_company(self.conn, ticker=ticker, name=company_name, source=self.SOURCE)
+                db.upsert_company(self.writer, ticker=ticker, name=company_name, source=self.SOURCE)
                 result["records"] += 1
 
         except Exception as e:
@@ -229,82 +151,41 @@ class MubasherCollector:
         Scrape financial statements page for income, balance sheet, cash flow.
         URL: english.mubasher.info/markets/EGX/stocks/{ticker}/financial-statements
         """
-        url = MUBASHER_FINANCIALS_URL.format(ticker=ticker)
-        result = {"ticker": ticker, "records": 0, "errors": []}
+        return self._parse_financials(ticker, self.http.get(MUBASHER_FINANCIALS_URL.format(ticker=ticker),
+                                                            conditional=True))
 
-        soup = self._get(url)
-        if not soup:
+    def _parse_financials(self, ticker: str, html: Optional[str]) -> Dict:
+        """Extract and store statement line items from a fetched financials page, then record it as seen."""
+        result = {"ticker": ticker, "records": 0, "errors": []}
+        if html is NOT_MODIFIED:
+            logger.info(f"  [Mubasher] {ticker}: Financials unchanged, skipped")
+            return result
+        if html is None:
             result["errors"].append("Failed to fetch financials page")
             return result
 
         try:
-            # Mubasher financial statements are in tabular format
-            # Look for financial data tables
-            tables = soup.select("table")
-
-            for table in tables:
-                headers = []
-                header_row = table.find("thead")
-                if header_row:
-                    headers = [th.get_text(strip=True) for th in header_row.find_all(["th", "td"])]
-
-                rows = table.find("tbody")
-                if not rows:
-                    continue
-
-                for row in rows.find_all("tr"):
-                    cells = row.find_all("td")
-                    if len(cells) < 2:
-                        continue
-
-                    label = cells[0].get_text(strip=True).lower()
-                    values = []
-                    for cell in cells[1:]:
-                        text = cell.get_text(strip=True).replace(",", "").replace("(", "-").replace(")", "")
-                        try:
-                            values.append(float(text))
-                        except ValueError:
-                            values.append(None)
-
-                    # Map common financial line items
-                    if not values:
-                        continue
-
-                    latest_value = values[0]  # Most recent period
-                    if latest_value is None:
-                        continue
-
-                    # Determine which statement this belongs to and store accordingly
-                    # This is a simplified mapping — real implementation would be more thorough
-                    period_end = datetime.now().strftime("%Y-12-31")  # Approximate
-
-                    if any(k in label for k in ["revenue", "sales", "turnover"]):
-                        db.upsert_income_statement(self.conn, {
-                            "ticker": ticker, "period": "annual", "period_end": period_end,
-                            "revenue": latest_value, "source": self.SOURCE
-                        })
-                        result["records"] += 1
-                    elif "net income" in label or "net profit" in label:
-                        db.upsert_income_statement(self.conn, {
-                            "ticker": ticker, "period": "annual", "period_end": period_end,
-                            "net_income": latest_value, "source": self.SOURCE
-                        })
-                        result["records"] += 1
-                    elif "total assets" in label:
-                        db.upsert_balance_sheet(self.conn, {
-                            "ticker": ticker, "period": "annual", "period_end": period_end,
-                            "total_assets": latest_value, "source": self.SOURCE
-                        })
-                        result["records"] += 1
-                    elif "total equity" in label or "shareholders" in label:
-                        db.upsert_balance_sheet(self.conn, {
-                            "ticker": ticker, "period": "annual", "period_end": period_end,
-                            "total_equity": latest_value, "source": self.SOURCE
-                        })
-                        result["records"] += 1
-
-            if result["records"] > 0:
-                logger.info(f"  [Mubasher] {ticker}: Financials ✓ ({result['records']} items)")
+            # Simplified mapping of the most recent period — real implementation would be more thorough
+            period_end = datetime.now().strftime("%Y-12-31")  # Approximate
+            # One row per statement with every field found, merged into what is already stored
+            items = html_parsing.mubasher_financial_items(html)
+            if not items:
+                # Not recorded, so the page is revalidated as changed and parsed again next run
+                result["errors"].append("No line items parsed from financials page")
+                logger.warning(f"  [Mubasher] {ticker}: No financial line items found")
+                return result
+            rows = {statement: {"ticker": ticker, "period": "annual", "period_end": period_end, "source": self.SOURCE}
+                    for statement in ("income", "balance")}
+            found = {statement for statement, _, _ in items}
+            for statement, field, value in items:
+                rows[statement][field] = value
+            if "income" in found:
+                db.upsert_income_statement(self.writer, rows["income"], merge=True)
+            if "balance" in found:
+                db.upsert_balance_sheet(self.writer, rows["balance"], merge=True)
+            result["records"] = len(items)
+            self.http.record(MUBASHER_FINANCIALS_URL.format(ticker=ticker))
+            logger.info(f"  [Mubasher] {ticker}: Financials ✓ ({result['records']} items)")
 
         except Exception as e:
             result["errors"].append(str(e))
@@ -312,27 +193,27 @@ class MubasherCollector:
 
         return result
 
-    def collect_stock(self, ticker: str) -> Dict:
+    def _log_page(self, ticker: str, data_class: str, r: Dict, duration: float):
+        """Log one page's outcome under its data class (stock page = prices, financials = statements)."""
+        status = "success" if not r["errors"] else ("partial" if r["records"] > 0 else "failed")
+        db.log_collection(self.writer, ticker, self.SOURCE, status, r["records"],
+                          "; ".join(r["errors"]) if r["errors"] else None, duration, data_class=data_class)
+
+    def collect_stock(self, ticker: str, classes=("prices", "statements")) -> Dict:
         """Collect all data for a single stock from Mubasher."""
         combined = {"ticker": ticker, "source": self.SOURCE, "records": 0, "errors": []}
-        start = time.time()
-
-        # Stock page (price + market data)
-        r1 = self.collect_stock_page(ticker)
-        combined["records"] += r1["records"]
-        combined["errors"].extend(r1["errors"])
 
-        time.sleep(random.uniform(REQUEST_DELAY_MIN, REQUEST_DELAY_MAX))
-
-        # Financial statements
-        r2 = self.collect_financials(ticker)
-        combined["records"] += r2["records"]
-        combined["errors"].extend(r2["errors"])
-
-        duration = time.time() - start
-        status = "success" if not combined["errors"] else ("partial" if combined["records"] > 0 else "failed")
-        db.log_collection(self.conn, ticker, self.SOURCE, status,
-                         combined["records"], "; ".join(combined["errors"]) if combined["errors"] else None, duration)
+        pages = [("prices", self.collect_stock_page), ("statements", self.collect_financials)]
+        for data_class, collect in pages:
+            if data_class not in classes:
+                continue
+            start = time.time()
+            # The page's rows, its log entry and its validators are saved together or not at all
+            with atomic(self.writer):
+                r = collect(ticker)
+                self._log_page(ticker, data_class, r, time.time() - start)
+            combined["records"] += r["records"]
+            combined["errors"].extend(r["errors"])
 
         return combined
 
@@ -341,26 +222,77 @@ class MubasherCollector:
         # First discover tickers if we don't have a list
         if not tickers:
             discovered = self.discover_tickers()
-            for d in discovered:
-                db.upsert_company(self.conn, ticker=d["ticker"], name=d["name"], source=self.SOURCE)
+            db.upsert_company_many(self.writer, [
+                {"ticker": d["ticker"], "name": d["name"], "source": self.SOURCE} for d in discovered
+            ])
             tickers = [d["ticker"] for d in discovered] if discovered else []
 
         if not tickers:
             logger.warning("[Mubasher] No tickers to collect")
             return []
 
-        results = []
-        total = len(tickers)
-        logger.info(f"[Mubasher] Starting collection for {total} tickers...")
+        # Incremental mode: only the pages whose data class is stale
+        stale = {c: set(db.stale_tickers(self.conn, tickers, self.SOURCE, c, self.freshness))
+                 for c in ("prices", "statements")}
+        classes = {t: tuple(c for c in ("prices", "statements") if t in stale[c]) for t in tickers}
+        skipped = [t for t in tickers if not classes[t]]
+        if skipped:
+            logger.info(f"[Mubasher] {len(skipped)} tickers fresh, skipped")
+        tickers = [t for t in tickers if classes[t]]
 
-        for i, ticker in enumerate(tickers, 1):
-            logger.info(f"[Mubasher] ({i}/{total}) Processing {ticker}...")
-            result = self.collect_stock(ticker)
-            results.append(result)
+        total = len(tickers)
+        if self.http.concurrent:
+            results = self._collect_all_concurrent(tickers, classes)
+        else:
+            results = []
+            logger.info(f"[Mubasher] Starting collection for {total} tickers...")
 
-            if i < total:
-                time.sleep(random.uniform(REQUEST_DELAY_MIN, REQUEST_DELAY_MAX))
+            for i, ticker in enumerate(tickers, 1):
+                logger.info(f"[Mubasher] ({i}/{total}) Processing {ticker}...")
+                result = self.collect_stock(ticker, classes[ticker])
+                results.append(result)
 
         success = sum(1 for r in results if not r["errors"])
-        logger.info(f"[Mubasher] Complete: {success}/{total} successful")
+        logger.info(f"[Mubasher] Complete: {success}/{total} successful, "
+                    f"{self.http.validators.unchanged} financials pages unchanged")
         return results
+
+    def _collect_all_concurrent(self, tickers: List[str], classes: Dict[str, tuple]) -> List[Dict]:
+        """Fetch stock and financials pages for all tickers through the async engine, parsing as they arrive."""
+        total = len(tickers)
+        logger.info(f"[Mubasher] Starting collection for {total} tickers "
+                    f"({self.http.max_in_flight} requests in flight)...")
+
+        jobs = {}
+        statements = set()
+        quotes = set()
+        for ticker in tickers:
+            if "prices" in classes[ticker]:
+                jobs[MUBASHER_STOCK_URL.format(ticker=ticker)] = (ticker, "prices", self._parse_stock_page)
+                quotes.add(MUBASHER_STOCK_URL.format(ticker=ticker))
+            if "statements" in classes[ticker]:
+                jobs[MUBASHER_FINANCIALS_URL.format(ticker=ticker)] = (ticker, "statements", self._parse_financials)
+                statements.add(MUBASHER_FINANCIALS_URL.format(ticker=ticker))
+
+        combined = {t: {"ticker": t, "source": self.SOURCE, "records": 0, "errors": []} for t in tickers}
+        pending = {t: len(classes[t]) for t in tickers}
+        done = 0
+
+        def on_response(url: str, html: Optional[str], elapsed: float):
+            nonlocal done
+            ticker, data_class, parse = jobs[url]
+            with atomic(self.writer):
+                r = parse(ticker, html)
+                self._log_page(ticker, data_class, r, elapsed)
+            entry = combined[ticker]
+            entry["records"] += r["records"]
+            entry["errors"].extend(r["errors"])
+
+            pending[ticker] -= 1
+            if pending[ticker] == 0:
+                done += 1
+                logger.info(f"[Mubasher] ({done}/{total}) {ticker} done")
+
+        self.http.fetch_many(jobs, on_response, conditional=statements, uncached=quotes)
+        return [combined[t] for t in tickers]
+
@@ -0,0 +1,87 @@
+"""
+EGX EVA Analyzer — Price History
+Daily OHLCV bars are stored twice: as price_history rows keyed by (ticker, day)
+for SQL, and packed per ticker in price_history_packed for bulk loads. Loading
+five years of the whole universe is then a few hundred blob reads and
+np.frombuffer calls instead of hundreds of thousands of row tuples.
+Days are integers: days since 1970-01-01.
+"""
+
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import database as db
+
+# Column order of the packed float64 bar rows
+FIELDS = ("open", "high", "low", "close", "adj_close", "volume")
+
+Bars = Tuple[np.ndarray, np.ndarray]   # (int32 days, float64 bars of shape (n, len(FIELDS)))
+
+
+def day_number(d) -> int:
+    """Day key for a date / datetime / ISO string."""
+    return int(np.datetime64(d, "D").astype(np.int64))
+
+
+def day_date(day: int) -> date:
+    """Calendar date of a day key."""
+    return np.datetime64(int(day), "D").astype(date)
+
+
+def pack(ticker: str, days: np.ndarray, bars: np.ndarray) -> Dict:
+    """price_history_packed row for one ticker's bars (days ascending)."""
+    return {
+        "ticker": ticker,
+        "first_day": int(days[0]),
+        "last_day": int(days[-1]),
+        "bars": len(days),
+        "days": days.astype("<i4").tobytes(),
+        "ohlcv": bars.astype("<f8").tobytes(),
+    }
+
+
+def unpack(days_blob: bytes, ohlcv_blob: bytes) -> Bars:
+    """Inverse of pack(): read-only arrays over the stored bytes."""
+    days = np.frombuffer(days_blob, dtype="<i4")
+    return days, np.frombuffer(ohlcv_blob, dtype="<f8").reshape(len(days), len(FIELDS))
+
+
+def merge(old: Bars, new: Bars) -> Bars:
+    """Stored bars extended with newly fetched ones; a re-fetched day replaces the stored bar."""
+    old_days, old_bars = old
+    new_days, new_bars = new
+    keep = ~np.isin(old_days, new_days)
+    days = np.concatenate([old_days[keep], new_days])
+    bars = np.concatenate([old_bars[keep], new_bars])
+    order = np.argsort(days, kind="stable")
+    return days[order], bars[order]
+
+
+def rows(ticker: str, days: np.ndarray, bars: np.ndarray) -> List[Dict]:
+    """price_history rows for one ticker's bars (NaN → NULL)."""
+    out = []
+    for day, bar in zip(days.tolist(), bars.tolist()):
+        row = {"ticker": ticker, "day": day}
+        for field, value in zip(FIELDS, bar):
+            row[field] = None if value != value else value
+        if row["volume"] is not None:
+            row["volume"] = int(row["volume"])
+        out.append(row)
+    return out
+
+
+def load_arrays(conn, tickers: Optional[List[str]] = None) -> Dict[str, Bars]:
+    """Stored bars per ticker as numpy arrays — the fastest way to read the history."""
+    return {r["ticker"]: unpack(r["days"], r["ohlcv"]) for r in db.get_packed_prices(conn, tickers)}
+
+
+def load(conn, tickers: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+    """Stored bars per ticker as DataFrames indexed by date, one column per FIELDS entry."""
+    frames = {}
+    for ticker, (days, bars) in load_arrays(conn, tickers).items():
+        index = pd.DatetimeIndex(days.astype("datetime64[D]"), name="date")
+        frames[ticker] = pd.DataFrame(bars, index=index, columns=list(FIELDS))
+    return frames
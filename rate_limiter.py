@@ -0,0 +1,144 @@
+"""
+EGX EVA Analyzer — Per-Host Rate Limiter
+Token-bucket politeness shared by every collector, keyed by hostname.
+Each host runs at its configured requests/sec until it answers 429/503,
+then the rate is cut multiplicatively (and Retry-After honoured) and
+recovers additively with every successful response.
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from config import (
+    HOST_RATE_LIMITS, RATE_LIMIT_DEFAULT,
+    RATE_LIMIT_BACKOFF, RATE_LIMIT_RECOVERY, RATE_LIMIT_MIN_RATE,
+)
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_STATUSES = (429, 503)
+
+
+class TokenBucket:
+    """
+    Token bucket for one host. Not thread-safe on its own — HostRateLimiter
+    serialises access. Tokens may go negative: each negative token is a
+    reservation already handed to a waiting caller.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def reserve(self, now: float) -> float:
+        """Take one token and return how many seconds the caller must wait before using it."""
+        if now > self.updated:   # no accrual while paused: `updated` sits at the end of the pause
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return wait + (self.updated - now)
+
+    def throttled(self, now: float, retry_after: Optional[float]):
+        """
+        Host pushed back: cut the rate, drop the burst allowance and pause.
+        Tokens start accruing when the pause ends, so callers queued during it
+        are released at the reduced rate rather than all at once.
+        """
+        self.rate = max(RATE_LIMIT_MIN_RATE, self.rate * RATE_LIMIT_BACKOFF)
+        pause = retry_after if retry_after is not None else 1.0 / self.rate
+        self.blocked_until = max(self.blocked_until, now + pause)
+        self.tokens = 0.0
+        self.updated = max(self.updated, self.blocked_until)
+
+    def succeeded(self):
+        """Additive recovery towards the configured rate."""
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + RATE_LIMIT_RECOVERY)
+
+
+class HostRateLimiter:
+    """Thread- and asyncio-safe registry of per-host token buckets."""
+
+    def __init__(self, limits: Dict[str, Tuple[float, int]] = None,
+                 default: Tuple[float, int] = RATE_LIMIT_DEFAULT):
+        self.limits = dict(HOST_RATE_LIMITS if limits is None else limits)
+        self.default = default
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, host: str) -> TokenBucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            rate, burst = self.limits.get(host, self.default)
+            bucket = self._buckets[host] = TokenBucket(rate, burst)
+        return bucket
+
+    def _reserve(self, url_or_host: str) -> float:
+        host = _host(url_or_host)
+        with self._lock:
+            return self._bucket(host).reserve(time.monotonic())
+
+    def acquire(self, url_or_host: str):
+        """Block until a request to this host is allowed."""
+        wait = self._reserve(url_or_host)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, url_or_host: str):
+        """Asyncio version of acquire()."""
+        wait = self._reserve(url_or_host)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def record(self, url_or_host: str, status: int, retry_after: Optional[str] = None):
+        """Feed a response status back so the host's rate adapts."""
+        host = _host(url_or_host)
+        with self._lock:
+            bucket = self._bucket(host)
+            if status in THROTTLE_STATUSES:
+                bucket.throttled(time.monotonic(), parse_retry_after(retry_after))
+                logger.warning(f"  [RateLimit] {host} answered {status} — slowing to {bucket.rate:.2f} req/s")
+            elif status < 400:
+                bucket.succeeded()
+
+    def current_rate(self, url_or_host: str) -> float:
+        """Current requests/sec allowed for a host."""
+        with self._lock:
+            return self._bucket(_host(url_or_host)).rate
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP-date) into seconds from now."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def _host(url_or_host: str) -> str:
+    return urlparse(url_or_host).hostname or url_or_host
+
+
+# Shared instance — every collector's HTTP traffic goes through this one limiter
+limiter = HostRateLimiter()
@@ -120,10 +120,22 @@ class ReportGenerator:
 
     def _export_collection_stats(self, date_str: str):
         """Export data collection statistics."""
+        # Recent attempts from collection_log plus the daily totals maintenance rolled up
         rows = self.conn.execute("""
-            SELECT source, status, COUNT(*) as count, AVG(duration_seconds) as avg_duration,
-                   SUM(records_collected) as total_records
-            FROM collection_log
+            SELECT source, status, SUM(attempts) as count,
+                   SUM(duration) / NULLIF(SUM(timed), 0) as avg_duration,
+                   SUM(records) as total_records
+            FROM (
+                SELECT source, status, COUNT(*) AS attempts, SUM(duration_seconds) AS duration,
+                       COUNT(duration_seconds) AS timed, SUM(records_collected) AS records
+                FROM collection_log
+                GROUP BY source, status
+                UNION ALL
+                SELECT source, status, SUM(attempts), SUM(duration_seconds),
+                       SUM(attempts), SUM(records_collected)
+                FROM collection_log_daily
+                GROUP BY source, status
+            )
             GROUP BY source, status
             ORDER BY source, status
         """).fetchall()
@@ -0,0 +1,129 @@
+"""
+EGX EVA Analyzer — Response Cache
+Thin per-source view over the raw_cache table. Collectors look up pages
+(keyed by URL) and yfinance payloads (keyed by symbol + endpoint) here
+before touching the network, so a re-run within the TTL is served locally.
+Lookups only read: entries are written through the collector's writer, and
+hits are remembered in memory and stamped as recently used by cleanup(), so
+a cache hit costs no write transaction.
+ValidatorStore keeps the per-URL ETag / Last-Modified / body hash used to
+revalidate pages that rarely change; a changed page's validators are only
+recorded once its rows are saved (http_client.Fetcher.record).
+"""
+
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from config import CACHE_TTL_HOURS, CACHE_MAX_BYTES
+import database as db
+from db_writer import write_target
+
+logger = logging.getLogger(__name__)
+
+# cache_key -> last hit, written to raw_cache.last_accessed by cleanup()
+_accessed: Dict[str, str] = {}
+_accessed_lock = threading.Lock()
+
+
+class ResponseCache:
+    """raw_cache entries for one source, with that source's TTL."""
+
+    def __init__(self, conn, source: str, enabled: bool = True, default_ttl_hours: float = 24, writer=None):
+        self.conn = conn
+        self.writer = write_target(conn, writer)
+        self.source = source
+        self.enabled = enabled
+        self.ttl_hours = CACHE_TTL_HOURS.get(source, default_ttl_hours)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Cached payload for key, or None if absent, expired or caching is off."""
+        if not self.enabled:
+            return None
+        data = db.get_cache(self.conn, key)
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            with _accessed_lock:
+                _accessed[key] = datetime.now().isoformat()
+        return data
+
+    def set(self, key: str, data: Any):
+        """Store a payload under key for this source's TTL."""
+        if self.enabled and data is not None:
+            db.set_cache(self.writer, key, data, self.source, self.ttl_hours)
+
+    def summary(self) -> str:
+        return f"cache {self.hits} hits / {self.misses} misses"
+
+
+class ValidatorStore:
+    """http_validators rows: what to send on a conditional GET and how to recognise an unchanged body."""
+
+    def __init__(self, conn, enabled: bool = True, writer=None):
+        self.conn = conn
+        self.writer = write_target(conn, writer)
+        self.enabled = enabled
+        self.unchanged = 0
+
+    def headers(self, url: str) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since headers for a URL, if it has validators."""
+        stored = db.get_validators(self.conn, url) if self.enabled else None
+        headers = {}
+        if stored:
+            if stored["etag"]:
+                headers["If-None-Match"] = stored["etag"]
+            if stored["last_modified"]:
+                headers["If-Modified-Since"] = stored["last_modified"]
+        return headers
+
+    def not_modified(self, url: str):
+        """The server answered 304."""
+        db.touch_validators(self.writer, url)
+        self.unchanged += 1
+
+    def unchanged_body(self, url: str, body: str, etag: Optional[str], last_modified: Optional[str]) -> bool:
+        """
+        True when a full response is byte-identical to the last recorded one (sites
+        that send no validators); its validators are refreshed. A changed body
+        stores nothing here — record() does that once the page is processed.
+        """
+        if not self.enabled:
+            return False
+        digest = _digest(body)
+        stored = db.get_validators(self.conn, url)
+        if stored is None or stored["content_hash"] != digest:
+            return False
+        db.set_validators(self.writer, url, etag, last_modified, digest)
+        self.unchanged += 1
+        return True
+
+    def record(self, url: str, body: str, etag: Optional[str], last_modified: Optional[str]):
+        """Store the validators of a response whose contents are saved."""
+        if self.enabled:
+            db.set_validators(self.writer, url, etag, last_modified, _digest(body))
+
+
+def _digest(body: str) -> str:
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def cleanup(conn, max_bytes: int = CACHE_MAX_BYTES):
+    """
+    Record the hits since the last cleanup, drop expired entries, then LRU-evict
+    until the cache fits max_bytes. Returns (expired, evicted).
+    """
+    global _accessed
+    with _accessed_lock:
+        accessed, _accessed = _accessed, {}
+    db.touch_cache_many(conn, accessed)
+    expired = db.purge_expired_cache(conn)
+    evicted = db.evict_cache(conn, max_bytes)
+    if expired or evicted:
+        logger.info(f"Response cache cleanup: {expired} expired, {evicted} evicted")
+    return expired, evicted
@@ -0,0 +1,151 @@
+"""
+EGX EVA Analyzer — Sensitivity Grid
+EVA, intrinsic value and signal of every ticker under every combination of a
+grid of model parameters (eva_engine.MODEL_PARAMETERS keys, ranges in
+config.SENSITIVITY_GRID). Inputs are merged once; each chunk of tickers is
+then one broadcast eva_arrays() pass over a tickers × parameter-axes cube:
+
+    cube.eva[ticker, risk_free_rate, equity_risk_premium, cost_of_debt_pretax, tax_rate]
+
+Values are stored as float32 and signals as int8 codes into eva_engine.SIGNALS.
+"""
+
+import os
+import time
+import logging
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from config import SENSITIVITY_GRID, SENSITIVITY_CHUNK_CELLS, ARROW_EXPORT_DIR
+from eva_engine import EVAEngine, INPUT_FIELDS, MODEL_PARAMETERS, SIGNALS, eva_arrays
+
+logger = logging.getLogger(__name__)
+
+# Cube outputs (eva_arrays() keys)
+VALUES = ("eva", "intrinsic_value", "intrinsic_premium")
+
+
+class SensitivityCube:
+    """Per-ticker outputs over a parameter grid: arrays of shape (tickers, *axis lengths)."""
+
+    def __init__(self, tickers: np.ndarray, axes: Dict[str, np.ndarray], arrays: Dict[str, np.ndarray]):
+        self.tickers = tickers
+        self.axes = axes
+        self.arrays = arrays
+        self.valid = arrays["valid"]   # tickers with a result (calculate_eva would not skip them)
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["arrays"][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    @property
+    def shape(self):
+        return self.arrays["signal"].shape
+
+    def sel(self, ticker: Optional[str] = None, **params) -> Dict[str, np.ndarray]:
+        """Slice every output at a ticker and / or the grid points nearest the given parameter values."""
+        index = [slice(None)] * (1 + len(self.axes))
+        if ticker is not None:
+            index[0] = int(np.flatnonzero(self.tickers == ticker)[0])
+        for axis, (name, values) in enumerate(self.axes.items(), start=1):
+            if name in params:
+                index[axis] = int(np.abs(values - params[name]).argmin())
+        return {name: self.arrays[name][tuple(index)] for name in VALUES + ("signal",)}
+
+    def signal_counts(self) -> np.ndarray:
+        """Tickers per signal in each scenario: shape (len(SIGNALS), *axis lengths)."""
+        signal = self.arrays["signal"][self.valid]
+        return np.stack([(signal == code).sum(axis=0) for code in range(len(SIGNALS))])
+
+    def to_frame(self) -> pd.DataFrame:
+        """Long format: one row per (valid ticker, scenario)."""
+        tickers = self.tickers[self.valid]
+        grid = np.meshgrid(*self.axes.values(), indexing="ij")
+        n_scenarios = grid[0].size if grid else 1
+        frame = pd.DataFrame({"ticker": pd.Categorical(np.repeat(tickers, n_scenarios))})
+        for name, values in zip(self.axes, grid):
+            frame[name] = np.tile(values.ravel(), len(tickers))
+        for name in VALUES:
+            frame[name] = self.arrays[name][self.valid].ravel()
+        frame["signal"] = pd.Categorical.from_codes(self.arrays["signal"][self.valid].ravel(), SIGNALS)
+        return frame
+
+    def save(self, path: str):
+        """Compressed .npz, or long-format .parquet (needs pyarrow)."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if path.endswith(".parquet"):
+            self.to_frame().to_parquet(path, compression="zstd")
+            return
+        np.savez_compressed(path, tickers=self.tickers, axis_names=np.array(list(self.axes)),
+                            **{f"axis_{i}": v for i, v in enumerate(self.axes.values())}, **self.arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "SensitivityCube":
+        with np.load(path) as f:
+            axes = {str(name): f[f"axis_{i}"] for i, name in enumerate(f["axis_names"])}
+            arrays = {name: f[name] for name in VALUES + ("signal", "valid")}
+            return cls(f["tickers"], axes, arrays)
+
+
+def cube(inputs: pd.DataFrame, grid: Dict[str, Sequence[float]] = SENSITIVITY_GRID,
+         chunk_cells: int = SENSITIVITY_CHUNK_CELLS) -> SensitivityCube:
+    """Evaluate a merged input frame (EVAEngine.merged_frame / input_frame) over the grid."""
+    unknown = set(grid) - set(MODEL_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown model parameters in sensitivity grid: {', '.join(sorted(unknown))}")
+
+    axes = {name: np.asarray(values, dtype=np.float64) for name, values in grid.items()}
+    shape = tuple(len(v) for v in axes.values())
+    params = dict(MODEL_PARAMETERS)
+    for axis, (name, values) in enumerate(axes.items()):
+        # Axis 0 is the tickers; parameter `axis` varies along axis + 1
+        params[name] = values.reshape([1] + [-1 if a == axis else 1 for a in range(len(axes))])
+
+    n = len(inputs)
+    columns = {f: inputs[f].to_numpy(np.float64).reshape((n,) + (1,) * len(axes)) for f in INPUT_FIELDS if f in inputs}
+    arrays = {name: np.full((n,) + shape, np.nan, dtype=np.float32) for name in VALUES}
+    arrays["signal"] = np.zeros((n,) + shape, dtype=np.int8)
+    arrays["valid"] = np.zeros(n, dtype=bool)
+
+    step = max(1, chunk_cells // max(1, int(np.prod(shape))))
+    for start in range(0, n, step):
+        stop = min(n, start + step)
+        out = eva_arrays({f: col[start:stop] for f, col in columns.items()}, **params)
+        valid = np.broadcast_to(out["valid"], (stop - start,) + shape).reshape(stop - start, -1)[:, 0]
+        arrays["valid"][start:stop] = valid
+        for name in VALUES + ("signal",):
+            block = np.broadcast_to(out[name], (stop - start,) + shape)
+            arrays[name][start:stop][valid] = block[valid]
+    return SensitivityCube(inputs["ticker"].to_numpy(dtype=str), axes, arrays)
+
+
+def default_path() -> str:
+    return os.path.join(ARROW_EXPORT_DIR, "sensitivity", f"sensitivity_{time.strftime('%Y%m%d')}.npz")
+
+
+def run(conn, grid: Dict[str, Sequence[float]] = SENSITIVITY_GRID,
+        tickers: Optional[List[str]] = None, path: Optional[str] = None) -> SensitivityCube:
+    """Merge the stored inputs once, evaluate them over the grid, log a summary and save to `path`."""
+    logger.info("=" * 60)
+    logger.info("SENSITIVITY GRID")
+    logger.info("=" * 60)
+    start = time.time()
+    inputs = EVAEngine(conn).merged_frame(tickers)
+    result = cube(inputs, grid)
+
+    scenarios = int(np.prod(result.shape[1:]))
+    logger.info(f"{int(result.valid.sum())}/{len(result.tickers)} tickers × {scenarios:,} scenarios "
+                f"({' × '.join(f'{name} [{v.min():g}–{v.max():g}]' for name, v in result.axes.items())}) "
+                f"in {time.time() - start:.2f}s")
+    undervalued = result.signal_counts()[SIGNALS.index("UNDERVALUED")]
+    if undervalued.size:
+        logger.info(f"UNDERVALUED tickers per scenario: min {undervalued.min()} | "
+                    f"median {np.median(undervalued):g} | max {undervalued.max()}")
+    if path:
+        result.save(path)
+        logger.info(f"Cube saved to {path}")
+    return result
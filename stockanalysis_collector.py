@@ -11,14 +11,14 @@ import logging
 from datetime import datetime
 from typing import Dict, List, Optional
 
-import requests
-from bs4 import BeautifulSoup
-
 from config import (
-    STOCKANALYSIS_BASE, USER_AGENTS,
-    REQUEST_TIMEOUT, REQUEST_DELAY_MIN, REQUEST_DELAY_MAX
+    STOCKANALYSIS_BASE, USER_AGENTS
 )
 import database as db
+import html_parsing
+from db_writer import atomic, write_target
+from http_client import Fetcher, NOT_MODIFIED
+from response_cache import ResponseCache, ValidatorStore
 
 logger = logging.getLogger(__name__)
 
@@ -28,199 +28,117 @@ class StockAnalysisCollector:
 
     SOURCE = "stockanalysis"
 
-    def __init__(self, conn):
+    FINANCIAL_PAGES = ["financials", "financials/?p=balance-sheet"]
+
+    def __init__(self, conn, max_workers: int = 1, use_cache: bool = True, cache_ttl_hours: float = 24,
+                 writer=None, freshness: Optional[Dict[str, float]] = None):
         self.conn = conn
-        self.session = requests.Session()
-        self.session.headers.update({
+        self.freshness = freshness
+        self.writer = write_target(conn, writer)
+        self.cache = ResponseCache(conn, self.SOURCE, enabled=use_cache, default_ttl_hours=cache_ttl_hours,
+                                   writer=self.writer)
+        self.http = Fetcher("StockAnalysis", {
             "User-Agent": random.choice(USER_AGENTS),
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
             "Accept-Language": "en-US,en;q=0.9",
-        })
+        }, max_in_flight=max_workers, cache=self.cache,
+           validators=ValidatorStore(conn, enabled=use_cache, writer=self.writer))
 
-    def _get(self, url: str) -> Optional[BeautifulSoup]:
-        """Make a GET request and return parsed HTML."""
-        try:
-            resp = self.session.get(url, timeout=REQUEST_TIMEOUT)
-            if resp.status_code == 404:
-                return None
-            resp.raise_for_status()
-            return BeautifulSoup(resp.text, "lxml")
-        except requests.RequestException as e:
-            logger.debug(f"  [StockAnalysis] Request failed: {url} — {e}")
-            return None
-
-    def collect_stock(self, ticker: str) -> Dict:
-        """Collect data for a single stock from StockAnalysis."""
-        result = {"ticker": ticker, "source": self.SOURCE, "records": 0, "errors": []}
-        start = time.time()
-
-        # ── Overview page ──
-        url = f"{STOCKANALYSIS_BASE}/{ticker}/"
-        soup = self._get(url)
+    def _overview_url(self, ticker: str) -> str:
+        return f"{STOCKANALYSIS_BASE}/{ticker}/"
 
-        if not soup:
-            result["errors"].append("Stock page not found")
-            duration = time.time() - start
-            db.log_collection(self.conn, ticker, self.SOURCE, "failed", 0,
-                            "Page not found", duration)
-            return result
+    def _financials_url(self, ticker: str, fin_type: str) -> str:
+        return f"{STOCKANALYSIS_BASE}/{ticker}/{fin_type}"
 
+    def _parse_overview(self, ticker: str, html: str, result: Dict):
+        """Extract and store market data from the overview page."""
         try:
             market_data = {
                 "ticker": ticker,
                 "date": datetime.now().strftime("%Y-%m-%d"),
                 "source": self.SOURCE,
+                **html_parsing.stockanalysis_overview_fields(html),
             }
 
-            # Extract price from overview
-            price_el = soup.select_one("[data-test='overview-quote']")
-            if not price_el:
-                # Try alternative selectors
-                price_el = soup.select_one(".price-value, [class*='price']")
-
-            if price_el:
-                try:
-                    price_text = price_el.get_text(strip=True).replace(",", "").replace("EGP", "").strip()
-                    market_data["close_price"] = float(price_text)
-                except ValueError:
-                    pass
-
-            # Extract key stats from overview table/grid
-            # StockAnalysis shows stats in a grid format
-            stat_items = soup.select("[data-test='overview-info'] tr, .overview-item, [class*='stat-row']")
-            for item in stat_items:
-                cells = item.find_all(["td", "span", "div"])
-                if len(cells) >= 2:
-                    label = cells[0].get_text(strip=True).lower()
-                    value_text = cells[-1].get_text(strip=True).replace(",", "").replace("%", "").replace("EGP", "").strip()
-
-                    try:
-                        value = float(value_text.replace("B", "e9").replace("M", "e6").replace("K", "e3")
-                                     if any(c in value_text for c in ["B", "M", "K"]) else value_text)
-                    except (ValueError, OverflowError):
-                        continue
-
-                    if "market cap" in label:
-                        market_data["market_cap"] = value
-                    elif "p/e" in label or "pe ratio" in label:
-                        market_data["pe_ratio"] = value
-                    elif "p/b" in label or "price to book" in label:
-                        market_data["pb_ratio"] = value
-                    elif "dividend yield" in label:
-                        market_data["dividend_yield"] = value / 100 if value > 1 else value
-                    elif "beta" in label:
-                        market_data["beta"] = value
-                    elif "shares" in label and "outstanding" in label:
-                        market_data["shares_outstanding"] = value
-                    elif "52" in label and "high" in label:
-                        market_data["fifty_two_week_high"] = value
-                    elif "52" in label and "low" in label:
-                        market_data["fifty_two_week_low"] = value
-                    elif "volume" in label and "avg" not in label:
-                        market_data["volume"] = int(value)
-
             if market_data.get("close_price") or market_data.get("market_cap"):
-                db.upsert_market_data(self.conn, market_data)
+                db.upsert_market_data(self.writer, market_data)
                 result["records"] += 1
 
         except Exception as e:
             result["errors"].append(f"Overview: {str(e)}")
 
-        # ── Financials page ──
-        time.sleep(random.uniform(0.5, 1.5))
+    def _parse_financials(self, ticker: str, url: str, html: str, result: Dict):
+        """Extract and store statement line items from a financials page, then record it as seen."""
+        try:
+            period_end = datetime.now().strftime("%Y-12-31")
+            # One row per statement with every field found, merged into what is already stored
+            items = html_parsing.stockanalysis_financial_items(html)
+            if not items:
+                # Not recorded, so the page is revalidated as changed and parsed again next run
+                result["errors"].append("Financials: no line items parsed")
+                return
+            rows = {statement: {"ticker": ticker, "period": "annual", "period_end": period_end, "source": self.SOURCE}
+                    for statement in ("income", "balance")}
+            found = {statement for statement, _, _ in items}
+            for statement, field, value in items:
+                rows[statement][field] = value
+            if "income" in found:
+                db.upsert_income_statement(self.writer, rows["income"], merge=True)
+            if "balance" in found:
+                db.upsert_balance_sheet(self.writer, rows["balance"], merge=True)
+            result["records"] += len(items)
+            self.http.record(url)
 
-        for fin_type in ["financials", "financials/?p=balance-sheet"]:
-            fin_url = f"{STOCKANALYSIS_BASE}/{ticker}/{fin_type}"
-            fin_soup = self._get(fin_url)
-            if not fin_soup:
-                continue
+        except Exception as e:
+            result["errors"].append(f"Financials: {str(e)}")
 
-            try:
-                tables = fin_soup.select("table")
-                for table in tables:
-                    headers = []
-                    thead = table.find("thead")
-                    if thead:
-                        headers = [th.get_text(strip=True) for th in thead.find_all(["th", "td"])]
+    def _log_class(self, ticker: str, data_class: str, records: int, errors: List[str], duration: float):
+        """Log one data class (overview = prices, financials pages = statements) for a stock."""
+        status = "success" if not errors else ("partial" if records > 0 else "failed")
+        db.log_collection(self.writer, ticker, self.SOURCE, status, records,
+                          "; ".join(errors) if errors else None, duration, data_class=data_class)
 
-                    tbody = table.find("tbody")
-                    if not tbody:
-                        continue
+    def _finish_stock(self, result: Dict):
+        """Progress line for a stock whose pages are all processed."""
+        if result["records"] > 0:
+            logger.info(f"  [StockAnalysis] {result['ticker']}: ✓ ({result['records']} records)")
 
-                    for row in tbody.find_all("tr"):
-                        cells = row.find_all("td")
-                        if len(cells) < 2:
-                            continue
-
-                        label = cells[0].get_text(strip=True).lower()
-                        value_text = cells[1].get_text(strip=True).replace(",", "").replace("(", "-").replace(")", "")
-
-                        try:
-                            value = float(value_text)
-                        except ValueError:
-                            continue
-
-                        period_end = datetime.now().strftime("%Y-12-31")
-
-                        # Income statement items
-                        if "revenue" in label or "total revenue" in label:
-                            db.upsert_income_statement(self.conn, {
-                                "ticker": ticker, "period": "annual", "period_end": period_end,
-                                "revenue": value, "source": self.SOURCE
-                            })
-                            result["records"] += 1
-                        elif label.startswith("ebit") and "da" not in label:
-                            db.upsert_income_statement(self.conn, {
-                                "ticker": ticker, "period": "annual", "period_end": period_end,
-                                "ebit": value, "source": self.SOURCE
-                            })
-                            result["records"] += 1
-                        elif "net income" in label:
-                            db.upsert_income_statement(self.conn, {
-                                "ticker": ticker, "period": "annual", "period_end": period_end,
-                                "net_income": value, "source": self.SOURCE
-                            })
-                            result["records"] += 1
-
-                        # Balance sheet items
-                        elif "total assets" in label:
-                            db.upsert_balance_sheet(self.conn, {
-                                "ticker": ticker, "period": "annual", "period_end": period_end,
-                                "total_assets": value, "source": self.SOURCE
-                            })
-                            result["records"] += 1
-                        elif "current liabilities" in label:
-                            db.upsert_balance_sheet(self.conn, {
-                                "ticker": ticker, "period": "annual", "period_end": period_end,
-                                "current_liabilities": value, "source": self.SOURCE
-                            })
-                            result["records"] += 1
-                        elif "total debt" in label:
-                            db.upsert_balance_sheet(self.conn, {
-                                "ticker": ticker, "period": "annual", "period_end": period_end,
-                                "total_debt": value, "source": self.SOURCE
-                            })
-                            result["records"] += 1
-                        elif "total equity" in label or "stockholders" in label:
-                            db.upsert_balance_sheet(self.conn, {
-                                "ticker": ticker, "period": "annual", "period_end": period_end,
-                                "total_equity": value, "source": self.SOURCE
-                            })
-                            result["records"] += 1
-
-            except Exception as e:
-                result["errors"].append(f"Financials: {str(e)}")
-
-            time.sleep(random.uniform(0.5, 1.0))
-
-        duration = time.time() - start
-        status = "success" if not result["errors"] else ("partial" if result["records"] > 0 else "failed")
-        db.log_collection(self.conn, ticker, self.SOURCE, status,
-                         result["records"], "; ".join(result["errors"]) if result["errors"] else None, duration)
+    def collect_stock(self, ticker: str, classes=("prices", "statements")) -> Dict:
+        """Collect data for a single stock from StockAnalysis."""
+        result = {"ticker": ticker, "source": self.SOURCE, "records": 0, "errors": []}
 
-        if result["records"] > 0:
-            logger.info(f"  [StockAnalysis] {ticker}: ✓ ({result['records']} records)")
+        # ── Overview page ──
+        if "prices" in classes:
+            start = time.time()
+            html = self.http.get(self._overview_url(ticker), cached=False)   # prices must be today's
+
+            if html is None:
+                result["errors"].append("Stock page not found")
+                for data_class in classes:
+                    self._log_class(ticker, data_class, 0, ["Page not found"], time.time() - start)
+                return result
+
+            with atomic(self.writer):
+                self._parse_overview(ticker, html, result)
+                self._log_class(ticker, "prices", result["records"], result["errors"], time.time() - start)
+
+        # ── Financials page ── (revalidated; unchanged statements are not re-parsed)
+        if "statements" in classes:
+            start = time.time()
+            before, n_errors = result["records"], len(result["errors"])
+            # The pages' rows, the log entry and the validators are saved together or not at all
+            with atomic(self.writer):
+                for fin_type in self.FINANCIAL_PAGES:
+                    url = self._financials_url(ticker, fin_type)
+                    fin_html = self.http.get(url, conditional=True)
+                    if fin_html is NOT_MODIFIED or fin_html is None:
+                        continue
+
+                    self._parse_financials(ticker, url, fin_html, result)
+                self._log_class(ticker, "statements", result["records"] - before,
+                                result["errors"][n_errors:], time.time() - start)
 
+        self._finish_stock(result)
         return result
 
     def collect_all(self, tickers: List[str] = None) -> List[Dict]:
@@ -228,18 +146,85 @@ class StockAnalysisCollector:
         if not tickers:
             tickers = db.get_all_tickers(self.conn)
 
-        results = []
-        total = len(tickers)
-        logger.info(f"[StockAnalysis] Starting collection for {total} tickers...")
+        # Incremental mode: only the pages whose data class is stale
+        stale = {c: set(db.stale_tickers(self.conn, tickers, self.SOURCE, c, self.freshness))
+                 for c in ("prices", "statements")}
+        classes = {t: tuple(c for c in ("prices", "statements") if t in stale[c]) for t in tickers}
+        skipped = [t for t in tickers if not classes[t]]
+        if skipped:
+            logger.info(f"[StockAnalysis] {len(skipped)} tickers fresh, skipped")
+        tickers = [t for t in tickers if classes[t]]
 
-        for i, ticker in enumerate(tickers, 1):
-            logger.info(f"[StockAnalysis] ({i}/{total}) Processing {ticker}...")
-            result = self.collect_stock(ticker)
-            results.append(result)
+        total = len(tickers)
+        if self.http.concurrent:
+            results = self._collect_all_concurrent(tickers, classes)
+        else:
+            results = []
+            logger.info(f"[StockAnalysis] Starting collection for {total} tickers...")
 
-            if i < total:
-                time.sleep(random.uniform(REQUEST_DELAY_MIN, REQUEST_DELAY_MAX))
+            for i, ticker in enumerate(tickers, 1):
+                logger.info(f"[StockAnalysis] ({i}/{total}) Processing {ticker}...")
+                result = self.collect_stock(ticker, classes[ticker])
+                results.append(result)
 
         success = sum(1 for r in results if r["records"] > 0)
-        logger.info(f"[StockAnalysis] Complete: {success}/{total} with data")
+        logger.info(f"[StockAnalysis] Complete: {success}/{total} with data, "
+                    f"{self.http.validators.unchanged} financials pages unchanged")
         return results
+
+    def _collect_all_concurrent(self, tickers: List[str], classes: Dict[str, tuple]) -> List[Dict]:
+        """
+        Async-engine version of the per-ticker loop, in two waves:
+        overview pages for every ticker, then financials pages for the tickers that exist.
+        """
+        logger.info(f"[StockAnalysis] Starting collection for {len(tickers)} tickers "
+                    f"({self.http.max_in_flight} requests in flight)...")
+
+        results = {t: {"ticker": t, "source": self.SOURCE, "records": 0, "errors": []} for t in tickers}
+
+        # ── Wave 1: overview pages ──
+        overview_jobs = {self._overview_url(t): t for t in tickers if "prices" in classes[t]}
+        # Tickers skipped in wave 1 were found on an earlier run
+        found = [t for t in tickers if "prices" not in classes[t]]
+
+        def on_overview(url: str, html: Optional[str], elapsed: float):
+            ticker = overview_jobs[url]
+            if html is None:
+                results[ticker]["errors"].append("Stock page not found")
+                for data_class in classes[ticker]:
+                    self._log_class(ticker, data_class, 0, ["Page not found"], elapsed)
+                return
+            with atomic(self.writer):
+                self._parse_overview(ticker, html, results[ticker])
+                self._log_class(ticker, "prices", results[ticker]["records"], results[ticker]["errors"], elapsed)
+            found.append(ticker)
+            if "statements" not in classes[ticker]:
+                self._finish_stock(results[ticker])
+
+        self.http.fetch_many(overview_jobs, on_overview, uncached=overview_jobs)
+
+        # ── Wave 2: financials pages ──
+        fin_jobs = {}
+        for ticker in found:
+            if "statements" not in classes[ticker]:
+                continue
+            for fin_type in self.FINANCIAL_PAGES:
+                fin_jobs[self._financials_url(ticker, fin_type)] = ticker
+        pending = {t: len(self.FINANCIAL_PAGES) for t in set(fin_jobs.values())}
+        progress = {t: (results[t]["records"], len(results[t]["errors"]), 0.0) for t in pending}
+
+        def on_financials(url: str, html: Optional[str], elapsed: float):
+            ticker = fin_jobs[url]
+            before, n_errors, spent = progress[ticker]
+            progress[ticker] = (before, n_errors, spent + elapsed)
+            with atomic(self.writer):
+                if html is not None and html is not NOT_MODIFIED:
+                    self._parse_financials(ticker, url, html, results[ticker])
+                pending[ticker] -= 1
+                if pending[ticker] == 0:
+                    self._log_class(ticker, "statements", results[ticker]["records"] - before,
+                                    results[ticker]["errors"][n_errors:], spent + elapsed)
+                    self._finish_stock(results[ticker])
+
+        self.http.fetch_many(fin_jobs, on_financials, conditional=fin_jobs)
+        return [results[t] for t in tickers]
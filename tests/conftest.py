@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database as db  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Point database.py at a throwaway SQLite file."""
+    path = str(tmp_path / "test.db")
+    monkeypatch.setattr(db, "DB_PATH", path)
+    return path
@@ -0,0 +1,23 @@
+import pytest
+
+import database as db
+
+pytest.importorskip("pyarrow")
+import arrow_export  # noqa: E402
+
+
+def test_same_day_change_to_any_column_is_reexported(db_path, tmp_path):
+    conn = db.get_connection()
+    row = {"ticker": "AAA", "calculation_date": "2025-01-02", "eva": 10.0, "wacc": 0.2,
+           "market_cap": 100.0, "intrinsic_value": 5.0, "signal": "FAIR VALUE"}
+    db.upsert_eva_result(conn, row)
+    out = str(tmp_path / "exports")
+    assert arrow_export.export(conn, "feather", out, ["eva_results"]) == {"eva_results": 1}
+    assert arrow_export.export(conn, "feather", out, ["eva_results"]) == {"eva_results": 0}
+
+    # Only the signal and intrinsic value change (e.g. after a threshold change)
+    db.upsert_eva_result(conn, dict(row, intrinsic_value=7.5, signal="UNDERVALUED"))
+    assert arrow_export.export(conn, "feather", out, ["eva_results"]) == {"eva_results": 1}
+    exported = arrow_export.read_table("eva_results", "feather", out).to_pylist()
+    assert [(r["intrinsic_value"], r["signal"]) for r in exported] == [(7.5, "UNDERVALUED")]
+    conn.close()
@@ -0,0 +1,38 @@
+import sqlite3
+
+import pytest
+
+import database as db
+from db_writer import DatabaseWriter, DatabaseWriterError
+
+
+def test_failed_op_alone_releases_write_lock(db_path):
+    writer = DatabaseWriter(flush_seconds=60)
+    try:
+        db.upsert_company(writer, ticker="AAA", name="A")
+        writer.flush()
+        # Writes a row, then fails on the duplicate — the statement did take the write lock
+        writer.executemany("INSERT INTO companies (ticker, name) VALUES (?, ?)", [("BBB", "b"), ("AAA", "dup")])
+        with pytest.raises(DatabaseWriterError):
+            writer.flush()
+
+        other = sqlite3.connect(db_path, timeout=0.5)
+        other.execute("INSERT INTO companies (ticker, name) VALUES ('OTHER', 'x')")
+        other.commit()
+        other.close()
+    finally:
+        writer.close()
+
+
+def test_failed_op_is_rolled_back_whole(db_path):
+    writer = DatabaseWriter(flush_seconds=60)
+    db.upsert_company(writer, ticker="AAA", name="A")
+    writer.executemany("INSERT INTO companies (ticker, name) VALUES (?, ?)", [("BBB", "b"), ("AAA", "dup")])
+    db.upsert_company(writer, ticker="CCC", name="C")
+    with pytest.raises(DatabaseWriterError):
+        writer.flush()
+    writer.close()
+
+    conn = db.get_connection()
+    assert sorted(r["ticker"] for r in conn.execute("SELECT ticker FROM companies")) == ["AAA", "CCC"]
+    conn.close()
@@ -0,0 +1,24 @@
+import pytest
+
+from config import RATE_LIMIT_BACKOFF
+from rate_limiter import TokenBucket
+
+
+def test_reservations_after_retry_after_are_spaced_at_reduced_rate():
+    bucket = TokenBucket(rate=2.0, burst=5)
+    now = bucket.updated
+    bucket.throttled(now, retry_after=30)
+    rate = 2.0 * RATE_LIMIT_BACKOFF
+
+    waits = [bucket.reserve(now) for _ in range(5)]
+
+    assert waits[0] >= 30
+    for earlier, later in zip(waits, waits[1:]):
+        assert later - earlier == pytest.approx(1.0 / rate)
+
+
+def test_burst_available_without_throttling():
+    bucket = TokenBucket(rate=2.0, burst=3)
+    now = bucket.updated
+    assert [bucket.reserve(now) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve(now) == pytest.approx(0.5)
@@ -6,6 +6,7 @@ EGX stocks use the .CA suffix on Yahoo Finance.
 
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from typing import Dict, List, Optional
 
@@ -13,10 +14,18 @@ import yfinance as yf
 import pandas as pd
 
 from config import (
-    YAHOO_FINANCE_SUFFIX, REQUEST_DELAY_MIN, REQUEST_DELAY_MAX,
-    KNOWN_EGX_TICKERS
+    YAHOO_FINANCE_SUFFIX, YAHOO_API_HOST, YAHOO_BATCH_SIZE, PRICE_HISTORY_YEARS, KNOWN_EGX_TICKERS
 )
 import database as db
+from db_writer import write_target
+import price_history
+from rate_limiter import limiter
+from response_cache import ResponseCache
+
+try:
+    from yfinance.exceptions import YFRateLimitError
+except ImportError:  # older yfinance releases
+    YFRateLimitError = None
 
 logger = logging.getLogger(__name__)
 
@@ -26,31 +35,266 @@ class YahooFinanceCollector:
 
     SOURCE = "yahoo_finance"
 
-    def __init__(self, conn):
+    # market_data columns owned by the bulk price refresh when it has a bar for the ticker
+    PRICE_FIELDS = ("close_price", "open_price", "high_price", "low_price", "volume")
+
+    # (period, yfinance attribute) pairs fetched for each statement type
+    STATEMENTS = {
+        "income": [("annual", "income_stmt"), ("quarterly", "quarterly_income_stmt")],
+        "balance": [("annual", "balance_sheet"), ("quarterly", "quarterly_balance_sheet")],
+        "cashflow": [("annual", "cashflow"), ("quarterly", "quarterly_cashflow")],
+    }
+
+    def __init__(self, conn, max_workers: int = 1, use_cache: bool = True, cache_ttl_hours: float = 24,
+                 writer=None, freshness: Optional[Dict[str, float]] = None):
         self.conn = conn
+        self.freshness = freshness
+        self.writer = write_target(conn, writer)
+        self.max_workers = max(1, max_workers)
+        self.cache = ResponseCache(conn, self.SOURCE, enabled=use_cache, default_ttl_hours=cache_ttl_hours,
+                                   writer=self.writer)
+        self.price_cache = ResponseCache(conn, "yahoo_prices", enabled=use_cache, default_ttl_hours=cache_ttl_hours,
+                                         writer=self.writer)
 
     def _yahoo_ticker(self, ticker: str) -> str:
         """Convert EGX ticker to Yahoo Finance format."""
         return f"{ticker}{YAHOO_FINANCE_SUFFIX}"
 
-    def collect_stock(self, ticker: str) -> Dict:
+    def _call(self, fn):
         """
-        Collect all available data for a single stock.
-        Returns a summary dict of what was collected.
+        Run one yfinance request under the shared Yahoo rate limit.
+        Yahoo's throttling surfaces as YFRateLimitError; report it so every worker backs off.
+        """
+        limiter.acquire(YAHOO_API_HOST)
+        try:
+            value = fn()
+        except Exception as e:
+            if YFRateLimitError is not None and isinstance(e, YFRateLimitError):
+                limiter.record(YAHOO_API_HOST, 429)
+            raise
+        limiter.record(YAHOO_API_HOST, 200)
+        return value
+
+    def _fetch_prices(self, tickers: List[str]) -> Dict[str, Dict]:
+        """
+        Latest daily bar for every ticker from multi-symbol yf.download calls,
+        YAHOO_BATCH_SIZE symbols at a time. Returns market_data rows keyed by ticker.
+        Bars still in the price cache are reused and only the rest are downloaded.
+        """
+        today = datetime.now().strftime("%Y-%m-%d")
+        rows = {}
+
+        misses = []
+        for ticker in tickers:
+            bar = self.price_cache.get(f"yahoo:{self._yahoo_ticker(ticker)}:bar")
+            if bar is not None:
+                rows[ticker] = _price_row(ticker, today, bar, self.SOURCE)
+            else:
+                misses.append(ticker)
+
+        for i in range(0, len(misses), YAHOO_BATCH_SIZE):
+            batch = misses[i:i + YAHOO_BATCH_SIZE]
+            symbols = [self._yahoo_ticker(t) for t in batch]
+            try:
+                frame = self._call(lambda: yf.download(
+                    symbols, period="5d", interval="1d", group_by="ticker", auto_adjust=False,
+                    threads=self.max_workers if self.max_workers > 1 else False, progress=False,
+                ))
+            except Exception as e:
+                logger.warning(f"  [Yahoo] Bulk price batch {i // YAHOO_BATCH_SIZE + 1} failed - {e}")
+                continue
+
+            for ticker, sym in zip(batch, symbols):
+                bar = _last_bar(frame, sym)
+                if bar is None:
+                    continue
+                self.price_cache.set(f"yahoo:{sym}:bar", bar)
+                rows[ticker] = _price_row(ticker, today, bar, self.SOURCE)
+
+        return rows
+
+    def collect_prices(self, tickers: List[str] = None) -> List[Dict]:
+        """
+        Bulk market-data refresh: price, range and volume for the whole universe
+        in a few batched requests, written to market_data in one transaction.
+        """
+        tickers = db.stale_tickers(self.conn, tickers or KNOWN_EGX_TICKERS, self.SOURCE, "prices", self.freshness)
+        if not tickers:
+            logger.info("[Yahoo Finance] Prices fresh for every ticker, skipped")
+            return []
+        start = time.time()
+        logger.info(f"[Yahoo Finance] Bulk price refresh for {len(tickers)} tickers...")
+
+        rows = self._fetch_prices(tickers)
+        db.upsert_market_data_many(self.writer, list(rows.values()))
+
+        duration = time.time() - start
+        db.log_collection_many(self.writer, [{
+            "ticker": t, "source": self.SOURCE, "status": "success" if t in rows else "failed",
+            "records_collected": 1 if t in rows else 0, "error_message": None if t in rows else "No price data",
+            "duration_seconds": duration / len(tickers), "data_class": "prices",
+        } for t in tickers])
+        logger.info(f"[Yahoo Finance] Prices: {len(rows)}/{len(tickers)} tickers in {duration:.1f}s")
+
+        return [{"ticker": t, "source": self.SOURCE, "records": 1 if t in rows else 0,
+                 "errors": [] if t in rows else ["No price data"]} for t in tickers]
+
+    def collect_price_history(self, tickers: List[str] = None, years: int = PRICE_HISTORY_YEARS) -> List[Dict]:
+        """
+        Daily OHLCV history into price_history, incrementally: a ticker with stored
+        bars is downloaded from its last stored day on (that bar may have been
+        partial), a new ticker gets `years` of history. Tickers sharing a start day
+        go through the same multi-symbol yf.download calls.
+        """
+        tickers = db.stale_tickers(self.conn, tickers or KNOWN_EGX_TICKERS, self.SOURCE, "history", self.freshness)
+        if not tickers:
+            logger.info("[Yahoo Finance] Price history fresh for every ticker, skipped")
+            return []
+        start = time.time()
+
+        stored = price_history.load_arrays(self.conn, tickers)
+        first_day = price_history.day_number(datetime.now()) - round(365.25 * years)
+        by_start = {}
+        for t in tickers:
+            by_start.setdefault(int(stored[t][0][-1]) if t in stored else first_day, []).append(t)
+        logger.info(f"[Yahoo Finance] Price history for {len(tickers)} tickers "
+                    f"({len(tickers) - len(stored)} new, {len(by_start)} start days)...")
+
+        fetched = {}
+        for day, group in sorted(by_start.items()):
+            for i in range(0, len(group), YAHOO_BATCH_SIZE):
+                batch = group[i:i + YAHOO_BATCH_SIZE]
+                symbols = [self._yahoo_ticker(t) for t in batch]
+                try:
+                    frame = self._call(lambda: yf.download(
+                        symbols, start=price_history.day_date(day).isoformat(), interval="1d",
+                        group_by="ticker", auto_adjust=False, actions=False,
+                        threads=self.max_workers if self.max_workers > 1 else False, progress=False,
+                    ))
+                except Exception as e:
+                    logger.warning(f"  [Yahoo] Price history batch from {price_history.day_date(day)} failed - {e}")
+                    continue
+                for ticker, sym in zip(batch, symbols):
+                    bars = _history_bars(frame, sym)
+                    if bars is not None:
+                        fetched[ticker] = bars
+
+        history_rows, packed = [], []
+        for ticker, bars in fetched.items():
+            history_rows += price_history.rows(ticker, *bars)
+            merged = price_history.merge(stored[ticker], bars) if ticker in stored else bars
+            packed.append(price_history.pack(ticker, *merged))
+        db.upsert_price_history_many(self.writer, history_rows)
+        db.set_packed_prices_many(self.writer, packed)
+
+        duration = time.time() - start
+        db.log_collection_many(self.writer, [{
+            "ticker": t, "source": self.SOURCE, "status": "success" if t in fetched else "failed",
+            "records_collected": len(fetched[t][0]) if t in fetched else 0,
+            "error_message": None if t in fetched else "No price history",
+            "duration_seconds": duration / len(tickers), "data_class": "history",
+        } for t in tickers])
+        logger.info(f"[Yahoo Finance] Price history: {len(history_rows)} bars for "
+                    f"{len(fetched)}/{len(tickers)} tickers in {duration:.1f}s")
+
+        return [{"ticker": t, "source": self.SOURCE, "records": len(fetched[t][0]) if t in fetched else 0,
+                 "errors": [] if t in fetched else ["No price history"]} for t in tickers]
+
+    def _cached_parts(self, ticker: str, classes=("metadata", "statements"), fresh_info: bool = False) -> Dict:
+        """
+        Info dict and statement frames for a ticker still in the response cache,
+        keyed like the payload ("info" or the yfinance statement attribute).
+        With fresh_info the info dict is always downloaded: its price fields will be stored as today's.
+        """
+        yahoo_sym = self._yahoo_ticker(ticker)
+        parts = {}
+        if "metadata" in classes and not fresh_info:
+            info = self.cache.get(f"yahoo:{yahoo_sym}:info")
+            if info is not None:
+                parts["info"] = info
+        if "statements" not in classes:
+            return parts
+        for section in self.STATEMENTS.values():
+            for period_type, stmt_attr in section:
+                frame = self.cache.get(f"yahoo:{yahoo_sym}:{stmt_attr}")
+                if frame is not None:
+                    parts[stmt_attr] = _frame_from_cache(frame)
+        return parts
+
+    def _cache_fetched(self, payload: Dict):
+        """Store the parts of a payload that came from the network, not the cache."""
+        yahoo_sym = self._yahoo_ticker(payload["ticker"])
+        for part in payload["fetched"]:
+            if part == "info":
+                self.cache.set(f"yahoo:{yahoo_sym}:info", payload["info"])
+            elif payload["statements"].get(part) is not None:
+                self.cache.set(f"yahoo:{yahoo_sym}:{part}", _frame_to_cache(payload["statements"][part]))
+
+    def _fetch_stock(self, ticker: str, cached: Optional[Dict] = None,
+                     classes=("metadata", "statements")) -> Dict:
+        """
+        Download the raw yfinance payloads for a single stock: info for "metadata",
+        the six statement frames for "statements". Parts already supplied in
+        `cached` (see _cached_parts) are not downloaded again.
+        Network only — never touches the database, so it is safe to run in worker threads.
         """
         yahoo_sym = self._yahoo_ticker(ticker)
+        cached = cached or {}
         start_time = time.time()
-        result = {"ticker": ticker, "source": self.SOURCE, "records": 0, "errors": []}
+        payload = {"ticker": ticker, "info": cached.get("info"), "statements": {}, "errors": [],
+                   "fetched": [], "classes": tuple(classes)}
 
         try:
             stock = yf.Ticker(yahoo_sym)
 
-            # ── Company Info ──
+            if payload["info"] is None and "metadata" in classes:
+                try:
+                    payload["info"] = self._call(lambda: stock.info) or {}
+                    payload["fetched"].append("info")
+                except Exception as e:
+                    payload["errors"].append(f"Info: {str(e)}")
+                    logger.warning(f"  [Yahoo] {ticker}: Info failed - {e}")
+
+            for section, label in [("income", "Income"), ("balance", "Balance"), ("cashflow", "CashFlow")]:
+                if "statements" not in classes:
+                    break
+                try:
+                    for period_type, stmt_attr in self.STATEMENTS[section]:
+                        if stmt_attr in cached:
+                            payload["statements"][stmt_attr] = cached[stmt_attr]
+                            continue
+                        payload["statements"][stmt_attr] = self._call(lambda: getattr(stock, stmt_attr, None))
+                        payload["fetched"].append(stmt_attr)
+                except Exception as e:
+                    payload["errors"].append(f"{label}: {str(e)}")
+                    logger.warning(f"  [Yahoo] {ticker}: {label} fetch failed - {e}")
+
+        except Exception as e:
+            payload["errors"].append(f"General: {str(e)}")
+            logger.error(f"  [Yahoo] {ticker}: Failed completely - {e}")
+
+        payload["duration"] = time.time() - start_time
+        return payload
+
+    def _store_stock(self, payload: Dict, prices_done: bool = False) -> Dict:
+        """
+        Write a fetched payload to the database and cache its freshly downloaded parts.
+        Always called from the thread that owns the connection.
+        With prices_done the bulk refresh already wrote today's price columns,
+        so info only contributes the slowly changing fields.
+        """
+        ticker = payload["ticker"]
+        result = {"ticker": ticker, "source": self.SOURCE, "records": 0, "errors": list(payload["errors"])}
+        statements = payload["statements"]
+        self._cache_fetched(payload)
+
+        # ── Company Info ──
+        info = payload["info"]
+        if info is not None:
             try:
-                info = stock.info or {}
                 if info.get("shortName") or info.get("longName"):
                     db.upsert_company(
-                        self.conn,
+                        self.writer,
                         ticker=ticker,
                         name=info.get("longName") or info.get("shortName", ""),
                         sector=info.get("sector", ""),
@@ -78,7 +322,10 @@ class YahooFinanceCollector:
                         "fifty_two_week_low": info.get("fiftyTwoWeekLow"),
                         "source": self.SOURCE,
                     }
-                    db.upsert_market_data(self.conn, market_data)
+                    if prices_done:
+                        for f in self.PRICE_FIELDS:
+                            market_data.pop(f)
+                    db.upsert_market_data(self.writer, market_data)
                     result["records"] += 1
                     logger.info(f"  [Yahoo] {ticker}: Market data ✓")
                 else:
@@ -87,128 +334,176 @@ class YahooFinanceCollector:
             except Exception as e:
                 result["errors"].append(f"Info: {str(e)}")
                 logger.warning(f"  [Yahoo] {ticker}: Info failed - {e}")
+        info_records = result["records"]
 
-            # ── Income Statements ──
-            try:
-                for period_type, stmt_attr in [("annual", "income_stmt"), ("quarterly", "quarterly_income_stmt")]:
-                    stmt = getattr(stock, stmt_attr, None)
-                    if stmt is not None and not stmt.empty:
-                        for col in stmt.columns:
-                            period_end = col.strftime("%Y-%m-%d") if hasattr(col, 'strftime') else str(col)
-                            income_data = {
-                                "ticker": ticker,
-                                "period": period_type,
-                                "period_end": period_end,
-                                "revenue": _safe_get(stmt, col, ["Total Revenue", "TotalRevenue"]),
-                                "cost_of_revenue": _safe_get(stmt, col, ["Cost Of Revenue", "CostOfRevenue"]),
-                                "gross_profit": _safe_get(stmt, col, ["Gross Profit", "GrossProfit"]),
-                                "operating_expenses": _safe_get(stmt, col, ["Operating Expense", "OperatingExpense", "Total Operating Expenses"]),
-                                "ebit": _safe_get(stmt, col, ["EBIT", "Operating Income"]),
-                                "ebitda": _safe_get(stmt, col, ["EBITDA", "Normalized EBITDA"]),
-                                "interest_expense": _safe_get(stmt, col, ["Interest Expense", "InterestExpense", "Interest Expense Non Operating"]),
-                                "pretax_income": _safe_get(stmt, col, ["Pretax Income", "PretaxIncome"]),
-                                "tax_expense": _safe_get(stmt, col, ["Tax Provision", "TaxProvision", "Income Tax Expense"]),
-                                "net_income": _safe_get(stmt, col, ["Net Income", "NetIncome", "Net Income Common Stockholders"]),
-                                "eps": _safe_get(stmt, col, ["Basic EPS", "Diluted EPS"]),
-                                "source": self.SOURCE,
-                            }
-                            db.upsert_income_statement(self.conn, income_data)
-                            result["records"] += 1
-                        logger.info(f"  [Yahoo] {ticker}: Income statement ({period_type}) ✓ ({len(stmt.columns)} periods)")
-            except Exception as e:
-                result["errors"].append(f"Income: {str(e)}")
-                logger.warning(f"  [Yahoo] {ticker}: Income stmt failed - {e}")
-
-            # ── Balance Sheets ──
-            try:
-                for period_type, stmt_attr in [("annual", "balance_sheet"), ("quarterly", "quarterly_balance_sheet")]:
-                    stmt = getattr(stock, stmt_attr, None)
-                    if stmt is not None and not stmt.empty:
-                        for col in stmt.columns:
-                            period_end = col.strftime("%Y-%m-%d") if hasattr(col, 'strftime') else str(col)
-                            bs_data = {
-                                "ticker": ticker,
-                                "period": period_type,
-                                "period_end": period_end,
-                                "total_assets": _safe_get(stmt, col, ["Total Assets", "TotalAssets"]),
-                                "current_assets": _safe_get(stmt, col, ["Current Assets", "CurrentAssets"]),
-                                "non_current_assets": _safe_get(stmt, col, ["Total Non Current Assets"]),
-                                "total_liabilities": _safe_get(stmt, col, ["Total Liabilities Net Minority Interest", "Total Liab"]),
-                                "current_liabilities": _safe_get(stmt, col, ["Current Liabilities", "CurrentLiabilities"]),
-                                "non_current_liabilities": _safe_get(stmt, col, ["Total Non Current Liabilities Net Minority Interest"]),
-                                "total_debt": _safe_get(stmt, col, ["Total Debt", "TotalDebt"]),
-                                "long_term_debt": _safe_get(stmt, col, ["Long Term Debt", "LongTermDebt"]),
-                                "short_term_debt": _safe_get(stmt, col, ["Current Debt", "Current Debt And Capital Lease Obligation"]),
-                                "total_equity": _safe_get(stmt, col, ["Total Equity Gross Minority Interest", "Stockholders Equity", "StockholdersEquity"]),
-                                "retained_earnings": _safe_get(stmt, col, ["Retained Earnings", "RetainedEarnings"]),
-                                "cash_and_equivalents": _safe_get(stmt, col, ["Cash And Cash Equivalents", "Cash Cash Equivalents And Short Term Investments"]),
-                                "source": self.SOURCE,
-                            }
-                            db.upsert_balance_sheet(self.conn, bs_data)
-                            result["records"] += 1
-                        logger.info(f"  [Yahoo] {ticker}: Balance sheet ({period_type}) ✓ ({len(stmt.columns)} periods)")
-            except Exception as e:
-                result["errors"].append(f"Balance: {str(e)}")
-                logger.warning(f"  [Yahoo] {ticker}: Balance sheet failed - {e}")
+        # ── Income Statements ──
+        try:
+            for period_type, stmt_attr in self.STATEMENTS["income"]:
+                stmt = statements.get(stmt_attr)
+                if stmt is not None and not stmt.empty:
+                    rows = []
+                    for col in stmt.columns:
+                        period_end = col.strftime("%Y-%m-%d") if hasattr(col, 'strftime') else str(col)
+                        income_data = {
+                            "ticker": ticker,
+                            "period": period_type,
+                            "period_end": period_end,
+                            "revenue": _safe_get(stmt, col, ["Total Revenue", "TotalRevenue"]),
+                            "cost_of_revenue": _safe_get(stmt, col, ["Cost Of Revenue", "CostOfRevenue"]),
+                            "gross_profit": _safe_get(stmt, col, ["Gross Profit", "GrossProfit"]),
+                            "operating_expenses": _safe_get(stmt, col, ["Operating Expense", "OperatingExpense", "Total Operating Expenses"]),
+                            "ebit": _safe_get(stmt, col, ["EBIT", "Operating Income"]),
+                            "ebitda": _safe_get(stmt, col, ["EBITDA", "Normalized EBITDA"]),
+                            "interest_expense": _safe_get(stmt, col, ["Interest Expense", "InterestExpense", "Interest Expense Non Operating"]),
+                            "pretax_income": _safe_get(stmt, col, ["Pretax Income", "PretaxIncome"]),
+                            "tax_expense": _safe_get(stmt, col, ["Tax Provision", "TaxProvision", "Income Tax Expense"]),
+                            "net_income": _safe_get(stmt, col, ["Net Income", "NetIncome", "Net Income Common Stockholders"]),
+                            "eps": _safe_get(stmt, col, ["Basic EPS", "Diluted EPS"]),
+                            "source": self.SOURCE,
+                        }
+                        rows.append(income_data)
+                    db.upsert_income_statement_many(self.writer, rows)
+                    result["records"] += len(rows)
+                    logger.info(f"  [Yahoo] {ticker}: Income statement ({period_type}) ✓ ({len(stmt.columns)} periods)")
+        except Exception as e:
+            result["errors"].append(f"Income: {str(e)}")
+            logger.warning(f"  [Yahoo] {ticker}: Income stmt failed - {e}")
 
-            # ── Cash Flow ──
-            try:
-                for period_type, stmt_attr in [("annual", "cashflow"), ("quarterly", "quarterly_cashflow")]:
-                    stmt = getattr(stock, stmt_attr, None)
-                    if stmt is not None and not stmt.empty:
-                        for col in stmt.columns:
-                            period_end = col.strftime("%Y-%m-%d") if hasattr(col, 'strftime') else str(col)
-                            cf_data = {
-                                "ticker": ticker,
-                                "period": period_type,
-                                "period_end": period_end,
-                                "operating_cash_flow": _safe_get(stmt, col, ["Operating Cash Flow", "Cash Flow From Continuing Operating Activities"]),
-                                "investing_cash_flow": _safe_get(stmt, col, ["Investing Cash Flow", "Cash Flow From Continuing Investing Activities"]),
-                                "financing_cash_flow": _safe_get(stmt, col, ["Financing Cash Flow", "Cash Flow From Continuing Financing Activities"]),
-                                "capex": _safe_get(stmt, col, ["Capital Expenditure", "CapitalExpenditure"]),
-                                "free_cash_flow": _safe_get(stmt, col, ["Free Cash Flow", "FreeCashFlow"]),
-                                "dividends_paid": _safe_get(stmt, col, ["Common Stock Dividend Paid", "Cash Dividends Paid"]),
-                                "source": self.SOURCE,
-                            }
-                            db.upsert_cash_flow(self.conn, cf_data)
-                            result["records"] += 1
-                        logger.info(f"  [Yahoo] {ticker}: Cash flow ({period_type}) ✓")
-            except Exception as e:
-                result["errors"].append(f"CashFlow: {str(e)}")
+        # ── Balance Sheets ──
+        try:
+            for period_type, stmt_attr in self.STATEMENTS["balance"]:
+                stmt = statements.get(stmt_attr)
+                if stmt is not None and not stmt.empty:
+                    rows = []
+                    for col in stmt.columns:
+                        period_end = col.strftime("%Y-%m-%d") if hasattr(col, 'strftime') else str(col)
+                        bs_data = {
+                            "ticker": ticker,
+                            "period": period_type,
+                            "period_end": period_end,
+                            "total_assets": _safe_get(stmt, col, ["Total Assets", "TotalAssets"]),
+                            "current_assets": _safe_get(stmt, col, ["Current Assets", "CurrentAssets"]),
+                            "non_current_assets": _safe_get(stmt, col, ["Total Non Current Assets"]),
+                            "total_liabilities": _safe_get(stmt, col, ["Total Liabilities Net Minority Interest", "Total Liab"]),
+                            "current_liabilities": _safe_get(stmt, col, ["Current Liabilities", "CurrentLiabilities"]),
+                            "non_current_liabilities": _safe_get(stmt, col, ["Total Non Current Liabilities Net Minority Interest"]),
+                            "total_debt": _safe_get(stmt, col, ["Total Debt", "TotalDebt"]),
+                            "long_term_debt": _safe_get(stmt, col, ["Long Term Debt", "LongTermDebt"]),
+                            "short_term_debt": _safe_get(stmt, col, ["Current Debt", "Current Debt And Capital Lease Obligation"]),
+                            "total_equity": _safe_get(stmt, col, ["Total Equity Gross Minority Interest", "Stockholders Equity", "StockholdersEquity"]),
+                            "retained_earnings": _safe_get(stmt, col, ["Retained Earnings", "RetainedEarnings"]),
+                            "cash_and_equivalents": _safe_get(stmt, col, ["Cash And Cash Equivalents", "Cash Cash Equivalents And Short Term Investments"]),
+                            "source": self.SOURCE,
+                        }
+                        rows.append(bs_data)
+                    db.upsert_balance_sheet_many(self.writer, rows)
+                    result["records"] += len(rows)
+                    logger.info(f"  [Yahoo] {ticker}: Balance sheet ({period_type}) ✓ ({len(stmt.columns)} periods)")
+        except Exception as e:
+            result["errors"].append(f"Balance: {str(e)}")
+            logger.warning(f"  [Yahoo] {ticker}: Balance sheet failed - {e}")
 
+        # ── Cash Flow ──
+        try:
+            for period_type, stmt_attr in self.STATEMENTS["cashflow"]:
+                stmt = statements.get(stmt_attr)
+                if stmt is not None and not stmt.empty:
+                    rows = []
+                    for col in stmt.columns:
+                        period_end = col.strftime("%Y-%m-%d") if hasattr(col, 'strftime') else str(col)
+                        cf_data = {
+                            "ticker": ticker,
+                            "period": period_type,
+                            "period_end": period_end,
+                            "operating_cash_flow": _safe_get(stmt, col, ["Operating Cash Flow", "Cash Flow From Continuing Operating Activities"]),
+                            "investing_cash_flow": _safe_get(stmt, col, ["Investing Cash Flow", "Cash Flow From Continuing Investing Activities"]),
+                            "financing_cash_flow": _safe_get(stmt, col, ["Financing Cash Flow", "Cash Flow From Continuing Financing Activities"]),
+                            "capex": _safe_get(stmt, col, ["Capital Expenditure", "CapitalExpenditure"]),
+                            "free_cash_flow": _safe_get(stmt, col, ["Free Cash Flow", "FreeCashFlow"]),
+                            "dividends_paid": _safe_get(stmt, col, ["Common Stock Dividend Paid", "Cash Dividends Paid"]),
+                            "source": self.SOURCE,
+                        }
+                        rows.append(cf_data)
+                    db.upsert_cash_flow_many(self.writer, rows)
+                    result["records"] += len(rows)
+                    logger.info(f"  [Yahoo] {ticker}: Cash flow ({period_type}) ✓")
         except Exception as e:
-            result["errors"].append(f"General: {str(e)}")
-            logger.error(f"  [Yahoo] {ticker}: Failed completely - {e}")
+            result["errors"].append(f"CashFlow: {str(e)}")
 
-        duration = time.time() - start_time
-        status = "success" if not result["errors"] else ("partial" if result["records"] > 0 else "failed")
-        db.log_collection(self.conn, ticker, self.SOURCE, status,
-                         result["records"], "; ".join(result["errors"]) if result["errors"] else None, duration)
+        # One log row per data class collected, so incremental runs can tell them apart
+        for data_class in payload["classes"]:
+            records = info_records if data_class == "metadata" else result["records"] - info_records
+            errors = [e for e in result["errors"] if _error_class(e) in (data_class, None)]
+            status = "success" if not errors else ("partial" if records > 0 else "failed")
+            db.log_collection(self.writer, ticker, self.SOURCE, status,
+                              records, "; ".join(errors) if errors else None,
+                              payload.get("duration", 0), data_class=data_class)
 
         return result
 
+    def collect_stock(self, ticker: str) -> Dict:
+        """
+        Collect all available data for a single stock.
+        Returns a summary dict of what was collected.
+        """
+        return self._store_stock(self._fetch_stock(ticker, self._cached_parts(ticker, fresh_info=True)))
+
     def collect_all(self, tickers: List[str] = None) -> List[Dict]:
-        """Collect data for all tickers."""
+        """
+        Collect data for all tickers.
+        With max_workers > 1 the downloads fan out over a thread pool while
+        all database writes stay on the calling thread.
+        In incremental mode only the stale data classes of each ticker are fetched.
+        """
         tickers = tickers or KNOWN_EGX_TICKERS
         results = []
+
+        # info also carries market cap / valuation ratios, so it follows the prices window too
+        need_prices = set(db.stale_tickers(self.conn, tickers, self.SOURCE, "prices", self.freshness))
+        need_info = set(db.stale_tickers(self.conn, tickers, self.SOURCE, "metadata", self.freshness))
+        need_info |= need_prices
+        need_stmts = set(db.stale_tickers(self.conn, tickers, self.SOURCE, "statements", self.freshness))
+        classes = {t: tuple(c for c, stale in (("metadata", need_info), ("statements", need_stmts)) if t in stale)
+                   for t in tickers}
+        skipped = [t for t in tickers if not classes[t]]
+        if skipped:
+            logger.info(f"[Yahoo Finance] {len(skipped)} tickers fresh, skipped")
+        tickers = [t for t in tickers if classes[t]]
         total = len(tickers)
 
-        logger.info(f"[Yahoo Finance] Starting collection for {total} tickers...")
+        # Prices for the whole universe first; per-ticker info is then only needed for metadata.
+        # Tickers whose prices are still fresh already have today's bar, which info must not overwrite.
+        priced = {r["ticker"] for r in self.collect_prices(tickers) if r["records"]} if tickers else set()
+        priced |= set(tickers) - need_prices
 
-        for i, ticker in enumerate(tickers, 1):
-            logger.info(f"[Yahoo] ({i}/{total}) Processing {ticker}...")
-            result = self.collect_stock(ticker)
-            results.append(result)
+        if self.max_workers > 1:
+            logger.info(f"[Yahoo Finance] Starting collection for {total} tickers "
+                        f"({self.max_workers} workers)...")
+            order = {t: i for i, t in enumerate(tickers)}
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="yahoo") as pool:
+                futures = [pool.submit(self._fetch_stock, t, self._cached_parts(t, classes[t], t not in priced),
+                                       classes[t])
+                           for t in tickers]
+                for i, future in enumerate(as_completed(futures), 1):
+                    payload = future.result()
+                    logger.info(f"[Yahoo] ({i}/{total}) Processing {payload['ticker']}...")
+                    results.append(self._store_stock(payload, payload["ticker"] in priced))
+            results.sort(key=lambda r: order[r["ticker"]])
+        else:
+            logger.info(f"[Yahoo Finance] Starting collection for {total} tickers...")
 
-            # Rate limiting — be respectful
-            if i < total:
-                delay = REQUEST_DELAY_MIN + (REQUEST_DELAY_MAX - REQUEST_DELAY_MIN) * (i % 3) / 3
-                time.sleep(delay)
+            for i, ticker in enumerate(tickers, 1):
+                logger.info(f"[Yahoo] ({i}/{total}) Processing {ticker}...")
+                cached = self._cached_parts(ticker, classes[ticker], ticker not in priced)
+                payload = self._fetch_stock(ticker, cached, classes[ticker])
+                result = self._store_stock(payload, ticker in priced)
+                results.append(result)
 
         success = sum(1 for r in results if not r["errors"])
         partial = sum(1 for r in results if r["errors"] and r["records"] > 0)
         failed = sum(1 for r in results if r["records"] == 0 and r["errors"])
-        logger.info(f"[Yahoo Finance] Complete: {success} success, {partial} partial, {failed} failed")
+        logger.info(f"[Yahoo Finance] Complete: {success} success, {partial} partial, {failed} failed "
+                    f"({self.cache.summary()})")
 
         return results
 
@@ -221,3 +516,82 @@ def _safe_get(df: pd.DataFrame, col, possible_keys: List[str]) -> Optional[float
             if pd.notna(val):
                 return float(val)
     return None
+
+
+def _last_bar(frame: pd.DataFrame, symbol: str) -> Optional[Dict]:
+    """Most recent complete OHLCV bar for one symbol of a multi-symbol yf.download frame."""
+    if frame is None or frame.empty:
+        return None
+    if isinstance(frame.columns, pd.MultiIndex):
+        if symbol not in frame.columns.get_level_values(0):
+            return None
+        frame = frame[symbol]
+    if "Close" not in frame.columns:
+        return None
+    bars = frame.dropna(subset=["Close"])
+    if bars.empty:
+        return None
+    last = bars.iloc[-1]
+    return {k: float(last[k]) for k in ("Open", "High", "Low", "Close", "Volume")
+            if k in last.index and pd.notna(last[k])}
+
+
+def _history_bars(frame: pd.DataFrame, symbol: str) -> Optional[price_history.Bars]:
+    """(days, bars) arrays for one symbol of a multi-symbol yf.download frame, in price_history.FIELDS order."""
+    if frame is None or frame.empty:
+        return None
+    if isinstance(frame.columns, pd.MultiIndex):
+        if symbol not in frame.columns.get_level_values(0):
+            return None
+        frame = frame[symbol]
+    if "Close" not in frame.columns:
+        return None
+    frame = frame.dropna(subset=["Close"])
+    if frame.empty:
+        return None
+    index = frame.index.tz_localize(None) if frame.index.tz is not None else frame.index
+    days = index.values.astype("datetime64[D]").astype("int32")
+    columns = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+    bars = frame.reindex(columns=columns).to_numpy(dtype="float64")
+    return days, bars
+
+
+def _error_class(error: str) -> Optional[str]:
+    """Data class an error message from _fetch_stock/_store_stock belongs to (None = all)."""
+    if error.startswith(("Info:", "No company info")):
+        return "metadata"
+    if error.startswith(("Income:", "Balance:", "CashFlow:")):
+        return "statements"
+    return None
+
+
+def _price_row(ticker: str, date: str, bar: Dict, source: str) -> Dict:
+    """market_data row for one _last_bar() result."""
+    return {
+        "ticker": ticker,
+        "date": date,
+        "close_price": bar["Close"],
+        "open_price": bar.get("Open"),
+        "high_price": bar.get("High"),
+        "low_price": bar.get("Low"),
+        "volume": int(bar["Volume"]) if bar.get("Volume") is not None else None,
+        "source": source,
+    }
+
+
+def _frame_to_cache(df: pd.DataFrame) -> Dict:
+    """JSON-safe form of a yfinance statement frame (line items x period-end dates)."""
+    return {
+        "index": [str(i) for i in df.index],
+        "columns": [c.isoformat() if hasattr(c, "isoformat") else str(c) for c in df.columns],
+        "data": [[float(v) if pd.api.types.is_number(v) and pd.notna(v) else None for v in row]
+                 for row in df.itertuples(index=False)],
+    }
+
+
+def _frame_from_cache(data: Dict) -> pd.DataFrame:
+    """Rebuild a statement frame stored by _frame_to_cache, with Timestamp columns."""
+    columns = pd.to_datetime(data["columns"], errors="coerce")
+    if columns.isna().any():
+        columns = data["columns"]
+    return pd.DataFrame(data["data"], index=data["index"], columns=columns, dtype=float)